@@ -0,0 +1,88 @@
+"""
+离线基准使用的假 perplexity SDK：接口与真实 SDK 的 Client.search 一致，不访问网络。
+
+行为由环境变量 PERPLEXITY_FAKE_PROFILE（JSON）控制，按 mode 配置：
+
+    {
+      "seed": 1,
+      "modes": {
+        "pro": {"median_ms": 800, "sigma": 0.5, "answer_bytes": 4000, "chunks": 8, "error_rate": 0.01},
+        "*": {"median_ms": 0}
+      }
+    }
+
+- 延迟服从对数正态分布（中位数 median_ms，形状参数 sigma；sigma=0 表示固定延迟）
+- answer_bytes / chunks 控制回答文本大小与 chunks 列表长度
+- error_rate 为抛出上游错误的概率
+- 未列出的 mode 使用 "*" 的配置
+"""
+
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+_DEFAULTS = {"median_ms": 0.0, "sigma": 0.0, "answer_bytes": 1000, "chunks": 4, "error_rate": 0.0}
+
+_PROFILE = json.loads(os.environ.get("PERPLEXITY_FAKE_PROFILE") or "{}")
+_RNG = random.Random(_PROFILE.get("seed"))
+_RNG_LOCK = threading.Lock()
+
+
+def _mode_profile(mode):
+    modes = _PROFILE.get("modes") or {}
+    merged = dict(_DEFAULTS)
+    merged.update(modes.get("*") or {})
+    merged.update(modes.get(mode) or {})
+    return merged
+
+
+def _draw(profile):
+    with _RNG_LOCK:
+        failed = _RNG.random() < profile["error_rate"]
+        if profile["median_ms"] <= 0:
+            delay_s = 0.0
+        else:
+            delay_s = _RNG.lognormvariate(0.0, profile["sigma"]) * profile["median_ms"] / 1000
+    return delay_s, failed
+
+
+def _answer(query, size):
+    prefix = "answer: " + query + " "
+    filler = "lorem ipsum dolor sit amet " * (size // 27 + 1)
+    return (prefix + filler)[: max(size, len(prefix))]
+
+
+class Client:
+    def __init__(self, cookies):
+        self.cookies = cookies
+
+    def search(self, query, mode="auto", model=None, sources=None, files=None, stream=False,
+               language="en-US", follow_up=None, incognito=False):
+        profile = _mode_profile(mode)
+        delay_s, failed = _draw(profile)
+        if failed:
+            time.sleep(delay_s)
+            raise RuntimeError("HTTP 502 fake upstream error")
+        answer = _answer(query, int(profile["answer_bytes"]))
+        chunks = [
+            {"index": i, "url": f"https://example.com/{i}", "title": f"source {i}", "snippet": answer[:120]}
+            for i in range(int(profile["chunks"]))
+        ]
+        backend_uuid = (follow_up or {}).get("backend_uuid") or uuid.uuid4().hex
+        payload = {"answer": answer, "chunks": chunks, "backend_uuid": backend_uuid}
+        if not stream:
+            time.sleep(delay_s)
+            return payload
+        return self._stream(payload, delay_s)
+
+    @staticmethod
+    def _stream(payload, delay_s, steps=8):
+        answer = payload["answer"]
+        for i in range(1, steps):
+            time.sleep(delay_s / steps)
+            yield {"answer": answer[: len(answer) * i // steps]}
+        time.sleep(delay_s / steps)
+        yield payload
@@ -0,0 +1,114 @@
+"""
+来源提取基准：构造接近 deep research 的大 payload（多步骤、大量 web_results、嵌入 JSON 字符串），
+测量 extract_sources 的耗时。
+
+示例：
+    python -m benchmarks.sources_bench
+    python -m benchmarks.sources_bench --results 2000 --chunks 5000 --iterations 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from .stdio_bench import percentile
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from perplexity_unofficial_mcp.perplexity_adapter import extract_sources  # noqa: E402
+
+
+def make_research_payload(*, steps: int, results: int, chunks: int, answer_bytes: int) -> Dict[str, Any]:
+    """
+    构造测试 payload：每个步骤带一批 web_results（URL 在步骤之间大量重复），步骤列表以 JSON 字符串放在 text 字段，
+    chunks 为回答片段与引用条目的混合列表。
+    """
+    per_step = max(1, results // max(1, steps))
+    step_list: List[Dict[str, Any]] = []
+    for step in range(steps):
+        web_results = [
+            {
+                "name": f"Result {(step * per_step + i) % results}",
+                "url": f"https://site{((step * per_step + i) % results) % 97}.example.com/page/{(step * per_step + i) % results}",
+                "snippet": "snippet text " * 40,
+                "meta_data": {"published": "2025-01-01", "domain": "example.com"},
+            }
+            for i in range(per_step)
+        ]
+        step_list.append({"step_type": "SEARCH_RESULTS", "content": {"web_results": web_results, "goal_id": step}})
+    step_list.append({"step_type": "FINAL", "content": {"answer": json.dumps({"answer": "final", "chunks": []})}})
+    chunk_list: List[Any] = []
+    for i in range(chunks):
+        if i % 4 == 0:
+            n = i % results
+            chunk_list.append({"index": i, "url": f"https://site{n % 97}.example.com/page/{n}", "title": f"c{i}"})
+        else:
+            chunk_list.append("chunk text " * 10)
+    answer = ("[1] research answer body " * (answer_bytes // 25 + 1))[:answer_bytes]
+    return {"answer": answer, "chunks": chunk_list, "text": json.dumps(step_list), "backend_uuid": "bench"}
+
+
+def run(
+    *, steps: int, results: int, chunks: int, answer_bytes: int, max_sources: int, iterations: int
+) -> Dict[str, Any]:
+    payload = make_research_payload(steps=steps, results=results, chunks=chunks, answer_bytes=answer_bytes)
+    payload_bytes = len(json.dumps(payload).encode("utf-8"))
+    durations: List[float] = []
+    sources: List[Dict[str, Any]] = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        sources = extract_sources(payload, max_sources=max_sources)
+        durations.append((time.perf_counter() - started) * 1000)
+    return {
+        "payload_bytes": payload_bytes,
+        "max_sources": max_sources,
+        "sources": len(sources),
+        "iterations": iterations,
+        "p50_ms": percentile(durations, 0.5),
+        "p99_ms": percentile(durations, 0.99),
+        "output_bytes": len(json.dumps(sources).encode("utf-8")),
+    }
+
+
+def format_table(rows: Sequence[Dict[str, Any]]) -> str:
+    header = f"{'payload':>10} {'max':>6} {'sources':>8} {'p50 ms':>9} {'p99 ms':>9} {'out bytes':>10}"
+    lines = [header]
+    for row in rows:
+        lines.append(
+            f"{row['payload_bytes']:>10} {row['max_sources']:>6} {row['sources']:>8} "
+            f"{row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['output_bytes']:>10}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="extract_sources 基准")
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--results", type=int, default=600)
+    parser.add_argument("--chunks", type=int, default=2_000)
+    parser.add_argument("--answer-bytes", type=int, default=80_000)
+    parser.add_argument("--max-sources", default="20,1000", help="逗号分隔的上限列表")
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args(argv)
+    rows = [
+        run(
+            steps=args.steps,
+            results=args.results,
+            chunks=args.chunks,
+            answer_bytes=args.answer_bytes,
+            max_sources=int(limit),
+            iterations=args.iterations,
+        )
+        for limit in args.max_sources.split(",")
+    ]
+    print(format_table(rows))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,317 @@
+"""
+离线基准：以子进程启动 STDIO MCP Server，用假 perplexity SDK 替代上游，测量吞吐与开销。
+
+示例：
+    python -m benchmarks.stdio_bench --profile overhead --concurrency 1,4,16 --requests 500
+    python -m benchmarks.stdio_bench --profile realistic --concurrency 8 --requests 200 --json out.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+FAKE_SDK_DIR = Path(__file__).resolve().parent / "fake_sdk"
+
+# 内置的假上游配置（按 mode），格式见 fake_sdk/perplexity.py
+PROFILES: Dict[str, Dict[str, Any]] = {
+    # 上游零延迟：结果只反映服务端自身的分发、序列化与写出开销
+    "overhead": {"seed": 1, "modes": {"*": {"median_ms": 0, "answer_bytes": 2_000, "chunks": 4}}},
+    # 近似线上分布：search/ask 秒级，reasoning 十秒级，deep research 分钟级，带少量上游错误
+    "realistic": {
+        "seed": 1,
+        "modes": {
+            "*": {"median_ms": 1_500, "sigma": 0.6, "answer_bytes": 4_000, "chunks": 8, "error_rate": 0.01},
+            "reasoning": {"median_ms": 8_000, "sigma": 0.5, "answer_bytes": 20_000, "chunks": 12, "error_rate": 0.02},
+            "deep research": {"median_ms": 60_000, "sigma": 0.4, "answer_bytes": 80_000, "chunks": 40, "error_rate": 0.02},
+        },
+    },
+    # 大回答：放大序列化与管道写出的成本
+    "large": {"seed": 1, "modes": {"*": {"median_ms": 0, "answer_bytes": 200_000, "chunks": 200}}},
+}
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """最近秩百分位（q 取 0~1）；空序列返回 None。"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def _server_env(profile: Mapping[str, Any], *, workers: int, extra_env: Mapping[str, str]) -> Dict[str, str]:
+    env = os.environ.copy()
+    env.update(
+        {
+            "PYTHONPATH": os.pathsep.join([str(FAKE_SDK_DIR), str(REPO_ROOT / "src")]),
+            "PERPLEXITY_FAKE_PROFILE": json.dumps(profile),
+            "PERPLEXITY_CSRF_TOKEN": "bench-csrf",
+            "PERPLEXITY_SESSION_TOKEN": "bench-session",
+            "PERPLEXITY_MAX_WORKERS": str(workers),
+            "PERPLEXITY_LIGHT_LANE_CONCURRENCY": str(workers),
+            "PERPLEXITY_HEAVY_LANE_CONCURRENCY": str(workers),
+            "PERPLEXITY_ACCOUNT_MAX_CONCURRENCY": str(workers),
+            "PERPLEXITY_LOG_LEVEL": "warn",
+        }
+    )
+    env.update(extra_env)
+    return env
+
+
+class _StdioSession:
+    """与子进程中的 MCP Server 交换 JSON-RPC 行；读线程按 id 唤醒等待者。"""
+
+    def __init__(self, env: Mapping[str, str]) -> None:
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "perplexity_unofficial_mcp.cli"],
+            cwd=str(REPO_ROOT),
+            env=dict(env),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._write_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._responses: Dict[Any, Dict[str, Any]] = {}
+        self._on_response: Optional[Any] = None
+        self._reader = threading.Thread(target=self._read, name="bench-reader", daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        assert self.proc.stdout is not None
+        for line in self.proc.stdout:
+            msg = json.loads(line)
+            if not isinstance(msg, dict) or "id" not in msg:
+                continue
+            received_at = time.perf_counter()
+            if self._on_response is not None:
+                self._on_response(msg, received_at)
+                continue
+            with self._cond:
+                self._responses[msg["id"]] = msg
+                self._cond.notify_all()
+
+    def send(self, msg: Mapping[str, Any]) -> None:
+        assert self.proc.stdin is not None
+        data = (json.dumps(msg, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._write_lock:
+            self.proc.stdin.write(data)
+            self.proc.stdin.flush()
+
+    def request(self, msg: Mapping[str, Any], timeout: float = 30.0) -> Dict[str, Any]:
+        self.send(msg)
+        with self._cond:
+            if not self._cond.wait_for(lambda: msg["id"] in self._responses, timeout):
+                raise TimeoutError(f"等待响应超时：{msg.get('method')}")
+            return self._responses.pop(msg["id"])
+
+    def close(self) -> Dict[str, float]:
+        """关闭 stdin 等待进程退出，返回子进程的 CPU 时间（秒）与峰值 RSS（MB）。"""
+        assert self.proc.stdin is not None
+        self.proc.stdin.close()
+        _pid, status, usage = os.wait4(self.proc.pid, 0)
+        self.proc.returncode = os.waitstatus_to_exitcode(status)
+        self._reader.join(5)
+        # Linux 下 ru_maxrss 单位为 KB，macOS 为字节
+        rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+        return {"cpu_s": usage.ru_utime + usage.ru_stime, "max_rss_mb": rss_mb}
+
+
+def _query_stream(total: int, repeat_ratio: float, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    hot = [f"hot question {i}" for i in range(8)]
+    return [rng.choice(hot) if rng.random() < repeat_ratio else f"unique question {i}" for i in range(total)]
+
+
+def run_level(
+    *,
+    profile: Mapping[str, Any],
+    tool: str,
+    concurrency: int,
+    requests: int,
+    workers: Optional[int] = None,
+    repeat_ratio: float = 0.0,
+    extra_env: Optional[Mapping[str, str]] = None,
+) -> Dict[str, Any]:
+    """
+    以固定并发（闭环：每完成一个请求补发一个）向新启动的 Server 发送 requests 个 tools/call。
+
+    CPU 与峰值内存取自子进程退出时的 rusage，包含解释器启动与导入的固定成本；请求数越多越接近稳态值。
+    """
+    session = _StdioSession(_server_env(profile, workers=workers or concurrency, extra_env=extra_env or {}))
+    try:
+        session.request(
+            {
+                "jsonrpc": "2.0",
+                "id": "init",
+                "method": "initialize",
+                "params": {"protocolVersion": "2024-11-05", "capabilities": {}},
+            }
+        )
+        session.send({"jsonrpc": "2.0", "method": "notifications/initialized"})
+
+        queries = _query_stream(requests, repeat_ratio, seed=int(profile.get("seed") or 0))
+        sent_at: Dict[int, float] = {}
+        latencies_ms: List[float] = []
+        errors = 0
+        response_bytes = 0
+        slots = threading.Semaphore(concurrency)
+        finished = threading.Event()
+        lock = threading.Lock()
+
+        def on_response(msg: Dict[str, Any], received_at: float) -> None:
+            nonlocal errors, response_bytes
+            with lock:
+                latencies_ms.append((received_at - sent_at.pop(msg["id"])) * 1000)
+                result = msg.get("result") or {}
+                if "error" in msg or result.get("isError"):
+                    errors += 1
+                response_bytes += len(json.dumps(msg, ensure_ascii=False).encode("utf-8"))
+                if len(latencies_ms) == requests:
+                    finished.set()
+            slots.release()
+
+        session._on_response = on_response
+        started = time.perf_counter()
+        for idx, query in enumerate(queries):
+            slots.acquire()
+            with lock:
+                sent_at[idx] = time.perf_counter()
+            session.send(
+                {
+                    "jsonrpc": "2.0",
+                    "id": idx,
+                    "method": "tools/call",
+                    "params": {"name": tool, "arguments": {"query": query}},
+                }
+            )
+        if requests:
+            finished.wait()
+        elapsed_s = time.perf_counter() - started
+
+        session._on_response = None
+        metrics = session.request(
+            {
+                "jsonrpc": "2.0",
+                "id": "metrics",
+                "method": "resources/read",
+                "params": {"uri": "perplexity://metrics"},
+            }
+        )
+    finally:
+        usage = session.close()
+
+    server_hist = _server_histograms(metrics)
+    return {
+        "tool": tool,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed_s, 3),
+        "rps": round(requests / elapsed_s, 1) if elapsed_s > 0 else None,
+        "p50_ms": _round(percentile(latencies_ms, 0.50)),
+        "p95_ms": _round(percentile(latencies_ms, 0.95)),
+        "p99_ms": _round(percentile(latencies_ms, 0.99)),
+        "max_ms": _round(max(latencies_ms) if latencies_ms else None),
+        "avg_response_bytes": int(response_bytes / requests) if requests else 0,
+        "cpu_ms_per_request": round(usage["cpu_s"] * 1000 / requests, 3) if requests else None,
+        "max_rss_mb": round(usage["max_rss_mb"], 1),
+        "server_serialize_p99_ms": _round(server_hist.get("mcp_serialize_ms", {}).get("p99")),
+        "server_queue_p99_ms": _round(server_hist.get("mcp_tool_queue_ms", {}).get("p99")),
+    }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 2)
+
+
+def _server_histograms(response: Mapping[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """从 perplexity://metrics 快照中取各直方图（同名多组标签时取样本数最多的一组）。"""
+    try:
+        snapshot = json.loads(response["result"]["contents"][0]["text"])
+    except (KeyError, IndexError, TypeError, ValueError):
+        return {}
+    result: Dict[str, Dict[str, Any]] = {}
+    for hist in snapshot.get("histograms", []):
+        current = result.get(hist["name"])
+        if current is None or hist["count"] > current["count"]:
+            result[hist["name"]] = hist
+    return result
+
+
+_COLUMNS = (
+    ("concurrency", "conc"),
+    ("rps", "req/s"),
+    ("p50_ms", "p50ms"),
+    ("p95_ms", "p95ms"),
+    ("p99_ms", "p99ms"),
+    ("errors", "errors"),
+    ("cpu_ms_per_request", "cpu ms/req"),
+    ("max_rss_mb", "rss MB"),
+    ("avg_response_bytes", "bytes/resp"),
+    ("server_serialize_p99_ms", "ser p99ms"),
+)
+
+
+def format_table(rows: Sequence[Mapping[str, Any]]) -> str:
+    header = [title for _key, title in _COLUMNS]
+    body = [["-" if row.get(key) is None else str(row.get(key)) for key, _title in _COLUMNS] for row in rows]
+    widths = [max(len(cell) for cell in column) for column in zip(header, *body)]
+    lines = ["  ".join(cell.rjust(w) for cell, w in zip(line, widths)) for line in [header] + body]
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="perplexity-unofficial-mcp 离线 STDIO 基准")
+    parser.add_argument("--profile", default="overhead", help=f"内置配置（{', '.join(PROFILES)}）或 JSON 文件路径")
+    parser.add_argument("--tool", default="perplexity_search")
+    parser.add_argument("--concurrency", default="1,4,16", help="逗号分隔的并发级别")
+    parser.add_argument("--requests", type=int, default=200, help="每个并发级别发送的请求数")
+    parser.add_argument("--workers", type=int, default=None, help="服务端工作线程数（默认等于并发级别）")
+    parser.add_argument("--repeat-ratio", type=float, default=0.0, help="重复查询占比（用于测量缓存命中路径）")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="额外传给服务端的环境变量")
+    parser.add_argument("--json", dest="json_path", default=None, help="把结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    if args.profile in PROFILES:
+        profile = PROFILES[args.profile]
+    else:
+        profile = json.loads(Path(args.profile).read_text(encoding="utf-8"))
+    extra_env = dict(item.split("=", 1) for item in args.env)
+
+    rows = []
+    for level in [int(x) for x in args.concurrency.split(",") if x.strip()]:
+        rows.append(
+            run_level(
+                profile=profile,
+                tool=args.tool,
+                concurrency=level,
+                requests=args.requests,
+                workers=args.workers,
+                repeat_ratio=args.repeat_ratio,
+                extra_env=extra_env,
+            )
+        )
+        print(format_table(rows[-1:]) if len(rows) == 1 else format_table(rows).splitlines()[-1], flush=True)
+
+    if args.json_path:
+        Path(args.json_path).write_text(
+            json.dumps({"profile": profile, "results": rows}, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Sequence
+
+from .config import AccountConfig
+from .context import RequestContext
+
+
+class AccountUnavailableError(Exception):
+    """在截止时间内没有可用账号（全部达到并发上限）。"""
+
+
+@dataclass
+class AccountState:
+    account: AccountConfig
+    inflight: int = 0
+    cooldown_until: float = 0.0
+    total: int = 0
+    failures: int = 0
+
+    def cooling(self, now: float) -> bool:
+        return self.cooldown_until > now
+
+
+@dataclass(frozen=True)
+class AccountLease:
+    account: AccountConfig
+
+
+class AccountPool:
+    """
+    多账号调度：最少在途优先（相同时轮询），遵守每个账号的并发上限，
+    限流/鉴权失败后让账号冷却一段时间；续问按 backend_uuid 粘滞回创建该会话的账号。
+
+    说明：
+    - 全部账号都在冷却时不直接失败，而是选择最早结束冷却的账号（单账号部署时等价于照常调用）
+    - 全部账号都达到并发上限时按 ctx 的截止时间等待空位
+    """
+
+    # 粘滞路由表上限：超过后淘汰最久未使用的会话
+    max_sticky_threads: int = 10_000
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._states: Dict[str, AccountState] = {}
+        self._sticky: "OrderedDict[str, str]" = OrderedDict()
+        self._rr = itertools.count()
+
+    def _sync(self, accounts: Sequence[AccountConfig]) -> None:
+        for account in accounts:
+            state = self._states.get(account.name)
+            if state is None or state.account != account:
+                inflight = state.inflight if state is not None else 0
+                self._states[account.name] = AccountState(account=account, inflight=inflight)
+
+    def _pick(self, accounts: Sequence[AccountConfig], *, sticky: Optional[str], exclude: Iterable[str]) -> Optional[AccountState]:
+        now = time.monotonic()
+        excluded = set(exclude)
+        if sticky is not None and sticky in self._states and sticky not in excluded:
+            state = self._states[sticky]
+            return state if state.inflight < state.account.max_concurrency else None
+
+        states = [self._states[a.name] for a in accounts if a.name not in excluded]
+        available = [s for s in states if s.inflight < s.account.max_concurrency]
+        if not available:
+            return None
+        ready = [s for s in available if not s.cooling(now)]
+        if not ready:
+            return min(available, key=lambda s: s.cooldown_until)
+        least = min(s.inflight for s in ready)
+        candidates = [s for s in ready if s.inflight == least]
+        return candidates[next(self._rr) % len(candidates)]
+
+    def acquire(
+        self,
+        accounts: Sequence[AccountConfig],
+        *,
+        backend_uuid: Optional[str] = None,
+        prefer: Optional[str] = None,
+        exclude: Iterable[str] = (),
+        ctx: Optional[RequestContext] = None,
+    ) -> AccountLease:
+        """
+        选择账号。续问优先按粘滞路由表回到创建会话的账号；路由表中没有时使用 prefer（例如会话登记表记录的账号）。
+        """
+        exclude = tuple(exclude)
+        with self._cond:
+            self._sync(accounts)
+            sticky = self._sticky.get(backend_uuid) if backend_uuid else None
+            if sticky is not None:
+                self._sticky.move_to_end(backend_uuid)  # type: ignore[arg-type]
+            elif prefer is not None and prefer in self._states:
+                sticky = prefer
+            while True:
+                state = self._pick(accounts, sticky=sticky, exclude=exclude)
+                if state is not None:
+                    state.inflight += 1
+                    state.total += 1
+                    return AccountLease(account=state.account)
+                if ctx is not None and (ctx.cancelled or ctx.expired):
+                    raise AccountUnavailableError("等待可用账号超时")
+                remaining = ctx.remaining_s() if ctx is not None else None
+                # 取消信号不经过 Condition，按较短间隔轮询
+                self._cond.wait(0.2 if remaining is None else min(0.2, max(remaining, 0.0)))
+
+    def release(self, lease: AccountLease, *, failure_kind: Optional[str] = None, cooldown_s: float = 0.0) -> None:
+        """
+        归还账号。failure_kind 为 "rate_limited" / "auth" 时让账号冷却 cooldown_s 秒。
+        """
+        with self._cond:
+            state = self._states.get(lease.account.name)
+            if state is not None:
+                state.inflight = max(0, state.inflight - 1)
+                if failure_kind is not None:
+                    state.failures += 1
+                if failure_kind in {"rate_limited", "auth"} and cooldown_s > 0:
+                    state.cooldown_until = max(state.cooldown_until, time.monotonic() + cooldown_s)
+            self._cond.notify_all()
+
+    def bind_thread(self, backend_uuid: str, account_name: str) -> None:
+        with self._cond:
+            self._sticky[backend_uuid] = account_name
+            self._sticky.move_to_end(backend_uuid)
+            while len(self._sticky) > self.max_sticky_threads:
+                self._sticky.popitem(last=False)
+
+    def account_for_thread(self, backend_uuid: str) -> Optional[str]:
+        with self._cond:
+            return self._sticky.get(backend_uuid)
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        now = time.monotonic()
+        with self._cond:
+            return {
+                name: {
+                    "inflight": s.inflight,
+                    "total": s.total,
+                    "failures": s.failures,
+                    "coolingDownS": max(0, int(s.cooldown_until - now)),
+                }
+                for name, s in self._states.items()
+            }
+
+    def clear(self) -> None:
+        with self._cond:
+            self._states.clear()
+            self._sticky.clear()
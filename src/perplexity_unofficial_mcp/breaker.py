@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 导出为指标时的数值（0 正常 / 1 探测中 / 2 熔断）
+STATE_VALUES: Dict[str, int] = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+StateListener = Callable[[str, str, Dict[str, Any]], None]
+
+
+class CircuitBreaker:
+    """
+    上游熔断器：连续失败达到阈值后进入 open，冷却期内的调用直接失败，不再占用账号与工作线程。
+
+    说明：
+    - 冷却结束后进入 half_open，只放行一个探测调用（allow() 返回探测令牌）：成功则恢复 closed，失败则重新 open
+    - 探测调用既未成功也未失败（例如被客户端取消）时以其令牌调用 release_probe() 让出探测名额；
+      不持有当前令牌的调用方无法释放，避免同时放行多个探测
+    - threshold 是连续失败次数（任一成功即清零）：closed 下累计达到阈值即 open；half_open 的探测失败直接重新 open，不再计数
+    - 每次进入 open 都持续 cooldown_s 秒，期间 allow() / retry_after() 返回剩余秒数；threshold 为 0 表示关闭熔断（一律放行、不计数）
+    - 状态变化通过 listener 回调通知（回调在锁外执行）
+    """
+
+    def __init__(self, listener: Optional[StateListener] = None) -> None:
+        self._lock = threading.Lock()
+        self._listener = listener
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_until = 0.0
+        self._probe: Optional[int] = None
+        self._tokens = itertools.count(1)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self, *, threshold: int) -> Tuple[Optional[float], Optional[int]]:
+        """
+        判断本次调用能否发往上游，返回（等待秒数, 探测令牌）。
+
+        可以发出时等待秒数为 None；本次调用是 half_open 的探测调用时同时返回探测令牌，否则令牌为 None。
+        熔断中返回距离下次探测的秒数（探测进行中为 0）。
+        """
+        if threshold <= 0:
+            return None, None
+        now = time.monotonic()
+        with self._lock:
+            if self._state == CLOSED:
+                return None, None
+            if self._state == OPEN:
+                if now < self._opened_until:
+                    return self._opened_until - now, None
+                changed = self._transition(HALF_OPEN)
+            else:
+                changed = None
+            if self._probe is not None:
+                return 0.0, None
+            probe = self._probe = next(self._tokens)
+        self._notify(changed)
+        return None, probe
+
+    def retry_after(self, *, threshold: int) -> Optional[float]:
+        """
+        不占用探测名额的只读判断：现在发起的调用会被放行时返回 None，否则返回等待秒数（与 allow 一致）。
+        """
+        if threshold <= 0:
+            return None
+        with self._lock:
+            if self._state == OPEN:
+                remaining = self._opened_until - time.monotonic()
+                return remaining if remaining > 0 else None
+            if self._state == HALF_OPEN and self._probe is not None:
+                return 0.0
+            return None
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probe = None
+            changed = self._transition(CLOSED) if self._state != CLOSED else None
+        self._notify(changed)
+
+    def record_failure(self, *, threshold: int, cooldown_s: float, kind: str) -> None:
+        if threshold <= 0:
+            return
+        with self._lock:
+            self._failures += 1
+            changed = None
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= threshold):
+                self._opened_until = time.monotonic() + cooldown_s
+                self._probe = None
+                changed = self._transition(OPEN, kind=kind, cooldownS=cooldown_s)
+        self._notify(changed)
+
+    def release_probe(self, probe: Optional[int]) -> None:
+        """让出探测名额；probe 不是当前的探测令牌（包括 None）时不做任何事。"""
+        with self._lock:
+            if probe is not None and probe == self._probe:
+                self._probe = None
+
+    def _transition(self, new_state: str, **info: Any) -> Dict[str, Any]:
+        old_state = self._state
+        self._state = new_state
+        return {"from": old_state, "to": new_state, "failures": self._failures, **info}
+
+    def _notify(self, changed: Optional[Dict[str, Any]]) -> None:
+        if changed is None or self._listener is None:
+            return
+        info = dict(changed)
+        self._listener(info.pop("from"), info.pop("to"), info)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "state": self._state,
+                "failures": self._failures,
+                "openForS": max(0, int(self._opened_until - now)) if self._state == OPEN else 0,
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._opened_until = 0.0
+            self._probe = None
+
+
+class CircuitBreakers:
+    """
+    按 (账号, 通道) 分开的熔断器表：单个账号失效或重型调用变慢不会连带熔断其他账号与交互型调用。
+
+    状态变化回调额外带上 account / lane 字段。
+    """
+
+    def __init__(self, listener: Optional[StateListener] = None) -> None:
+        self._lock = threading.Lock()
+        self._listener = listener
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+
+    def get(self, account: str, lane: str) -> CircuitBreaker:
+        key = (account, lane)
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(self._keyed_listener(account, lane))
+            return breaker
+
+    def _keyed_listener(self, account: str, lane: str) -> Optional[StateListener]:
+        listener = self._listener
+        if listener is None:
+            return None
+        return lambda old, new, info: listener(old, new, {"account": account, "lane": lane, **info})
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = list(self._breakers.items())
+        return [{"account": account, "lane": lane, **breaker.snapshot()} for (account, lane), breaker in items]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._breakers.clear()
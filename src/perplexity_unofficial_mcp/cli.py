@@ -1,14 +1,20 @@
 import sys
 
+from .mcp_http import run_http_server
 from .mcp_stdio import run_stdio_server
+from .server import load_config_or_log
 
 
 def main() -> None:
     """
-    CLI 入口：启动 MCP STDIO Server。
+    CLI 入口：按 PERPLEXITY_TRANSPORT 启动 MCP STDIO（默认）或 Streamable HTTP Server。
     """
     try:
-        run_stdio_server()
+        config = load_config_or_log()
+        if config.transport == "http":
+            run_http_server(config)
+        else:
+            run_stdio_server(config)
     except Exception:
         # 任何未捕获异常都必须走 stderr，避免污染 stdout
         raise
@@ -16,4 +22,3 @@ def main() -> None:
 
 if __name__ == "__main__":
     main()
-
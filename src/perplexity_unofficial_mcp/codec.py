@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import json
+import queue
+import sys
+import threading
+import time
+from typing import Any, Callable, List, Optional, TextIO
+
+
+class CodecDecodeError(ValueError):
+    """JSON 解析失败（统一不同后端各自的异常类型）。"""
+
+
+class JsonCodec:
+    """
+    JSON 编解码后端（标准库实现）。
+
+    输出约定：不转义非 ASCII 字符、不含换行，保证“一行一条消息”。
+    """
+
+    name = "stdlib"
+
+    def dumps(self, obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False)
+
+    def dumps_bytes(self, obj: Any) -> bytes:
+        return self.dumps(obj).encode("utf-8")
+
+    def loads(self, data: str) -> Any:
+        try:
+            return json.loads(data)
+        except json.JSONDecodeError as exc:
+            raise CodecDecodeError(str(exc)) from exc
+
+
+class _OrjsonCodec(JsonCodec):
+    name = "orjson"
+
+    def __init__(self) -> None:
+        import orjson
+
+        self._orjson = orjson
+
+    def dumps(self, obj: Any) -> str:
+        try:
+            return self._orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            # orjson 不支持的输入（例如非字符串 key、超过 64 位的整数）回退标准库
+            return super().dumps(obj)
+
+    def dumps_bytes(self, obj: Any) -> bytes:
+        try:
+            return self._orjson.dumps(obj)
+        except TypeError:
+            return super().dumps(obj).encode("utf-8")
+
+    def loads(self, data: str) -> Any:
+        try:
+            return self._orjson.loads(data)
+        except self._orjson.JSONDecodeError as exc:
+            raise CodecDecodeError(str(exc)) from exc
+
+
+class _MsgspecCodec(JsonCodec):
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        import msgspec
+
+        self._msgspec = msgspec
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj: Any) -> str:
+        try:
+            return self._encoder.encode(obj).decode("utf-8")
+        except (TypeError, OverflowError):
+            return super().dumps(obj)
+
+    def dumps_bytes(self, obj: Any) -> bytes:
+        try:
+            return self._encoder.encode(obj)
+        except (TypeError, OverflowError):
+            return super().dumps(obj).encode("utf-8")
+
+    def loads(self, data: str) -> Any:
+        try:
+            return self._decoder.decode(data)
+        except self._msgspec.DecodeError as exc:
+            raise CodecDecodeError(str(exc)) from exc
+
+
+CODEC_NAMES = ("auto", "stdlib", "orjson", "msgspec")
+
+_FACTORIES = {
+    "stdlib": JsonCodec,
+    "orjson": _OrjsonCodec,
+    "msgspec": _MsgspecCodec,
+}
+
+
+def resolve_codec(name: str = "auto") -> JsonCodec:
+    """
+    按名称创建编解码后端：auto 依次尝试 orjson、msgspec，均未安装时使用标准库。
+
+    显式指定的可选后端未安装时同样回退标准库（调用方可通过 codec.name 判断实际后端）。
+    """
+    candidates = ["orjson", "msgspec", "stdlib"] if name == "auto" else [name, "stdlib"]
+    for candidate in candidates:
+        try:
+            return _FACTORIES[candidate]()
+        except ImportError:
+            continue
+    return JsonCodec()
+
+
+_CODEC: JsonCodec = resolve_codec("auto")
+
+
+def get_codec() -> JsonCodec:
+    return _CODEC
+
+
+def use_codec(name: str) -> JsonCodec:
+    global _CODEC
+    _CODEC = resolve_codec(name)
+    return _CODEC
+
+
+def dumps(obj: Any) -> str:
+    return _CODEC.dumps(obj)
+
+
+def loads(data: str) -> Any:
+    return _CODEC.loads(data)
+
+
+class LineWriter:
+    """
+    后台写线程：调用方只把消息对象放入队列，序列化与写入都在写线程中完成。
+
+    说明：
+    - 写线程每次取出队列中已积压的全部消息，编码后合并为一次 write + flush（负载高时自动合并系统调用）
+    - 队列为空时立即写出单条消息，低负载下不引入额外延迟
+    - 每条消息编码为一行；同一调用方先后写入的消息保持顺序
+    - 流对象在写入时通过 stream_getter 获取（便于测试或运行期替换 sys.stdout / sys.stderr）
+    - 设置 max_queue 后队列有界：积压已满时丢弃新消息并计数（用于日志，对端不读 stderr 时不阻塞调用方）；
+      之后下一次成功写出时追加一条 drop_notice(丢弃条数) 生成的消息
+    - 单条消息无法编码时改写 encode_error(消息, 异常) 返回的替代消息（例如同 id 的错误响应）；未提供或返回 None 时丢弃该条
+    - 每次写出后调用 on_write(消息数, 总字节数, 各条编码耗时毫秒, 各条字节数)，字节数取自本次编码，不另行序列化
+    """
+
+    # 单次合并写入的最大消息数，避免极端积压时单次 write 过大
+    max_batch: int = 256
+
+    def __init__(
+        self,
+        stream_getter: Callable[[], TextIO],
+        *,
+        name: str = "mcp-writer",
+        max_queue: Optional[int] = None,
+        drop_notice: Optional[Callable[[int], Any]] = None,
+        on_write: Optional[Callable[[int, int, List[float], List[int]], None]] = None,
+        encode_error: Optional[Callable[[Any, Exception], Any]] = None,
+    ) -> None:
+        self._stream_getter = stream_getter
+        self._encode_error = encode_error
+        self._on_write = on_write
+        self.max_queue = max_queue
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._drop_notice = drop_notice
+        self.dropped = 0
+        self._unreported_drops = 0
+        self._closed = False
+        self._state_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def write(self, obj: Any) -> bool:
+        """
+        放入写队列；有界队列已满而丢弃时返回 False。
+        """
+        with self._state_lock:
+            if not self._closed:
+                if self.max_queue is not None and self._queue.qsize() >= self.max_queue:
+                    self.dropped += 1
+                    self._unreported_drops += 1
+                    return False
+                self._queue.put(obj)
+                return True
+        # 关闭后的零星写入（例如退出阶段的日志）直接同步写出
+        self._write_lines([obj])
+        return True
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch: List[Any] = [first]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            if self._drop_notice is not None and self._unreported_drops:
+                with self._state_lock:
+                    dropped, self._unreported_drops = self._unreported_drops, 0
+                batch.append(self._drop_notice(dropped))
+            self._write_lines(batch)
+            if stop:
+                return
+
+    def _write_lines(self, batch: List[Any]) -> None:
+        codec = _CODEC
+        lines: List[bytes] = []
+        encode_ms: List[float] = []
+        sizes: List[int] = []
+        for obj in batch:
+            started = time.perf_counter()
+            try:
+                lines.append(codec.dumps_bytes(obj) + b"\n")
+            except Exception as exc:  # noqa: BLE001
+                # 单条消息无法编码时只影响该条：改写替代消息，否则丢弃
+                replacement = self._encode_error(obj, exc) if self._encode_error is not None else None
+                if replacement is None:
+                    continue
+                try:
+                    lines.append(codec.dumps_bytes(replacement) + b"\n")
+                except Exception:  # noqa: BLE001
+                    continue
+            encode_ms.append((time.perf_counter() - started) * 1000)
+            sizes.append(len(lines[-1]) - 1)
+        if not lines:
+            return
+        data = b"".join(lines)
+        with self._lock:
+            stream = self._stream_getter()
+            # 优先直接写底层字节流，省去一次解码；测试替身等纯文本流则按 UTF-8 解码后写入
+            buffer = getattr(stream, "buffer", None)
+            try:
+                if buffer is not None:
+                    stream.flush()
+                    buffer.write(data)
+                    buffer.flush()
+                else:
+                    stream.write(data.decode("utf-8"))
+                    stream.flush()
+            except (OSError, ValueError):
+                # 对端已关闭（管道断开 / 流已关闭）：无处可写，静默丢弃
+                return
+        if self._on_write is not None:
+            self._on_write(len(lines), len(data), encode_ms, sizes)
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """
+        写出队列中剩余的消息并停止写线程。
+        """
+        with self._state_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+
+_STOP = object()
+
+
+def stdout_stream() -> TextIO:
+    return sys.stdout
+
+
+def stderr_stream() -> TextIO:
+    return sys.stderr
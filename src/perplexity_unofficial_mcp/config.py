@@ -1,17 +1,152 @@
+import json
 import os
 import secrets
-from dataclasses import dataclass
-from typing import Any, Dict, Mapping, Optional
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
 
 class ConfigError(Exception):
     """配置错误（例如 Cookies 缺失或 JSON 无法解析）。"""
 
 
+@dataclass(frozen=True)
+class AccountConfig:
+    """一组 Perplexity 登录凭据（Cookies）及其并发上限。"""
+
+    name: str
+    cookies: Mapping[str, str]
+    max_concurrency: int = 4
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """period_s 秒内最多 count 次（令牌桶容量为 count，允许该规模的突发）。"""
+
+    count: int
+    period_s: float
+
+
 @dataclass(frozen=True)
 class AppConfig:
     cookies: Mapping[str, str]
     timeout_ms: int
+    # tools/call 并发执行的工作线程数；控制类方法（ping / tools/list 等）始终在读循环内直接应答
+    max_workers: int = 4
+    # 调度通道并发上限：heavy（research/reason）与 light（search/ask）分开排队，light 优先派发
+    heavy_lane_concurrency: int = 2
+    light_lane_concurrency: int = 4
+    # 每组 Cookies 最多缓存的空闲 SDK Client 数；单个 Client 复用满 client_max_uses 次后回收重建
+    client_pool_size: int = 4
+    client_max_uses: int = 200
+    # 按工具名覆盖 timeout_ms（例如 deep research 需要更长的截止时间）
+    tool_timeouts_ms: Mapping[str, int] = field(default_factory=dict)
+    # 客户端提供 progressToken 时是否以流式方式调用上游并推送 notifications/progress
+    stream: bool = True
+    # 进程内响应缓存：容量为 0 表示关闭；TTL 可按工具覆盖（0 表示该工具不缓存）
+    cache_max_entries: int = 256
+    cache_ttl_s: int = 300
+    cache_tool_ttls_s: Mapping[str, int] = field(default_factory=dict)
+    # 多账号池：为空时仅使用 cookies 对应的单账号；账号在限流/鉴权失败后冷却 account_cooldown_s 秒
+    accounts: Tuple[AccountConfig, ...] = ()
+    account_cooldown_s: int = 60
+    # 客户端侧限流：按实际 mode 与按账号的令牌桶；超出速率的请求排队，最长等待 rate_limit_max_wait_ms
+    mode_rate_limits: Mapping[str, RateLimit] = field(default_factory=dict)
+    account_rate_limit: Optional[RateLimit] = None
+    rate_limit_max_wait_ms: int = 30_000
+    # 上游失败重试：可重试的失败（网络抖动 / 上游 5xx / 上游限流）最多重试 retry_max 次，退避为带抖动的指数退避
+    retry_max: int = 2
+    retry_base_ms: int = 250
+    retry_max_delay_ms: int = 4_000
+    # 上游熔断（按账号与 heavy/light 通道分开）：连续失败 breaker_threshold 次后熔断 breaker_cooldown_s 秒（阈值为 0 关闭）
+    breaker_threshold: int = 5
+    breaker_cooldown_s: int = 30
+    # 对冲调用（仅 perplexity_ask / perplexity_search 的新对话）：主调用超过 hedge_delay_ms（0 表示按最近耗时的
+    # hedge_percentile 分位自动学习）仍未返回时再发起一个相同调用，取先返回者；对冲比例不超过 hedge_max_ratio
+    hedge: bool = False
+    hedge_delay_ms: int = 0
+    hedge_percentile: float = 0.95
+    hedge_max_ratio: float = 0.1
+    # 按负载降级 mode（pro → auto、reasoning → pro，仅新对话）：排队深度、在途上游调用数、该 mode 最近上游耗时
+    # 任一达到阈值即降级；阈值为 0 表示不看该信号
+    degrade: bool = False
+    degrade_queue_depth: int = 4
+    degrade_inflight: int = 0
+    degrade_latency_ms: int = 0
+    # 传输方式："stdio"（每个客户端一个进程）或 "http"（Streamable HTTP，单进程服务多个会话）
+    transport: str = "stdio"
+    http_host: str = "127.0.0.1"
+    http_port: int = 8765
+    # 额外允许的浏览器 Origin（本机 Origin 始终允许；不带 Origin 的请求视为非浏览器客户端）
+    http_allowed_origins: Tuple[str, ...] = ()
+    # HTTP 会话：空闲多久后过期（秒，0 表示不过期）与最多保留的会话数（0 表示不限制）
+    http_session_idle_s: int = 3600
+    http_max_sessions: int = 1000
+    # 批量请求：默认全部成员完成后写回一个响应数组；开启后每个成员完成即单独写回
+    batch_stream_responses: bool = False
+    # perplexity_batch 工具：单次最多的子查询数与并行度（上游仍受账号并发与限流约束）
+    batch_tool_max_items: int = 10
+    batch_tool_concurrency: int = 4
+    # JSON 编解码后端：auto（优先 orjson / msgspec，未安装时用标准库）/ stdlib / orjson / msgspec
+    json_codec: str = "auto"
+    # 日志：最低级别、逐请求 info 日志采样率（0~1）、stderr 缓冲条数（满时丢弃并计数，不阻塞请求）
+    log_level: str = "info"
+    log_sample_rate: float = 1.0
+    log_buffer_size: int = 10_000
+    # 指标导出：定期写入 Prometheus 文本文件，和/或在独立端口提供 GET /metrics（HTTP 传输下 /metrics 始终可用）
+    metrics_file: Optional[str] = None
+    metrics_interval_s: int = 15
+    metrics_port: Optional[int] = None
+    # 工具结果裁剪（可被单次调用的 chunks / compact 参数覆盖）：
+    # chunks 返回方式 full（原样）/ trim（最多 response_chunks_max 条且合计不超过 response_chunks_max_bytes 字节）/
+    # summary（只给条数与字节数）/ none；compact 开启后 structuredContent 不再重复 content[0].text 中的回答
+    response_chunks: str = "full"
+    response_chunks_max: int = 10
+    response_chunks_max_bytes: int = 16_000
+    response_compact: bool = False
+    # structuredContent.sources：从上游响应中提取的去重来源条数上限（0 表示不提取）
+    response_sources_max: int = 20
+    # 启动预热（后台进行，不延迟 initialize）：off / import（预先导入 SDK）/ client（导入后为每个账号构造一个 Client 放入池中）
+    warmup: str = "import"
+    # 续问会话登记表：容量（0 关闭）、过期时间（超过该时长未使用的会话直接拒绝续问，0 不过期）、可选持久化文件
+    thread_max_entries: int = 1_000
+    thread_ttl_s: int = 86_400
+    thread_store_path: Optional[str] = None
+    # 本地答案库（SQLite）：配置路径后持久化每次上游问答并启用 perplexity_recall；超过容量淘汰最早的记录
+    store_path: Optional[str] = None
+    store_max_entries: int = 50_000
+
+    def timeout_ms_for_tool(self, tool_name: str) -> int:
+        return self.tool_timeouts_ms.get(tool_name, self.timeout_ms)
+
+    def cache_ttl_s_for_tool(self, tool_name: str) -> int:
+        return self.cache_tool_ttls_s.get(tool_name, self.cache_ttl_s)
+
+    def account_list(self) -> Tuple[AccountConfig, ...]:
+        if self.accounts:
+            return self.accounts
+        return (AccountConfig(name="default", cookies=self.cookies, max_concurrency=self.max_workers),)
+
+
+_TRANSPORTS = {"stdio", "http"}
+# 与 codec.CODEC_NAMES 一致；config 不导入编解码模块，避免加载配置时触发可选依赖导入
+_JSON_CODECS = {"auto", "stdlib", "orjson", "msgspec"}
+_LOG_LEVELS = {"debug", "info", "warn", "error"}
+# 与 tools.CHUNK_POLICIES 一致
+_CHUNK_POLICIES = {"full", "trim", "summary", "none"}
+_WARMUP_MODES = {"off", "import", "client"}
+
+
+def _parse_int(value: Optional[str], *, name: str, default: int, minimum: int = 1) -> int:
+    if not value:
+        return default
+    try:
+        parsed = int(value)
+    except ValueError as exc:
+        raise ConfigError(f"{name} 必须是整数") from exc
+    if parsed < minimum:
+        raise ConfigError(f"{name} 必须大于 0" if minimum == 1 else f"{name} 不能小于 {minimum}")
+    return parsed
 
 
 def _parse_timeout_ms(value: Optional[str]) -> int:
@@ -26,6 +161,76 @@ def _parse_timeout_ms(value: Optional[str]) -> int:
     return timeout_ms
 
 
+def _parse_ratio(value: Optional[str], *, name: str, default: float) -> float:
+    if value is None or not value.strip():
+        return default
+    try:
+        parsed = float(value)
+    except ValueError as exc:
+        raise ConfigError(f"{name} 必须是 0~1 之间的小数") from exc
+    if not 0.0 <= parsed <= 1.0:
+        raise ConfigError(f"{name} 必须是 0~1 之间的小数")
+    return parsed
+
+
+def _parse_bool(value: Optional[str], *, name: str, default: bool) -> bool:
+    if value is None or not value.strip():
+        return default
+    normalized = value.strip().lower()
+    if normalized in {"1", "true", "yes", "on"}:
+        return True
+    if normalized in {"0", "false", "no", "off"}:
+        return False
+    raise ConfigError(f"{name} 必须是布尔值（1/0、true/false）")
+
+
+def _parse_int_mapping(value: Optional[str], *, name: str, minimum: int = 1) -> Dict[str, int]:
+    """
+    解析形如 "key=123,other=456" 的映射配置，值必须为不小于 minimum 的整数。
+    """
+    result: Dict[str, int] = {}
+    if not value:
+        return result
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        key, sep, raw = item.partition("=")
+        key, raw = key.strip(), raw.strip()
+        if not sep or not key or not raw:
+            raise ConfigError(f"{name} 格式错误：应为 key=value，并以逗号分隔")
+        result[key] = _parse_int(raw, name=f"{name}[{key}]", default=0, minimum=minimum)
+    return result
+
+
+def _parse_rate_limit(value: str, *, name: str) -> RateLimit:
+    count_raw, sep, period_raw = value.partition("/")
+    if not sep:
+        raise ConfigError(f"{name} 格式错误：应为 次数/秒数，例如 30/60")
+    count = _parse_int(count_raw.strip(), name=name, default=0)
+    period_s = _parse_int(period_raw.strip(), name=name, default=0)
+    return RateLimit(count=count, period_s=float(period_s))
+
+
+def _parse_rate_limit_mapping(value: Optional[str], *, name: str) -> Dict[str, RateLimit]:
+    """
+    解析形如 "deep research=2/60,pro=30/60" 的按 mode 限流配置。
+    """
+    result: Dict[str, RateLimit] = {}
+    if not value:
+        return result
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        key, sep, raw = item.partition("=")
+        key, raw = key.strip(), raw.strip()
+        if not sep or not key or not raw:
+            raise ConfigError(f"{name} 格式错误：应为 mode=次数/秒数，并以逗号分隔")
+        result[key] = _parse_rate_limit(raw, name=f"{name}[{key}]")
+    return result
+
+
 def _random_placeholder_token() -> str:
     """
     生成随机占位 token。
@@ -59,6 +264,87 @@ def _load_cookies_from_env(e: Mapping[str, str]) -> Dict[str, str]:
     }
 
 
+def _make_cookies(csrf: str, session: str) -> Dict[str, str]:
+    return {"next-auth.csrf-token": csrf, "next-auth.session-token": session}
+
+
+def _load_accounts_file(path: str, *, default_concurrency: int) -> List[AccountConfig]:
+    """
+    账号文件为 JSON 数组，每项形如：
+    {"name": "a1", "csrf_token": "...", "session_token": "...", "max_concurrency": 2}
+    """
+    try:
+        raw = json.loads(Path(path).expanduser().read_text(encoding="utf-8"))
+    except OSError as exc:
+        raise ConfigError(f"无法读取 PERPLEXITY_ACCOUNTS_FILE：{exc.strerror or exc}") from exc
+    except json.JSONDecodeError as exc:
+        raise ConfigError("PERPLEXITY_ACCOUNTS_FILE 不是合法 JSON") from exc
+    if not isinstance(raw, list):
+        raise ConfigError("PERPLEXITY_ACCOUNTS_FILE 必须是 JSON 数组")
+
+    accounts: List[AccountConfig] = []
+    for idx, item in enumerate(raw):
+        if not isinstance(item, dict):
+            raise ConfigError(f"PERPLEXITY_ACCOUNTS_FILE[{idx}] 必须是对象")
+        csrf = item.get("csrf_token")
+        session = item.get("session_token")
+        if not isinstance(csrf, str) or not csrf.strip() or not isinstance(session, str) or not session.strip():
+            raise ConfigError(f"PERPLEXITY_ACCOUNTS_FILE[{idx}] 缺少 csrf_token / session_token")
+        name = item.get("name")
+        if not isinstance(name, str) or not name.strip():
+            name = f"file-{idx + 1}"
+        max_concurrency = item.get("max_concurrency", default_concurrency)
+        if not isinstance(max_concurrency, int) or isinstance(max_concurrency, bool) or max_concurrency <= 0:
+            raise ConfigError(f"PERPLEXITY_ACCOUNTS_FILE[{idx}].max_concurrency 必须是正整数")
+        accounts.append(
+            AccountConfig(
+                name=name.strip(),
+                cookies=_make_cookies(csrf.strip(), session.strip()),
+                max_concurrency=max_concurrency,
+            )
+        )
+    return accounts
+
+
+def _load_numbered_accounts(e: Mapping[str, str], *, default_concurrency: int) -> List[AccountConfig]:
+    """
+    读取 PERPLEXITY_CSRF_TOKEN_1 / PERPLEXITY_SESSION_TOKEN_1、..._2 ...，编号需从 1 连续递增。
+    """
+    accounts: List[AccountConfig] = []
+    idx = 1
+    while True:
+        csrf = (e.get(f"PERPLEXITY_CSRF_TOKEN_{idx}") or "").strip()
+        session = (e.get(f"PERPLEXITY_SESSION_TOKEN_{idx}") or "").strip()
+        if not csrf and not session:
+            break
+        if not csrf or not session:
+            raise ConfigError(f"PERPLEXITY_CSRF_TOKEN_{idx} 与 PERPLEXITY_SESSION_TOKEN_{idx} 必须同时提供")
+        accounts.append(
+            AccountConfig(name=f"env-{idx}", cookies=_make_cookies(csrf, session), max_concurrency=default_concurrency)
+        )
+        idx += 1
+    return accounts
+
+
+def _load_accounts(
+    e: Mapping[str, str], cookies: Mapping[str, str], *, default_concurrency: int
+) -> Tuple[AccountConfig, ...]:
+    accounts: List[AccountConfig] = []
+    accounts_file = (e.get("PERPLEXITY_ACCOUNTS_FILE") or "").strip()
+    if accounts_file:
+        accounts.extend(_load_accounts_file(accounts_file, default_concurrency=default_concurrency))
+    accounts.extend(_load_numbered_accounts(e, default_concurrency=default_concurrency))
+    if not accounts:
+        return ()
+    # 显式配置了主账号变量时，主账号同样加入账号池
+    if (e.get("PERPLEXITY_CSRF_TOKEN") or "").strip() and (e.get("PERPLEXITY_SESSION_TOKEN") or "").strip():
+        accounts.insert(0, AccountConfig(name="default", cookies=cookies, max_concurrency=default_concurrency))
+    names = [a.name for a in accounts]
+    if len(set(names)) != len(names):
+        raise ConfigError("账号名重复，请检查 PERPLEXITY_ACCOUNTS_FILE 中的 name")
+    return tuple(accounts)
+
+
 def load_config(env: Optional[Mapping[str, str]] = None) -> AppConfig:
     """
     从环境变量加载配置。
@@ -67,13 +353,194 @@ def load_config(env: Optional[Mapping[str, str]] = None) -> AppConfig:
     - PERPLEXITY_CSRF_TOKEN：可选（缺失/为空会自动生成占位值）
     - PERPLEXITY_SESSION_TOKEN：可选（缺失/为空会自动生成占位值）
     - PERPLEXITY_TIMEOUT_MS：可选
+    - PERPLEXITY_MAX_WORKERS：可选（tools/call 并发数，默认 4）
+    - PERPLEXITY_HEAVY_LANE_CONCURRENCY / PERPLEXITY_LIGHT_LANE_CONCURRENCY：可选（调度通道并发上限）
+    - PERPLEXITY_CLIENT_POOL_SIZE：可选（空闲 Client 上限，默认 4）
+    - PERPLEXITY_CLIENT_MAX_USES：可选（单个 Client 最大复用次数，默认 200）
+    - PERPLEXITY_TOOL_TIMEOUTS_MS：可选（按工具覆盖超时，如 "perplexity_research=900000"）
+    - PERPLEXITY_STREAM：可选（是否启用流式进度通知，默认开启）
+    - PERPLEXITY_CACHE_MAX_ENTRIES / PERPLEXITY_CACHE_TTL_S / PERPLEXITY_CACHE_TOOL_TTLS_S：可选（响应缓存）
+    - PERPLEXITY_ACCOUNTS_FILE / PERPLEXITY_CSRF_TOKEN_<n> + PERPLEXITY_SESSION_TOKEN_<n>：可选（多账号池）
+    - PERPLEXITY_ACCOUNT_MAX_CONCURRENCY / PERPLEXITY_ACCOUNT_COOLDOWN_S：可选（账号并发上限 / 冷却时长）
+    - PERPLEXITY_RATE_LIMITS / PERPLEXITY_ACCOUNT_RATE_LIMIT / PERPLEXITY_RATE_LIMIT_MAX_WAIT_MS：可选（客户端侧限流）
+    - PERPLEXITY_RETRY_MAX / PERPLEXITY_RETRY_BASE_MS / PERPLEXITY_RETRY_MAX_DELAY_MS：可选（上游失败重试次数与退避）
+    - PERPLEXITY_BREAKER_THRESHOLD / PERPLEXITY_BREAKER_COOLDOWN_S：可选（上游熔断阈值与冷却时长）
+    - PERPLEXITY_HEDGE / PERPLEXITY_HEDGE_DELAY_MS / PERPLEXITY_HEDGE_PERCENTILE / PERPLEXITY_HEDGE_MAX_RATIO：
+      可选（对冲调用开关、等待时长或自动学习的分位、对冲比例上限）
+    - PERPLEXITY_DEGRADE / PERPLEXITY_DEGRADE_QUEUE_DEPTH / PERPLEXITY_DEGRADE_INFLIGHT / PERPLEXITY_DEGRADE_LATENCY_MS：
+      可选（按负载降级 mode 的开关与各信号阈值）
+    - PERPLEXITY_TRANSPORT：可选（stdio / http，默认 stdio）
+    - PERPLEXITY_HTTP_HOST / PERPLEXITY_HTTP_PORT / PERPLEXITY_HTTP_ALLOWED_ORIGINS：可选（HTTP 传输监听地址与 Origin 白名单）
+    - PERPLEXITY_HTTP_SESSION_IDLE_S / PERPLEXITY_HTTP_MAX_SESSIONS：可选（HTTP 会话空闲过期时间与会话数上限）
+    - PERPLEXITY_BATCH_STREAM：可选（批量请求的成员响应是否逐条写回，默认关闭）
+    - PERPLEXITY_BATCH_TOOL_MAX_ITEMS / PERPLEXITY_BATCH_TOOL_CONCURRENCY：可选（perplexity_batch 子查询上限与并行度）
+    - PERPLEXITY_JSON_CODEC：可选（auto / stdlib / orjson / msgspec，默认 auto）
+    - PERPLEXITY_LOG_LEVEL / PERPLEXITY_LOG_SAMPLE_RATE / PERPLEXITY_LOG_BUFFER：可选（日志级别、采样率、缓冲条数）
+    - PERPLEXITY_METRICS_FILE / PERPLEXITY_METRICS_INTERVAL_S / PERPLEXITY_METRICS_PORT：可选（指标文件与抓取端口）
+    - PERPLEXITY_RESPONSE_CHUNKS / PERPLEXITY_RESPONSE_CHUNKS_MAX / PERPLEXITY_RESPONSE_CHUNKS_MAX_BYTES /
+      PERPLEXITY_RESPONSE_COMPACT：可选（工具结果中 chunks 的返回方式与上限、是否去掉重复的回答文本）
+    - PERPLEXITY_RESPONSE_SOURCES_MAX：可选（structuredContent.sources 的条数上限，0 关闭，默认 20）
+    - PERPLEXITY_WARMUP：可选（off / import / client，默认 import）
+    - PERPLEXITY_THREAD_MAX_ENTRIES / PERPLEXITY_THREAD_TTL_S / PERPLEXITY_THREAD_STORE：可选（续问会话登记表）
+    - PERPLEXITY_STORE_PATH / PERPLEXITY_STORE_MAX_ENTRIES：可选（本地答案库）
     """
     e = dict(env) if env is not None else os.environ
 
     cookies = _load_cookies_from_env(e)
 
     timeout_ms = _parse_timeout_ms(e.get("PERPLEXITY_TIMEOUT_MS"))
-    return AppConfig(cookies=cookies, timeout_ms=timeout_ms)
+    max_workers = _parse_int(e.get("PERPLEXITY_MAX_WORKERS"), name="PERPLEXITY_MAX_WORKERS", default=4)
+    heavy_lane_concurrency = _parse_int(
+        e.get("PERPLEXITY_HEAVY_LANE_CONCURRENCY"),
+        name="PERPLEXITY_HEAVY_LANE_CONCURRENCY",
+        default=max(1, max_workers // 2),
+    )
+    light_lane_concurrency = _parse_int(
+        e.get("PERPLEXITY_LIGHT_LANE_CONCURRENCY"), name="PERPLEXITY_LIGHT_LANE_CONCURRENCY", default=max_workers
+    )
+    client_pool_size = _parse_int(
+        e.get("PERPLEXITY_CLIENT_POOL_SIZE"), name="PERPLEXITY_CLIENT_POOL_SIZE", default=4
+    )
+    client_max_uses = _parse_int(
+        e.get("PERPLEXITY_CLIENT_MAX_USES"), name="PERPLEXITY_CLIENT_MAX_USES", default=200
+    )
+    tool_timeouts_ms = _parse_int_mapping(e.get("PERPLEXITY_TOOL_TIMEOUTS_MS"), name="PERPLEXITY_TOOL_TIMEOUTS_MS")
+    account_max_concurrency = _parse_int(
+        e.get("PERPLEXITY_ACCOUNT_MAX_CONCURRENCY"), name="PERPLEXITY_ACCOUNT_MAX_CONCURRENCY", default=max_workers
+    )
+    accounts = _load_accounts(e, cookies, default_concurrency=account_max_concurrency)
+    account_rate_limit_raw = (e.get("PERPLEXITY_ACCOUNT_RATE_LIMIT") or "").strip()
+    if accounts and accounts[0].name != "default":
+        # 未显式配置主账号时，以账号池中的第一个账号作为主 Cookies，避免使用占位值
+        cookies = dict(accounts[0].cookies)
+    transport = (e.get("PERPLEXITY_TRANSPORT") or "stdio").strip().lower()
+    if transport not in _TRANSPORTS:
+        raise ConfigError("PERPLEXITY_TRANSPORT 只能是 stdio 或 http")
+    json_codec = (e.get("PERPLEXITY_JSON_CODEC") or "auto").strip().lower()
+    if json_codec not in _JSON_CODECS:
+        raise ConfigError("PERPLEXITY_JSON_CODEC 只能是 auto、stdlib、orjson 或 msgspec")
+    log_level = (e.get("PERPLEXITY_LOG_LEVEL") or "info").strip().lower()
+    log_level = "warn" if log_level == "warning" else log_level
+    if log_level not in _LOG_LEVELS:
+        raise ConfigError("PERPLEXITY_LOG_LEVEL 只能是 debug、info、warn 或 error")
+    metrics_port_raw = (e.get("PERPLEXITY_METRICS_PORT") or "").strip()
+    response_chunks = (e.get("PERPLEXITY_RESPONSE_CHUNKS") or "full").strip().lower()
+    if response_chunks not in _CHUNK_POLICIES:
+        raise ConfigError("PERPLEXITY_RESPONSE_CHUNKS 只能是 full、trim、summary 或 none")
+    warmup = (e.get("PERPLEXITY_WARMUP") or "import").strip().lower()
+    if warmup not in _WARMUP_MODES:
+        raise ConfigError("PERPLEXITY_WARMUP 只能是 off、import 或 client")
+    return AppConfig(
+        cookies=cookies,
+        timeout_ms=timeout_ms,
+        max_workers=max_workers,
+        heavy_lane_concurrency=heavy_lane_concurrency,
+        light_lane_concurrency=light_lane_concurrency,
+        client_pool_size=client_pool_size,
+        client_max_uses=client_max_uses,
+        tool_timeouts_ms=tool_timeouts_ms,
+        stream=_parse_bool(e.get("PERPLEXITY_STREAM"), name="PERPLEXITY_STREAM", default=True),
+        cache_max_entries=_parse_int(
+            e.get("PERPLEXITY_CACHE_MAX_ENTRIES"), name="PERPLEXITY_CACHE_MAX_ENTRIES", default=256, minimum=0
+        ),
+        cache_ttl_s=_parse_int(e.get("PERPLEXITY_CACHE_TTL_S"), name="PERPLEXITY_CACHE_TTL_S", default=300, minimum=0),
+        cache_tool_ttls_s=_parse_int_mapping(
+            e.get("PERPLEXITY_CACHE_TOOL_TTLS_S"), name="PERPLEXITY_CACHE_TOOL_TTLS_S", minimum=0
+        ),
+        accounts=accounts,
+        account_cooldown_s=_parse_int(
+            e.get("PERPLEXITY_ACCOUNT_COOLDOWN_S"), name="PERPLEXITY_ACCOUNT_COOLDOWN_S", default=60, minimum=0
+        ),
+        mode_rate_limits=_parse_rate_limit_mapping(e.get("PERPLEXITY_RATE_LIMITS"), name="PERPLEXITY_RATE_LIMITS"),
+        account_rate_limit=(
+            _parse_rate_limit(account_rate_limit_raw, name="PERPLEXITY_ACCOUNT_RATE_LIMIT")
+            if account_rate_limit_raw
+            else None
+        ),
+        rate_limit_max_wait_ms=_parse_int(
+            e.get("PERPLEXITY_RATE_LIMIT_MAX_WAIT_MS"), name="PERPLEXITY_RATE_LIMIT_MAX_WAIT_MS", default=30_000, minimum=0
+        ),
+        retry_max=_parse_int(e.get("PERPLEXITY_RETRY_MAX"), name="PERPLEXITY_RETRY_MAX", default=2, minimum=0),
+        retry_base_ms=_parse_int(e.get("PERPLEXITY_RETRY_BASE_MS"), name="PERPLEXITY_RETRY_BASE_MS", default=250, minimum=0),
+        retry_max_delay_ms=_parse_int(
+            e.get("PERPLEXITY_RETRY_MAX_DELAY_MS"), name="PERPLEXITY_RETRY_MAX_DELAY_MS", default=4_000, minimum=0
+        ),
+        breaker_threshold=_parse_int(
+            e.get("PERPLEXITY_BREAKER_THRESHOLD"), name="PERPLEXITY_BREAKER_THRESHOLD", default=5, minimum=0
+        ),
+        breaker_cooldown_s=_parse_int(
+            e.get("PERPLEXITY_BREAKER_COOLDOWN_S"), name="PERPLEXITY_BREAKER_COOLDOWN_S", default=30, minimum=0
+        ),
+        hedge=_parse_bool(e.get("PERPLEXITY_HEDGE"), name="PERPLEXITY_HEDGE", default=False),
+        hedge_delay_ms=_parse_int(e.get("PERPLEXITY_HEDGE_DELAY_MS"), name="PERPLEXITY_HEDGE_DELAY_MS", default=0, minimum=0),
+        hedge_percentile=_parse_ratio(e.get("PERPLEXITY_HEDGE_PERCENTILE"), name="PERPLEXITY_HEDGE_PERCENTILE", default=0.95),
+        hedge_max_ratio=_parse_ratio(e.get("PERPLEXITY_HEDGE_MAX_RATIO"), name="PERPLEXITY_HEDGE_MAX_RATIO", default=0.1),
+        degrade=_parse_bool(e.get("PERPLEXITY_DEGRADE"), name="PERPLEXITY_DEGRADE", default=False),
+        degrade_queue_depth=_parse_int(
+            e.get("PERPLEXITY_DEGRADE_QUEUE_DEPTH"), name="PERPLEXITY_DEGRADE_QUEUE_DEPTH", default=max_workers, minimum=0
+        ),
+        degrade_inflight=_parse_int(
+            e.get("PERPLEXITY_DEGRADE_INFLIGHT"), name="PERPLEXITY_DEGRADE_INFLIGHT", default=0, minimum=0
+        ),
+        degrade_latency_ms=_parse_int(
+            e.get("PERPLEXITY_DEGRADE_LATENCY_MS"), name="PERPLEXITY_DEGRADE_LATENCY_MS", default=0, minimum=0
+        ),
+        transport=transport,
+        http_host=(e.get("PERPLEXITY_HTTP_HOST") or "127.0.0.1").strip(),
+        http_port=_parse_int(e.get("PERPLEXITY_HTTP_PORT"), name="PERPLEXITY_HTTP_PORT", default=8765, minimum=0),
+        http_allowed_origins=tuple(
+            o.strip().rstrip("/") for o in (e.get("PERPLEXITY_HTTP_ALLOWED_ORIGINS") or "").split(",") if o.strip()
+        ),
+        http_session_idle_s=_parse_int(
+            e.get("PERPLEXITY_HTTP_SESSION_IDLE_S"), name="PERPLEXITY_HTTP_SESSION_IDLE_S", default=3600, minimum=0
+        ),
+        http_max_sessions=_parse_int(
+            e.get("PERPLEXITY_HTTP_MAX_SESSIONS"), name="PERPLEXITY_HTTP_MAX_SESSIONS", default=1000, minimum=0
+        ),
+        batch_stream_responses=_parse_bool(e.get("PERPLEXITY_BATCH_STREAM"), name="PERPLEXITY_BATCH_STREAM", default=False),
+        batch_tool_max_items=_parse_int(
+            e.get("PERPLEXITY_BATCH_TOOL_MAX_ITEMS"), name="PERPLEXITY_BATCH_TOOL_MAX_ITEMS", default=10
+        ),
+        batch_tool_concurrency=_parse_int(
+            e.get("PERPLEXITY_BATCH_TOOL_CONCURRENCY"), name="PERPLEXITY_BATCH_TOOL_CONCURRENCY", default=light_lane_concurrency
+        ),
+        json_codec=json_codec,
+        log_level=log_level,
+        log_sample_rate=_parse_ratio(e.get("PERPLEXITY_LOG_SAMPLE_RATE"), name="PERPLEXITY_LOG_SAMPLE_RATE", default=1.0),
+        log_buffer_size=_parse_int(e.get("PERPLEXITY_LOG_BUFFER"), name="PERPLEXITY_LOG_BUFFER", default=10_000),
+        metrics_file=(e.get("PERPLEXITY_METRICS_FILE") or "").strip() or None,
+        metrics_interval_s=_parse_int(
+            e.get("PERPLEXITY_METRICS_INTERVAL_S"), name="PERPLEXITY_METRICS_INTERVAL_S", default=15
+        ),
+        metrics_port=(
+            _parse_int(metrics_port_raw, name="PERPLEXITY_METRICS_PORT", default=0, minimum=0)
+            if metrics_port_raw
+            else None
+        ),
+        response_chunks=response_chunks,
+        response_chunks_max=_parse_int(
+            e.get("PERPLEXITY_RESPONSE_CHUNKS_MAX"), name="PERPLEXITY_RESPONSE_CHUNKS_MAX", default=10, minimum=0
+        ),
+        response_chunks_max_bytes=_parse_int(
+            e.get("PERPLEXITY_RESPONSE_CHUNKS_MAX_BYTES"), name="PERPLEXITY_RESPONSE_CHUNKS_MAX_BYTES", default=16_000, minimum=0
+        ),
+        response_compact=_parse_bool(
+            e.get("PERPLEXITY_RESPONSE_COMPACT"), name="PERPLEXITY_RESPONSE_COMPACT", default=False
+        ),
+        response_sources_max=_parse_int(
+            e.get("PERPLEXITY_RESPONSE_SOURCES_MAX"), name="PERPLEXITY_RESPONSE_SOURCES_MAX", default=20, minimum=0
+        ),
+        warmup=warmup,
+        thread_max_entries=_parse_int(
+            e.get("PERPLEXITY_THREAD_MAX_ENTRIES"), name="PERPLEXITY_THREAD_MAX_ENTRIES", default=1_000, minimum=0
+        ),
+        thread_ttl_s=_parse_int(e.get("PERPLEXITY_THREAD_TTL_S"), name="PERPLEXITY_THREAD_TTL_S", default=86_400, minimum=0),
+        thread_store_path=(e.get("PERPLEXITY_THREAD_STORE") or "").strip() or None,
+        store_path=(e.get("PERPLEXITY_STORE_PATH") or "").strip() or None,
+        store_max_entries=_parse_int(
+            e.get("PERPLEXITY_STORE_MAX_ENTRIES"), name="PERPLEXITY_STORE_MAX_ENTRIES", default=50_000
+        ),
+    )
 
 
 def redact_env(env: Mapping[str, str]) -> Dict[str, Any]:
@@ -82,7 +549,7 @@ def redact_env(env: Mapping[str, str]) -> Dict[str, Any]:
     """
     result: Dict[str, Any] = {}
     for k, v in env.items():
-        if k in {"PERPLEXITY_CSRF_TOKEN", "PERPLEXITY_SESSION_TOKEN"}:
+        if k.startswith(("PERPLEXITY_CSRF_TOKEN", "PERPLEXITY_SESSION_TOKEN")):
             result[k] = "***REDACTED***"
         elif k in {"PERPLEXITY_COOKIES_JSON", "PERPLEXITY_COOKIES_PATH"}:
             result[k] = "***REDACTED***"
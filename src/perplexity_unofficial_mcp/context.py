@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from .jsonrpc import make_notification
+
+
+RequestId = Union[str, int, None]
+ProgressToken = Union[str, int]
+
+
+class RequestContext:
+    """
+    单次 tools/call 的执行上下文：携带截止时间与取消信号，从读循环一路传到上游调用。
+
+    说明：
+    - 截止时间以请求被读入时为起点（排队等待工作线程的时间也计入）
+    - cancel() 可由任意线程调用（例如收到 notifications/cancelled），已注册的回调会被立即触发
+    - 客户端在 params._meta.progressToken 提供令牌且 transport 提供 notify 时，可发送 notifications/progress
+    """
+
+    def __init__(
+        self,
+        *,
+        request_id: RequestId = None,
+        timeout_ms: Optional[int] = None,
+        progress_token: Optional[ProgressToken] = None,
+        notify: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> None:
+        self.request_id = request_id
+        self.timeout_ms = timeout_ms
+        self.progress_token = progress_token
+        self._notify = notify
+        self.deadline: Optional[float] = time.monotonic() + timeout_ms / 1000 if timeout_ms else None
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._callbacks: List[Callable[[], None]] = []
+        # 执行过程中的附加观测字段（例如缓存命中），会合并进该请求的日志事件
+        self.stats: Dict[str, Any] = {}
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks = list(self._callbacks)
+            self._callbacks.clear()
+        for cb in callbacks:
+            cb()
+
+    def on_cancel(self, cb: Callable[[], None]) -> None:
+        """注册取消回调；若已取消则立即执行。"""
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(cb)
+                return
+        cb()
+
+    def remove_cancel_callback(self, cb: Callable[[], None]) -> None:
+        with self._lock:
+            if cb in self._callbacks:
+                self._callbacks.remove(cb)
+
+    def remaining_s(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining_s()
+        return remaining is not None and remaining <= 0
+
+    @property
+    def wants_progress(self) -> bool:
+        return self.progress_token is not None and self._notify is not None
+
+    def report_progress(self, progress: int, *, message: Optional[str] = None, total: Optional[int] = None) -> None:
+        """
+        发送 notifications/progress；progress 必须单调递增。已取消的请求不再发送。
+        """
+        if not self.wants_progress or self._cancelled:
+            return
+        params: Dict[str, Any] = {"progressToken": self.progress_token, "progress": progress}
+        if total is not None:
+            params["total"] = total
+        if message:
+            params["message"] = message
+        assert self._notify is not None
+        self._notify(make_notification("notifications/progress", params))
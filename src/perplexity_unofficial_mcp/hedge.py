@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import math
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class HedgePolicy:
+    """
+    对冲调用的决策：按 mode 记录最近的上游耗时，给出发起对冲前的等待时长，并按预算限制对冲比例。
+
+    说明：
+    - 等待时长可固定（fixed_ms > 0），否则取最近 window 次成功调用耗时的 percentile 分位（样本不足 min_samples 时不对冲）
+    - 预算为积分制：每个可对冲的调用累积 max_ratio 积分（上限 max_credit），每次对冲消耗 1 分，
+      因此长期对冲比例不超过 max_ratio，空闲一段时间后也只允许少量突发
+    """
+
+    window: int = 200
+    min_samples: int = 20
+    max_credit: float = 5.0
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+        self._credit = 0.0
+
+    def record(self, mode: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(mode)
+            if samples is None:
+                samples = self._samples[mode] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def delay_s(self, mode: str, *, fixed_ms: int, percentile: float) -> Optional[float]:
+        """
+        发起对冲前的等待秒数；返回 None 表示当前不对冲（尚未积累足够的耗时样本）。
+        """
+        if fixed_ms > 0:
+            return fixed_ms / 1000
+        with self._lock:
+            samples = sorted(self._samples.get(mode, ()))
+        if len(samples) < self.min_samples:
+            return None
+        # 最近秩法（与离线基准的分位数计算一致）
+        rank = max(1, math.ceil(percentile * len(samples)))
+        return samples[rank - 1]
+
+    def note_eligible(self, max_ratio: float) -> None:
+        with self._lock:
+            self._credit = min(self.max_credit, self._credit + max_ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            # 容忍浮点累加误差（例如 10 × 0.1）
+            if self._credit < 1 - 1e-9:
+                return False
+            self._credit -= 1
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._credit = 0.0
@@ -3,6 +3,7 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Any, Dict, Mapping, Optional, Tuple, Union
 
+from .codec import CodecDecodeError, loads
 
 JsonValue = Union[None, bool, int, float, str, Dict[str, Any], list]
 JsonObject = Dict[str, JsonValue]
@@ -30,6 +31,13 @@ def make_error(id_: JsonRpcId, code: int, message: str, data: Optional[JsonValue
     return {"jsonrpc": "2.0", "id": id_, "error": err}
 
 
+def make_notification(method: str, params: Optional[JsonObject] = None) -> JsonObject:
+    msg: JsonObject = {"jsonrpc": "2.0", "method": method}
+    if params is not None:
+        msg["params"] = params
+    return msg
+
+
 @dataclass(frozen=True)
 class ParsedRequest:
     id: JsonRpcId
@@ -60,17 +68,20 @@ def parse_request(obj: Any) -> ParsedRequest:
     return ParsedRequest(id=id_, method=method, params=params, is_notification=is_notification)
 
 
-def safe_parse_json_line(line: str) -> Tuple[Optional[ParsedRequest], Optional[JsonObject]]:
+def safe_load_json_line(line: str) -> Tuple[Any, Optional[JsonObject]]:
     """
-    解析一行 JSON，并返回（ParsedRequest, errorResponse）。
+    解析一行 JSON（单个请求对象或批量请求数组），并返回（JSON 值, errorResponse）。
     """
-    import json
-
     try:
-        obj = json.loads(line)
-    except json.JSONDecodeError:
+        return loads(line), None
+    except CodecDecodeError:
         return None, make_error(None, -32700, "Parse error: 无法解析 JSON")
 
+
+def safe_parse_request(obj: Any) -> Tuple[Optional[ParsedRequest], Optional[JsonObject]]:
+    """
+    校验已解析的 JSON 值，并返回（ParsedRequest, errorResponse）。
+    """
     try:
         req = parse_request(obj)
     except JsonRpcError as e:
@@ -78,3 +89,12 @@ def safe_parse_json_line(line: str) -> Tuple[Optional[ParsedRequest], Optional[J
 
     return req, None
 
+
+def safe_parse_json_line(line: str) -> Tuple[Optional[ParsedRequest], Optional[JsonObject]]:
+    """
+    解析一行 JSON，并返回（ParsedRequest, errorResponse）。
+    """
+    obj, err = safe_load_json_line(line)
+    if err is not None:
+        return None, err
+    return safe_parse_request(obj)
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+# 过载时的降级路径：更便宜 / 更快的 mode
+DEGRADED_MODES: Dict[str, str] = {"pro": "auto", "reasoning": "pro"}
+
+
+class LoadMonitor:
+    """
+    进程负载观测，供按负载降级 mode 使用：
+    - 排队深度：由服务端登记的回调提供（调度器中等待工作线程的 tools/call 数）
+    - 在途上游调用数：包含已超时被放弃、但上游线程仍在等待返回的调用
+    - 最近上游耗时：按 mode 的指数滑动平均；超过 stale_after_s 没有新样本时视为无数据（降级后原 mode 不再有样本）
+    """
+
+    alpha: float = 0.2
+    stale_after_s: float = 60.0
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._latency: Dict[str, Tuple[float, float]] = {}
+        self._queue_depth: Optional[Callable[[], int]] = None
+
+    def set_queue_depth_source(self, fn: Optional[Callable[[], int]]) -> None:
+        self._queue_depth = fn
+
+    def upstream_started(self) -> None:
+        with self._lock:
+            self._inflight += 1
+
+    def upstream_finished(self) -> None:
+        with self._lock:
+            self._inflight = max(0, self._inflight - 1)
+
+    def record_latency(self, mode: str, seconds: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            previous = self._latency.get(mode)
+            if previous is None or now - previous[1] > self.stale_after_s:
+                value = seconds
+            else:
+                value = previous[0] + self.alpha * (seconds - previous[0])
+            self._latency[mode] = (value, now)
+
+    def latency_ms(self, mode: str) -> Optional[int]:
+        with self._lock:
+            entry = self._latency.get(mode)
+        if entry is None or time.monotonic() - entry[1] > self.stale_after_s:
+            return None
+        return int(entry[0] * 1000)
+
+    def queue_depth(self) -> int:
+        fn = self._queue_depth
+        return fn() if fn is not None else 0
+
+    def inflight(self) -> int:
+        with self._lock:
+            return self._inflight
+
+    def overload_reason(self, mode: str, *, queue_depth: int, inflight: int, latency_ms: int) -> Optional[str]:
+        """
+        任一信号达到阈值时返回其名称（queue / inflight / latency），否则返回 None。阈值为 0 表示不看该信号。
+        """
+        if queue_depth > 0 and self.queue_depth() >= queue_depth:
+            return "queue"
+        if inflight > 0 and self.inflight() >= inflight:
+            return "inflight"
+        if latency_ms > 0:
+            observed = self.latency_ms(mode)
+            if observed is not None and observed >= latency_ms:
+                return "latency"
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            modes = list(self._latency)
+        return {
+            "queued": self.queue_depth(),
+            "inflight": self.inflight(),
+            "latencyMs": {mode: self.latency_ms(mode) for mode in modes},
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._inflight = 0
+            self._latency.clear()
+
+
+LOAD = LoadMonitor()
@@ -1,19 +1,78 @@
-import json
-import sys
+import atexit
+import random
+import threading
 import time
-from typing import Any, Mapping
+from typing import Any, Dict, Mapping, Optional
 
+from .codec import LineWriter, stderr_stream
 
-def log_event(event: Mapping[str, Any]) -> None:
+
+# 级别从低到高；事件的 "level" 字段缺失时按 info 处理
+LEVELS: Dict[str, int] = {"debug": 10, "info": 20, "warn": 30, "error": 40}
+
+_WRITER: Optional[LineWriter] = None
+_WRITER_LOCK = threading.Lock()
+_MIN_LEVEL = LEVELS["info"]
+_SAMPLE_RATE = 1.0
+_BUFFER_SIZE = 10_000
+
+
+def _drop_notice(dropped: int) -> Dict[str, Any]:
+    return {
+        "level": "warn",
+        "msg": "日志缓冲区已满，部分日志被丢弃",
+        "dropped": dropped,
+        "ts": int(time.time() * 1000),
+    }
+
+
+def _writer() -> LineWriter:
+    global _WRITER
+    if _WRITER is None:
+        with _WRITER_LOCK:
+            if _WRITER is None:
+                _WRITER = LineWriter(
+                    stderr_stream,
+                    name="mcp-log-writer",
+                    max_queue=_BUFFER_SIZE,
+                    drop_notice=_drop_notice,
+                )
+                # 进程退出前写出队列中剩余的日志（例如启动阶段的配置错误）
+                atexit.register(_WRITER.close)
+    return _WRITER
+
+
+def configure_logging(*, level: str = "info", sample_rate: float = 1.0, buffer_size: int = 10_000) -> None:
+    """
+    设置最低日志级别、逐请求 info 日志的采样率与日志缓冲区大小（进程级设置）。
+    """
+    global _MIN_LEVEL, _SAMPLE_RATE, _BUFFER_SIZE
+    _MIN_LEVEL = LEVELS[level]
+    _SAMPLE_RATE = sample_rate
+    _BUFFER_SIZE = buffer_size
+    if _WRITER is not None:
+        _WRITER.max_queue = buffer_size
+
+
+def dropped_log_count() -> int:
+    return _WRITER.dropped if _WRITER is not None else 0
+
+
+def log_event(event: Mapping[str, Any], *, sampled: bool = False) -> None:
     """
     输出最小结构化日志到 stderr。
 
     约束：
     - stdout 仅用于 MCP 协议消息
     - 不得输出明文 Cookies
+    - 只做入队：序列化与写入由后台写线程完成；缓冲区满时丢弃并计数，调用方永不阻塞在 stderr 上
+    - sampled=True 表示高频的逐请求事件：info 及以下级别按采样率输出，warn / error 始终输出
     """
+    level = LEVELS.get(str(event.get("level", "info")), LEVELS["info"])
+    if level < _MIN_LEVEL:
+        return
+    if sampled and level <= LEVELS["info"] and _SAMPLE_RATE < 1.0 and random.random() >= _SAMPLE_RATE:
+        return
     payload = dict(event)
     payload.setdefault("ts", int(time.time() * 1000))
-    sys.stderr.write(json.dumps(payload, ensure_ascii=False) + "\n")
-    sys.stderr.flush()
-
+    _writer().write(payload)
@@ -0,0 +1,379 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .codec import dumps
+from .config import AppConfig
+from .jsonrpc import make_error, safe_load_json_line
+from .logging import log_event
+from .metrics import METRICS, PROMETHEUS_CONTENT_TYPE, record_write
+from .server import (
+    McpServer,
+    ServerState,
+    load_config_or_log,
+    start_warmup,
+    startup_elapsed_ms,
+    unencodable_replacement,
+)
+
+
+MCP_PATH = "/mcp"
+SESSION_HEADER = "Mcp-Session-Id"
+
+# 本机 Origin 始终允许（防 DNS rebinding：拒绝来自其他站点的浏览器请求）
+_LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+
+class SessionRegistry:
+    """
+    HTTP 会话表：initialize 时分配 Mcp-Session-Id，DELETE 时关闭并取消该会话的在途请求。
+
+    说明：
+    - 客户端断开而未发送 DELETE 的会话在空闲 idle_ttl_s 后过期（有在途请求的会话不算空闲）；0 表示不过期
+    - 会话数超过 max_sessions 时关闭最久未使用的会话（优先关闭没有在途请求的会话），避免反复 initialize 占满内存
+    - 过期检查在 create() / get() 时顺带进行，不需要单独的清理线程
+    """
+
+    def __init__(self, *, idle_ttl_s: float = 0, max_sessions: int = 0) -> None:
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, ServerState]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._idle_ttl_s = idle_ttl_s
+        self._max_sessions = max_sessions
+
+    def create(self) -> ServerState:
+        state = ServerState(session_id=uuid.uuid4().hex)
+        with self._lock:
+            evicted = self._expire_locked()
+            if self._max_sessions > 0:
+                while len(self._sessions) >= self._max_sessions:
+                    evicted.append(self._pop_locked(self._lru_victim_locked()))
+            self._sessions[state.session_id] = state  # type: ignore[index]
+            self._last_used[state.session_id] = time.monotonic()  # type: ignore[index]
+        self._close_states(evicted)
+        return state
+
+    def get(self, session_id: str) -> Optional[ServerState]:
+        with self._lock:
+            evicted = self._expire_locked()
+            state = self._sessions.get(session_id)
+            if state is not None:
+                self._sessions.move_to_end(session_id)
+                self._last_used[session_id] = time.monotonic()
+        self._close_states(evicted)
+        return state
+
+    def close(self, session_id: str) -> bool:
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is not None:
+                self._pop_locked(session_id)
+        if state is None:
+            return False
+        state.cancel_all()
+        return True
+
+    def _pop_locked(self, session_id: str) -> ServerState:
+        self._last_used.pop(session_id, None)
+        return self._sessions.pop(session_id)
+
+    def _lru_victim_locked(self) -> str:
+        for session_id, state in self._sessions.items():
+            if not state.inflight:
+                return session_id
+        return next(iter(self._sessions))
+
+    def _expire_locked(self) -> List[ServerState]:
+        if self._idle_ttl_s <= 0:
+            return []
+        cutoff = time.monotonic() - self._idle_ttl_s
+        expired = []
+        # 按最近使用排序：遇到第一个未过期的会话即可停止
+        for session_id, state in list(self._sessions.items()):
+            if self._last_used[session_id] > cutoff:
+                break
+            if not state.inflight:
+                expired.append(self._pop_locked(session_id))
+        return expired
+
+    @staticmethod
+    def _close_states(states: List[ServerState]) -> None:
+        for state in states:
+            state.cancel_all()
+            log_event({"level": "info", "msg": "HTTP 会话已过期关闭", "sessionId": state.session_id})
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+
+class McpHttpServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: AppConfig, server: McpServer) -> None:
+        super().__init__(address, _McpRequestHandler)
+        self.config = config
+        self.mcp = server
+        self.sessions = SessionRegistry(
+            idle_ttl_s=config.http_session_idle_s, max_sessions=config.http_max_sessions
+        )
+
+
+def _origin_allowed(origin: Optional[str], allowed: Tuple[str, ...]) -> bool:
+    if not origin:
+        return True
+    if origin.rstrip("/") in allowed:
+        return True
+    return (urlsplit(origin).hostname or "") in _LOCAL_HOSTS
+
+
+class _McpRequestHandler(BaseHTTPRequestHandler):
+    server: McpHttpServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        # 访问日志交给结构化的 requestId 日志；不使用 BaseHTTPRequestHandler 的默认输出格式
+        pass
+
+    # ---- 基础响应 ----
+
+    def _encode(self, body: Any) -> bytes:
+        """编码一条消息；无法序列化时编码其替代消息（见 unencodable_replacement），没有替代消息时返回空字节串。"""
+        started = time.perf_counter()
+        try:
+            data = dumps(body).encode("utf-8")
+        except Exception as exc:  # noqa: BLE001
+            replacement = unencodable_replacement(body, exc)
+            data = dumps(replacement).encode("utf-8") if replacement is not None else b""
+        record_write(
+            "http",
+            messages=1,
+            nbytes=len(data),
+            encode_ms=[(time.perf_counter() - started) * 1000],
+            message_bytes=[len(data)],
+        )
+        return data
+
+    def _send_json(self, status: int, body: Any, *, headers: Optional[Dict[str, str]] = None) -> None:
+        data = b"" if body is None else self._encode(body)
+        self.send_response(status)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+    def _content_length(self) -> Optional[int]:
+        """请求体长度；未提供时为 0，不是非负整数时返回 None。"""
+        raw = (self.headers.get("Content-Length") or "").strip()
+        if not raw:
+            return 0
+        if not raw.isdigit():
+            return None
+        return int(raw)
+
+    def _check_origin(self) -> bool:
+        if _origin_allowed(self.headers.get("Origin"), self.server.config.http_allowed_origins):
+            return True
+        self._send_json(403, make_error(None, -32600, "Forbidden: Origin 不被允许"))
+        return False
+
+    # ---- 路由 ----
+
+    def do_GET(self) -> None:  # noqa: N802
+        path = urlsplit(self.path).path
+        if path == "/healthz":
+            self._send_json(
+                200,
+                {
+                    "status": "ok",
+                    "sessions": len(self.server.sessions),
+                    "lanes": self.server.mcp.scheduler.snapshot(),
+                },
+            )
+        elif path == "/metrics":
+            data = METRICS.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif path == MCP_PATH:
+            # 不提供服务端主动推送的独立 SSE 流；进度随对应 POST 的 SSE 响应返回
+            self._send_json(405, None, headers={"Allow": "POST, DELETE"})
+        else:
+            self._send_json(404, None)
+
+    def do_DELETE(self) -> None:  # noqa: N802
+        if urlsplit(self.path).path != MCP_PATH:
+            self._send_json(404, None)
+            return
+        if not self._check_origin():
+            return
+        session_id = self.headers.get(SESSION_HEADER)
+        if not session_id:
+            self._send_json(400, make_error(None, -32600, f"Bad Request: 缺少 {SESSION_HEADER}"))
+            return
+        if not self.server.sessions.close(session_id):
+            self._send_json(404, make_error(None, -32001, "Session not found"))
+            return
+        self._send_json(204, None)
+
+    def do_POST(self) -> None:  # noqa: N802
+        if urlsplit(self.path).path != MCP_PATH:
+            self._send_json(404, None)
+            return
+        if not self._check_origin():
+            return
+
+        length = self._content_length()
+        if length is None:
+            # 无法确定请求体边界，连接上的后续数据也无法再解析
+            self.close_connection = True
+            self._send_json(400, make_error(None, -32700, "Parse error: Content-Length 无效"))
+            return
+        body = self.rfile.read(length).decode("utf-8", errors="replace") if length > 0 else ""
+        message, parse_err = safe_load_json_line(body)
+        if parse_err is not None:
+            self._send_json(400, parse_err)
+            return
+
+        headers: Dict[str, str] = {}
+        if isinstance(message, dict) and message.get("method") == "initialize":
+            state = self.server.sessions.create()
+            headers[SESSION_HEADER] = state.session_id  # type: ignore[assignment]
+        else:
+            session_id = self.headers.get(SESSION_HEADER)
+            request_id = message.get("id") if isinstance(message, dict) else None
+            if not session_id:
+                self._send_json(400, make_error(request_id, -32600, f"Bad Request: 缺少 {SESSION_HEADER}"))
+                return
+            found = self.server.sessions.get(session_id)
+            if found is None:
+                self._send_json(404, make_error(request_id, -32001, "Session not found"))
+                return
+            state = found
+
+        # 工作线程通过 outbox 把消息交给当前 HTTP 线程写出；("done", None) 表示请求（或整个批量）已结束
+        outbox: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+        use_sse = "text/event-stream" in (self.headers.get("Accept") or "")
+        self.server.mcp.handle_message(
+            state,
+            message,
+            respond=lambda msg: outbox.put(("response", msg)),
+            notify=(lambda msg: outbox.put(("notify", msg))) if use_sse else None,
+            done=lambda: outbox.put(("done", None)),
+            stream_batch=use_sse and self.server.config.batch_stream_responses,
+        )
+
+        if use_sse and self._has_pending_response(message):
+            self._stream_sse(state, message, outbox, headers)
+            return
+        response = None
+        while True:
+            kind, msg = outbox.get()
+            if kind == "done":
+                break
+            if kind == "response":
+                response = msg
+        if response is None:
+            # 通知、或请求已被取消/会话已关闭：没有可返回的 JSON-RPC 响应
+            self._send_json(202, None, headers=headers)
+        else:
+            self._send_json(200, response, headers=headers)
+
+    @staticmethod
+    def _has_pending_response(message: Any) -> bool:
+        items = message if isinstance(message, list) else [message]
+        return any(isinstance(item, dict) and "id" in item for item in items) or not items
+
+    @staticmethod
+    def _cancel_message(state: ServerState, message: Any) -> None:
+        items = message if isinstance(message, list) else [message]
+        with state.inflight_lock:
+            contexts = [state.inflight.get(item.get("id")) for item in items if isinstance(item, dict) and "id" in item]
+        for ctx in contexts:
+            if ctx is not None:
+                ctx.cancel()
+
+    def _stream_sse(
+        self,
+        state: ServerState,
+        message: Any,
+        outbox: "queue.Queue[Tuple[str, Any]]",
+        headers: Dict[str, str],
+    ) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        # SSE 响应以关闭连接作为结束标志
+        self.send_header("Connection", "close")
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.close_connection = True
+        try:
+            while True:
+                kind, msg = outbox.get()
+                if kind == "done":
+                    return
+                data = self._encode(msg)
+                if not data:
+                    continue
+                self.wfile.write(b"event: message\ndata: " + data + b"\n\n")
+                self.wfile.flush()
+        except OSError:
+            # 客户端断开：视同取消本次 POST 涉及的请求，尽快释放工作线程与上游调用
+            self._cancel_message(state, message)
+
+
+def create_http_server(config: AppConfig, server: McpServer) -> McpHttpServer:
+    return McpHttpServer((config.http_host, config.http_port), config, server)
+
+
+def run_http_server(config: Optional[AppConfig] = None) -> None:
+    """
+    以 Streamable HTTP 方式运行 MCP Server：单进程服务多个客户端会话。
+
+    注意：
+    - POST /mcp 接收 JSON-RPC；Accept 含 text/event-stream 时以 SSE 推送进度通知与最终响应
+    - initialize 响应头返回 Mcp-Session-Id，之后的请求必须携带；DELETE /mcp 关闭会话
+    - 调度器、响应缓存、限流与账号池在所有会话之间共享
+    """
+    if config is None:
+        config = load_config_or_log()
+    start_warmup(config)
+
+    server = McpServer(config)
+    httpd = create_http_server(config, server)
+    host, port = httpd.server_address[:2]
+    log_event(
+        {
+            "level": "info",
+            "msg": "MCP Server 启动",
+            "transport": "http",
+            "jsonCodec": server.codec.name,
+            "address": f"http://{host}:{port}{MCP_PATH}",
+            "maxWorkers": config.max_workers,
+            "lanes": {"heavy": config.heavy_lane_concurrency, "light": config.light_lane_concurrency},
+            "warmup": config.warmup,
+            "startupMs": startup_elapsed_ms(),
+        }
+    )
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        server.shutdown(wait=True)
@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import bisect
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+
+LabelKey = Tuple[Tuple[str, str], ...]
+Collector = Callable[[], Iterable[Tuple[Mapping[str, Any], float]]]
+
+# 毫秒级延迟分桶：覆盖毫秒级的缓存命中到 15 分钟的 deep research
+DEFAULT_BUCKETS_MS: Tuple[float, ...] = (
+    1, 5, 10, 25, 50, 100, 250, 500, 1_000, 2_500, 5_000, 10_000, 30_000, 60_000, 120_000, 300_000, 900_000,
+)
+
+# 消息字节数分桶：从单行通知到带完整 chunks 的 deep research 结果
+BYTE_BUCKETS: Tuple[float, ...] = (256, 1_024, 4_096, 16_384, 65_536, 262_144, 1_048_576, 4_194_304)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 指标说明（Prometheus HELP）；未登记的指标不输出 HELP 行
+_HELP: Dict[str, str] = {
+    "mcp_tool_calls_total": "tools/call 次数（按工具与结果）",
+    "mcp_tool_errors_total": "tools/call 失败次数（按错误类别）",
+    "mcp_cache_lookups_total": "响应缓存查询次数（hit / miss / bypass）",
+    "mcp_tools_inflight": "在途 tools/call 数",
+    "mcp_tool_queue_ms": "tools/call 在调度通道中的排队耗时（毫秒）",
+    "mcp_tool_duration_ms": "tools/call 总耗时（毫秒，按工具与实际 mode）",
+    "mcp_upstream_ms": "上游 Perplexity 调用耗时（毫秒，按工具与实际 mode）",
+    "mcp_serialize_ms": "单条消息的 JSON 编码耗时（毫秒）",
+    "mcp_messages_written_total": "写出的 MCP 消息数",
+    "mcp_bytes_written_total": "写出的 MCP 消息字节数",
+    "mcp_message_bytes": "单条 MCP 消息序列化后的字节数",
+    "mcp_lane_queued": "调度通道排队中的任务数",
+    "mcp_lane_running": "调度通道执行中的任务数",
+    "mcp_answer_store_dropped_total": "答案库写入失败而丢弃的记录数（按错误类别）",
+    "mcp_log_dropped_total": "因缓冲区已满被丢弃的日志条数",
+}
+
+
+def _label_key(labels: Mapping[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    """
+    固定分桶直方图；分位数按桶内线性插值估算（与 Prometheus histogram_quantile 一致）。
+    """
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BUCKETS_MS) -> None:
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for idx, n in enumerate(self.counts):
+            if n and cumulative + n >= rank:
+                lower = self.bounds[idx - 1] if idx > 0 else 0.0
+                if idx >= len(self.bounds):
+                    # 落在 +Inf 桶：无法插值，返回最大有限边界
+                    return float(self.bounds[-1])
+                upper = self.bounds[idx]
+                return lower + (upper - lower) * ((rank - cumulative) / n)
+            cumulative += n
+        return float(self.bounds[-1])
+
+
+class MetricsRegistry:
+    """
+    进程内指标：计数器、仪表（gauge）、直方图，以及在导出时才求值的 collector。
+
+    所有更新都是 O(1) 的加锁字典操作，可在请求路径上直接调用。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._gauges: Dict[Tuple[str, LabelKey], float] = {}
+        self._histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self._collectors: Dict[str, Tuple[str, Collector]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def add_gauge(self, name: str, delta: float, **labels: Any) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + delta
+
+    def observe(self, name: str, value: float, *, bounds: Sequence[float] = DEFAULT_BUCKETS_MS, **labels: Any) -> None:
+        """记录一次观测；bounds 只在该指标首次出现时决定分桶（默认毫秒分桶）。"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(bounds)
+            hist.observe(value)
+
+    def register_collector(self, name: str, kind: str, fn: Collector) -> None:
+        """
+        登记导出时才读取的指标（例如调度队列深度）；kind 为 "gauge" 或 "counter"。同名登记会覆盖。
+        """
+        with self._lock:
+            self._collectors[name] = (kind, fn)
+
+    def _collected(self) -> List[Tuple[str, str, LabelKey, float]]:
+        with self._lock:
+            collectors = list(self._collectors.items())
+        rows: List[Tuple[str, str, LabelKey, float]] = []
+        for name, (kind, fn) in collectors:
+            try:
+                for labels, value in fn():
+                    rows.append((name, kind, _label_key(labels), float(value)))
+            except Exception:  # noqa: BLE001
+                # 导出不应因单个 collector 失败而中断
+                continue
+        return rows
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        JSON 友好的快照：直方图给出 count / sum / p50 / p95 / p99（单位与该指标一致）。
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            hists = {key: (h.count, h.sum, h.quantile(0.5), h.quantile(0.95), h.quantile(0.99)) for key, h in self._histograms.items()}
+        collected = self._collected()
+
+        def row(name: str, key: LabelKey, value: float) -> Dict[str, Any]:
+            return {"name": name, "labels": dict(key), "value": value}
+
+        return {
+            "counters": [row(n, k, v) for (n, k), v in sorted(counters.items())]
+            + [row(n, k, v) for n, kind, k, v in collected if kind == "counter"],
+            "gauges": [row(n, k, v) for (n, k), v in sorted(gauges.items())]
+            + [row(n, k, v) for n, kind, k, v in collected if kind == "gauge"],
+            "histograms": [
+                {
+                    "name": n,
+                    "labels": dict(k),
+                    "count": count,
+                    "sum": round(total, 3),
+                    "p50": p50,
+                    "p95": p95,
+                    "p99": p99,
+                }
+                for (n, k), (count, total, p50, p95, p99) in sorted(hists.items())
+            ],
+        }
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            hists = [(key, tuple(h.counts), h.count, h.sum, h.bounds) for key, h in sorted(self._histograms.items())]
+        collected = self._collected()
+
+        families: Dict[str, Tuple[str, List[str]]] = {}
+
+        def family(name: str, kind: str) -> List[str]:
+            if name not in families:
+                families[name] = (kind, [])
+            return families[name][1]
+
+        for (name, key), value in counters:
+            family(name, "counter").append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        for (name, key), value in gauges:
+            family(name, "gauge").append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        for name, kind, key, value in collected:
+            family(name, kind).append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        for (name, key), counts, count, total, bounds in hists:
+            lines = family(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(list(bounds) + [math.inf], counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(key)} {count}")
+
+        out: List[str] = []
+        for name in sorted(families):
+            kind, lines = families[name]
+            if name in _HELP:
+                out.append(f"# HELP {name} {_HELP[name]}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+METRICS = MetricsRegistry()
+
+
+def record_write(
+    transport: str,
+    *,
+    messages: int,
+    nbytes: int,
+    encode_ms: Sequence[float],
+    message_bytes: Sequence[int] = (),
+) -> None:
+    """
+    记录一次写出：消息数、字节数、每条消息的编码耗时与编码后的字节数。
+
+    字节数取自写出时的那次编码，不在请求路径上额外序列化。
+    """
+    METRICS.inc("mcp_messages_written_total", messages, transport=transport)
+    METRICS.inc("mcp_bytes_written_total", nbytes, transport=transport)
+    for ms in encode_ms:
+        METRICS.observe("mcp_serialize_ms", ms, transport=transport)
+    for size in message_bytes:
+        METRICS.observe("mcp_message_bytes", size, bounds=BYTE_BUCKETS, transport=transport)
+
+
+class MetricsFileExporter:
+    """
+    定期把 Prometheus 文本格式写入文件（供 node_exporter textfile collector 等读取）。
+
+    先写临时文件再 os.replace，读取方不会看到写了一半的内容。
+    """
+
+    def __init__(self, registry: MetricsRegistry, path: str, *, interval_s: float) -> None:
+        self._registry = registry
+        self._path = path
+        self._interval_s = interval_s
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="mcp-metrics-file", daemon=True)
+        self._thread.start()
+
+    def write_once(self) -> None:
+        tmp = f"{self._path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self._registry.render_prometheus())
+        os.replace(tmp, self._path)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self._interval_s):
+            try:
+                self.write_once()
+            except OSError:
+                continue
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join(5)
+        try:
+            self.write_once()
+        except OSError:
+            pass
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = METRICS
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = self.registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_metrics_server(host: str, port: int) -> ThreadingHTTPServer:
+    """
+    在后台线程中启动仅提供 GET /metrics 的 HTTP 服务（STDIO 传输下供 Prometheus 抓取）。
+    """
+    httpd = ThreadingHTTPServer((host, port), _MetricsHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="mcp-metrics-http", daemon=True).start()
+    return httpd
@@ -1,21 +1,117 @@
 from __future__ import annotations
 
-import re
-from dataclasses import dataclass
-from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+import math
+import queue
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+from urllib.parse import urlsplit, urlunsplit
 
-from .config import AppConfig
+from .accounts import AccountLease, AccountPool, AccountUnavailableError
+from .breaker import OPEN, CircuitBreakers
+from .codec import CodecDecodeError, loads
+from .config import AppConfig, RateLimit
+from .context import RequestContext
+from .hedge import HedgePolicy
+from .load import LOAD
+from .logging import log_event
+from .ratelimit import RateLimiter, RateLimitExceeded
 
 
 class PerplexityCallError(Exception):
     """调用 Perplexity 失败。"""
 
 
-_THINK_RE = re.compile(r"<think>[\\s\\S]*?<\\/think>", re.MULTILINE)
+class PerplexityTimeoutError(PerplexityCallError):
+    """调用 Perplexity 超过截止时间。"""
+
+
+class PerplexityCancelledError(PerplexityCallError):
+    """调用已被客户端取消（notifications/cancelled）。"""
+
+
+class PerplexityRateLimitedError(PerplexityCallError):
+    """本地限流排队超过允许的等待时间。"""
+
+
+class PerplexityThreadExpiredError(PerplexityCallError):
+    """续问的会话已在本地登记表中过期，不再发起上游调用。"""
+
+
+class PerplexityUpstreamError(PerplexityCallError):
+    """
+    上游调用失败。kind 为失败分类（transient / rate_limited / auth / bad_response / upstream），
+    retryable 表示可以安全重试（已推送过流式进度的调用不重试，避免重复文本）。
+    """
+
+    def __init__(self, message: str, *, kind: str, retryable: bool = False) -> None:
+        super().__init__(message)
+        self.kind = kind
+        self.retryable = retryable
+
+
+class PerplexityCircuitOpenError(PerplexityCallError):
+    """上游熔断中，调用未发出。"""
+
+
+def _partial_tag_len(text: str, tag: str) -> int:
+    """text 末尾与 tag 前缀重合的最大长度（小于 len(tag)），即可能被切断在分块边界上的半个标签。"""
+    for size in range(min(len(text), len(tag) - 1), 0, -1):
+        if text.endswith(tag[:size]):
+            return size
+    return 0
+
+
+class ThinkStripper:
+    """
+    增量剥离 <think>...</think> 块的状态机：按分块 feed 文本，返回可以输出的可见文本。
+
+    说明：
+    - 线性时间：每段输入只扫描一次，跨分块边界的半个标签（最多 len(tag) - 1 个字符）留到下一块再判断
+    - 未闭合的 <think> 块一直丢弃到结束；finish() 输出末尾残留的、最终没有构成标签的文本
+    """
+
+    OPEN = "<think>"
+    CLOSE = "</think>"
+
+    def __init__(self) -> None:
+        self._inside = False
+        self._pending = ""
+
+    def feed(self, text: str) -> str:
+        buf = self._pending + text if self._pending else text
+        self._pending = ""
+        out: List[str] = []
+        pos = 0
+        while pos < len(buf):
+            tag = self.CLOSE if self._inside else self.OPEN
+            found = buf.find(tag, pos)
+            if found < 0:
+                keep = _partial_tag_len(buf[pos:], tag)
+                if not self._inside:
+                    out.append(buf[pos : len(buf) - keep])
+                self._pending = buf[len(buf) - keep :] if keep else ""
+                break
+            if not self._inside:
+                out.append(buf[pos:found])
+            self._inside = not self._inside
+            pos = found + len(tag)
+        return "".join(out)
+
+    def finish(self) -> str:
+        tail = "" if self._inside else self._pending
+        self._inside = False
+        self._pending = ""
+        return tail
 
 
 def strip_thinking_tokens(text: str) -> str:
-    return _THINK_RE.sub("", text).strip()
+    """去掉回答中的 <think>...</think> 推理过程（未闭合的块丢弃到结尾），并去掉首尾空白。"""
+    stripper = ThinkStripper()
+    return (stripper.feed(text) + stripper.finish()).strip()
 
 
 def messages_to_query(messages: List[Mapping[str, Any]]) -> str:
@@ -45,6 +141,10 @@ class PerplexityResult:
     raw: Mapping[str, Any]
     chunks: Optional[List[Any]] = None
     backend_uuid: Optional[str] = None
+    # 实际承接本次调用的账号名（多账号池）
+    account: Optional[str] = None
+    # 从 payload 中提取的去重来源（见 extract_sources）
+    sources: Optional[List[Dict[str, Any]]] = None
 
 
 def _extract_answer(payload: Mapping[str, Any]) -> Tuple[str, Optional[List[Any]]]:
@@ -64,6 +164,418 @@ def _extract_backend_uuid(payload: Mapping[str, Any]) -> Optional[str]:
     return None
 
 
+_URL_KEYS = ("url", "link", "href")
+_TITLE_KEYS = ("title", "name")
+_SNIPPET_KEYS = ("snippet", "description", "summary")
+# SDK 会把步骤列表 / 最终答案以 JSON 字符串嵌在这些字段中（例如 payload["text"]）
+_EMBEDDED_JSON_KEYS = frozenset({"text", "answer", "content"})
+_SOURCE_TITLE_MAX_CHARS = 200
+_SOURCE_SNIPPET_MAX_CHARS = 300
+
+
+def _first_str(node: Mapping[str, Any], keys: Sequence[str]) -> Optional[str]:
+    for key in keys:
+        value = node.get(key)
+        if isinstance(value, str) and value.strip():
+            return value.strip()
+    return None
+
+
+def _source_key(url: str) -> str:
+    """去重用的 URL 规范形式：忽略 fragment、scheme/host 大小写与路径末尾的斜杠。"""
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), parts.query, ""))
+
+
+def extract_sources(payload: Any, *, max_sources: int) -> List[Dict[str, Any]]:
+    """
+    从上游 payload（含 chunks、web_results 以及嵌入的 JSON 字符串）中提取被引用的来源，按 URL 去重。
+
+    说明：
+    - 单次遍历：每个节点只访问一次，嵌入的 JSON 字符串只解码一次；带 URL 的条目不再向下展开
+    - 每条来源为 {"index", "url", "title", "snippet"}：index 从 1 开始，按首次出现的顺序编号；
+      title / snippet 截断，缺失时取同一 URL 后续条目中的值
+    - 最多返回 max_sources 条，达到上限后停止遍历
+    """
+    sources: List[Dict[str, Any]] = []
+    seen: Dict[str, Dict[str, Any]] = {}
+    stack: List[Any] = [payload]
+    while stack and len(sources) < max_sources:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+            continue
+        if not isinstance(node, dict):
+            continue
+        url = _first_str(node, _URL_KEYS)
+        if url is not None and url.startswith(("http://", "https://")):
+            key = _source_key(url)
+            entry = seen.get(key)
+            if entry is None:
+                entry = seen[key] = {"index": len(sources) + 1, "url": url}
+                sources.append(entry)
+            if "title" not in entry:
+                title = _first_str(node, _TITLE_KEYS)
+                if title is not None:
+                    entry["title"] = title[:_SOURCE_TITLE_MAX_CHARS]
+            if "snippet" not in entry:
+                snippet = _first_str(node, _SNIPPET_KEYS)
+                if snippet is not None:
+                    entry["snippet"] = snippet[:_SOURCE_SNIPPET_MAX_CHARS]
+            continue
+        children: List[Any] = []
+        for key, value in node.items():
+            if isinstance(value, (dict, list)):
+                children.append(value)
+            elif isinstance(value, str) and key in _EMBEDDED_JSON_KEYS and value[:1] in ("[", "{"):
+                try:
+                    children.append(loads(value))
+                except CodecDecodeError:
+                    # 普通文本（例如以 [1] 开头的回答）
+                    continue
+        stack.extend(reversed(children))
+    return sources
+
+
+ClientKey = Tuple[Any, Tuple[Tuple[str, str], ...]]
+
+
+@dataclass
+class PooledClient:
+    key: ClientKey
+    client: Any
+    created_at: float = field(default_factory=time.monotonic)
+    last_used_at: float = field(default_factory=time.monotonic)
+    uses: int = 0
+
+
+class ClientPool:
+    """
+    SDK Client 复用池：按（Client 工厂, Cookies）分组缓存空闲 Client。
+
+    说明：
+    - 每次调用独占一个 Client（SDK 不保证线程安全），用完归还；并发高于空闲数时临时新建
+    - 归还时做健康检查：调用出错、复用次数超限或空闲过久的 Client 直接丢弃，下次重新构造
+    """
+
+    # 空闲超过该时长的 Client 视为不健康（上游连接/会话大概率已失效）
+    max_idle_s: float = 600.0
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._idle: Dict[ClientKey, Deque[PooledClient]] = {}
+
+    @staticmethod
+    def make_key(factory: Any, cookies: Mapping[str, str]) -> ClientKey:
+        return factory, tuple(sorted((str(k), str(v)) for k, v in cookies.items()))
+
+    def _is_healthy(self, pooled: PooledClient, now: float) -> bool:
+        if now - pooled.last_used_at > self.max_idle_s:
+            return False
+        return callable(getattr(pooled.client, "search", None))
+
+    def acquire(self, factory: Callable[[Dict[str, str]], Any], cookies: Mapping[str, str]) -> PooledClient:
+        key = self.make_key(factory, cookies)
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(key)
+            while idle:
+                pooled = idle.pop()
+                if self._is_healthy(pooled, now):
+                    return pooled
+        # 构造 Client 可能涉及网络握手，放在锁外执行
+        return PooledClient(key=key, client=factory(dict(cookies)))
+
+    def release(self, pooled: PooledClient, *, healthy: bool, max_idle: int, max_uses: int) -> None:
+        pooled.uses += 1
+        pooled.last_used_at = time.monotonic()
+        if not healthy or pooled.uses >= max_uses:
+            return
+        with self._lock:
+            idle = self._idle.setdefault(pooled.key, deque())
+            if len(idle) < max_idle:
+                idle.append(pooled)
+
+    def idle_count(self) -> int:
+        with self._lock:
+            return sum(len(q) for q in self._idle.values())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._idle.clear()
+
+
+_CLIENT_POOL = ClientPool()
+_ACCOUNT_POOL = AccountPool()
+_RATE_LIMITER = RateLimiter()
+_HEDGE = HedgePolicy()
+
+_RATE_LIMIT_MARKERS = ("429", "rate limit", "too many requests")
+_AUTH_MARKERS = ("401", "403", "unauthorized", "forbidden")
+_TRANSIENT_MARKERS = (
+    "502",
+    "503",
+    "504",
+    "bad gateway",
+    "service unavailable",
+    "gateway timeout",
+    "timed out",
+    "timeout",
+    "connection",
+    "reset by peer",
+    "temporarily",
+)
+# 可以重试的失败分类：网络抖动 / 上游 5xx，以及上游限流（多账号时重试会落到其他账号）
+_RETRYABLE_KINDS = frozenset({"transient", "rate_limited"})
+# 计入熔断的失败分类：只看上游自身的健康状况。auth / rate_limited 是单个账号的问题（由账号池冷却处理），
+# 超时与取消取决于调用方的截止时间，都不计入
+_BREAKER_KINDS = frozenset({"transient", "bad_response", "upstream"})
+# 耗时以分钟计的 mode 与交互型 mode 分开熔断（对应调度器的 heavy / light 通道）
+_HEAVY_MODES = frozenset({"deep research", "reasoning"})
+
+
+def classify_failure(exc: BaseException) -> str:
+    """
+    区分上游异常：rate_limited / auth / transient（网络或上游 5xx）/ bad_response（响应无法解析）/ upstream（其他）。
+
+    SDK 没有稳定的异常类型，除内置的连接/超时异常外按异常文本中的状态码与关键字判断。
+    """
+    text = str(exc).lower()
+    if any(marker in text for marker in _RATE_LIMIT_MARKERS):
+        return "rate_limited"
+    if any(marker in text for marker in _AUTH_MARKERS):
+        return "auth"
+    if isinstance(exc, (ConnectionError, TimeoutError)) or any(marker in text for marker in _TRANSIENT_MARKERS):
+        return "transient"
+    if isinstance(exc, (ValueError, KeyError)):
+        return "bad_response"
+    return "upstream"
+
+
+def error_class(exc: BaseException) -> str:
+    """
+    把调用失败归类为稳定的短名称，用于日志与指标：timeout / cancelled / rate_limited / thread_expired /
+    circuit_open / auth / transient / bad_response / upstream。
+    """
+    if isinstance(exc, PerplexityTimeoutError):
+        return "timeout"
+    if isinstance(exc, PerplexityCancelledError):
+        return "cancelled"
+    if isinstance(exc, PerplexityRateLimitedError):
+        return "rate_limited"
+    if isinstance(exc, PerplexityThreadExpiredError):
+        return "thread_expired"
+    if isinstance(exc, PerplexityCircuitOpenError):
+        return "circuit_open"
+    if isinstance(exc, PerplexityUpstreamError):
+        return exc.kind
+    return classify_failure(exc)
+
+
+def _log_breaker_change(old_state: str, new_state: str, info: Dict[str, Any]) -> None:
+    level = "warn" if new_state == OPEN else "info"
+    log_event({"level": level, "msg": "上游熔断状态变化", "from": old_state, "to": new_state, **info})
+
+
+_BREAKERS = CircuitBreakers(_log_breaker_change)
+
+
+def breaker_lane(mode: str) -> str:
+    return "heavy" if mode in _HEAVY_MODES else "light"
+
+
+def circuit_snapshot() -> List[Dict[str, Any]]:
+    """各 (账号, 通道) 熔断器的当前状态（account / lane / state / failures / openForS）。"""
+    return _BREAKERS.snapshot()
+
+
+def _circuit_open_error(wait_s: float, *, account: Optional[str] = None) -> PerplexityCircuitOpenError:
+    scope = f"账号 {account} " if account is not None else "所有账号"
+    if wait_s > 0:
+        return PerplexityCircuitOpenError(f"上游暂不可用（{scope}熔断中），约 {math.ceil(wait_s)} 秒后重试")
+    return PerplexityCircuitOpenError(f"上游暂不可用（{scope}熔断恢复探测中），请稍后重试")
+
+
+def _close_client(client: Any) -> None:
+    """
+    尽力关闭 SDK Client 持有的 HTTP 会话，释放被放弃调用占用的上游连接。
+    """
+    close = getattr(getattr(client, "session", None), "close", None)
+    if callable(close):
+        try:
+            close()
+        except Exception:  # noqa: BLE001
+            pass
+
+
+def _import_sdk() -> Any:
+    try:
+        return __import__("perplexity")
+    except Exception as exc:  # noqa: BLE001
+        raise PerplexityCallError(
+            "无法导入 perplexity SDK。请先确保已安装 ../perplexity-ai 及其依赖。"
+        ) from exc
+
+
+def warm_up(config: AppConfig, *, clients: bool = False) -> Dict[str, int]:
+    """
+    预先导入 SDK；clients=True 时再为每个账号构造一个 Client 放入复用池，首次 tools/call 可直接取用。
+
+    返回各阶段耗时（毫秒）。导入失败抛出 PerplexityCallError；单个账号构造失败不影响其他账号。
+    """
+    started = time.monotonic()
+    perplexity = _import_sdk()
+    timings = {"importMs": int((time.monotonic() - started) * 1000)}
+    if not clients:
+        return timings
+
+    started = time.monotonic()
+    warmed = 0
+    for account in config.account_list():
+        try:
+            pooled = _CLIENT_POOL.acquire(perplexity.Client, account.cookies)
+        except Exception:  # noqa: BLE001
+            continue
+        _CLIENT_POOL.release(pooled, healthy=True, max_idle=config.client_pool_size, max_uses=config.client_max_uses)
+        warmed += 1
+    timings["clientMs"] = int((time.monotonic() - started) * 1000)
+    timings["clientsWarmed"] = warmed
+    return timings
+
+
+def check_context(ctx: RequestContext) -> None:
+    """
+    若请求已被取消或已超过截止时间，抛出对应的 PerplexityCallError 子类。
+    """
+    if ctx.cancelled:
+        raise PerplexityCancelledError("Perplexity 调用已被客户端取消")
+    if ctx.expired:
+        raise PerplexityTimeoutError(f"Perplexity 调用超时（超过 {ctx.timeout_ms} ms）")
+
+
+def _run_with_context(fn: Callable[[], Any], ctx: Optional[RequestContext], *, on_abandon: Callable[[], None]) -> Any:
+    """
+    在独立线程中执行阻塞的上游调用，并在截止时间到达或被取消时立即返回。
+
+    说明：同步 SDK 无法被中断，超时/取消后上游线程会被放弃（daemon），
+    由 on_abandon 负责标记其 Client 不再归还并尽力关闭连接。
+    """
+    if ctx is None:
+        return fn()
+    check_context(ctx)
+
+    done = threading.Event()
+    outcome: Dict[str, Any] = {}
+
+    def runner() -> None:
+        try:
+            outcome["value"] = fn()
+        except BaseException as exc:  # noqa: BLE001
+            outcome["error"] = exc
+        finally:
+            done.set()
+
+    threading.Thread(target=runner, name="perplexity-upstream", daemon=True).start()
+    ctx.on_cancel(done.set)
+    try:
+        done.wait(ctx.remaining_s())
+    finally:
+        ctx.remove_cancel_callback(done.set)
+
+    if "error" in outcome:
+        raise outcome["error"]
+    if "value" in outcome:
+        return outcome["value"]
+    on_abandon()
+    check_context(ctx)
+    raise PerplexityTimeoutError(f"Perplexity 调用超时（超过 {ctx.timeout_ms} ms）")
+
+
+def _consume_stream(
+    events: Iterable[Any], ctx: RequestContext, *, stopped: Callable[[], bool], strip_thinking: bool = False
+) -> Any:
+    """
+    消费 SDK 的流式事件：每个事件是截至当前的完整 payload（answer 逐步变长），
+    以 notifications/progress 推送新增文本，最终返回最后一个事件（与非流式返回一致）。
+
+    strip_thinking=True 时推送的文本先经过 ThinkStripper，<think> 块不会出现在进度通知中。
+    """
+    last: Any = None
+    received = 0
+    sent = ""
+    stripper = ThinkStripper() if strip_thinking else None
+    for event in events:
+        if stopped():
+            break
+        if not isinstance(event, dict):
+            continue
+        last = event
+        received += 1
+        answer = event.get("answer")
+        if not isinstance(answer, str) or answer == sent:
+            continue
+        # 上游偶尔会改写已输出的前缀，此时整段重发
+        if answer.startswith(sent):
+            delta = answer[len(sent):]
+        else:
+            delta = answer
+            stripper = ThinkStripper() if strip_thinking else None
+        sent = answer
+        if stripper is not None:
+            delta = stripper.feed(delta)
+            if not delta:
+                continue
+        ctx.report_progress(received, message=delta)
+    if stripper is not None and not stopped():
+        tail = stripper.finish()
+        if tail:
+            ctx.report_progress(received + 1, message=tail)
+    return last
+
+
+def _throttle(config: AppConfig, key: str, limit: Optional[RateLimit], ctx: Optional[RequestContext]) -> None:
+    """
+    按令牌桶排队；等待时间累加到 ctx.stats["queueMs"]。
+    """
+    if limit is None:
+        return
+    try:
+        waited_s = _RATE_LIMITER.acquire(key, limit, max_wait_s=config.rate_limit_max_wait_ms / 1000, ctx=ctx)
+    except RateLimitExceeded as exc:
+        if ctx is not None:
+            check_context(ctx)
+        raise PerplexityRateLimitedError(f"本地限流：{exc}") from exc
+    if ctx is not None and waited_s > 0:
+        ctx.stats["queueMs"] = ctx.stats.get("queueMs", 0) + int(waited_s * 1000)
+
+
+def _retry_delay_s(config: AppConfig, attempt: int) -> float:
+    """
+    第 attempt 次重试（从 0 开始）前的退避时长：指数增长并封顶，在 [上限/2, 上限] 之间随机抖动，避免并发调用同时重试。
+    """
+    cap_ms = min(config.retry_max_delay_ms, config.retry_base_ms * (2**attempt))
+    return random.uniform(cap_ms / 2, cap_ms) / 1000
+
+
+def _sleep_before_retry(delay_s: float, ctx: Optional[RequestContext]) -> bool:
+    """
+    等待退避时长；截止时间不足以等完、或等待期间被取消时返回 False（不再重试）。
+    """
+    if ctx is None:
+        time.sleep(delay_s)
+        return True
+    remaining = ctx.remaining_s()
+    if remaining is not None and remaining <= delay_s:
+        return False
+    woke = threading.Event()
+    ctx.on_cancel(woke.set)
+    try:
+        woke.wait(delay_s)
+    finally:
+        ctx.remove_cancel_callback(woke.set)
+    return not ctx.cancelled
+
+
 def call_perplexity_search(
     config: AppConfig,
     *,
@@ -74,38 +586,90 @@ def call_perplexity_search(
     language: str = "en-US",
     incognito: bool = False,
     backend_uuid: Optional[str] = None,
+    account: Optional[str] = None,
+    hedge: bool = False,
+    strip_thinking: bool = False,
+    ctx: Optional[RequestContext] = None,
 ) -> PerplexityResult:
     """
     调用非官方 SDK 的 search，返回 answer 与 raw payload。
+
+    传入 ctx 时按其截止时间/取消信号约束上游调用，超时抛出 PerplexityTimeoutError，
+    取消抛出 PerplexityCancelledError；若 ctx 需要进度且配置允许，则以流式方式调用上游并推送增量文本。
+    account 为优先使用的账号名（续问时由会话登记表提供，进程内粘滞路由缺失时生效，例如重启之后）。
+
+    上游失败抛出 PerplexityUpstreamError（带分类）；可重试的失败在截止时间内按退避重试至多 retry_max 次。
+    熔断按 (账号, 通道) 分开：熔断中的账号不参与选择，所有可用账号都在熔断时直接抛出 PerplexityCircuitOpenError。
+    hedge=True 且配置开启对冲时，主调用迟迟未返回会再发起一个相同调用（续问、deep research 与流式调用从不对冲）。
+    strip_thinking=True 时流式进度通知中不包含 <think> 块（返回的 answer 保持原样，由调用方决定是否剥离）。
     """
-    try:
-        perplexity = __import__("perplexity")
-    except Exception as exc:  # noqa: BLE001
-        raise PerplexityCallError(
-            "无法导入 perplexity SDK。请先确保已安装 ../perplexity-ai 及其依赖。"
-        ) from exc
+    perplexity = _import_sdk()
 
-    try:
-        client = perplexity.Client(dict(config.cookies))
-        follow_up = None
-        if isinstance(backend_uuid, str) and backend_uuid.strip():
-            follow_up = {"backend_uuid": backend_uuid.strip(), "attachments": []}
-        payload = client.search(
-            query,
-            mode=mode,
-            model=model,
-            sources=sources or ["web"],
-            files={},
-            stream=False,
-            language=language,
-            follow_up=follow_up,
-            incognito=incognito,
-        )
-    except Exception as exc:  # noqa: BLE001
-        raise PerplexityCallError(f"Perplexity 调用失败：{exc}") from exc
+    follow_up = None
+    follow_up_uuid: Optional[str] = None
+    if isinstance(backend_uuid, str) and backend_uuid.strip():
+        follow_up_uuid = backend_uuid.strip()
+        follow_up = {"backend_uuid": follow_up_uuid, "attachments": []}
 
-    if not isinstance(payload, dict):
-        raise PerplexityCallError("Perplexity 返回不是对象，无法解析")
+    stream = bool(config.stream and ctx is not None and ctx.wants_progress)
+    # 续问依赖会话状态、deep research 代价高昂、流式调用会重复推送进度：三者都不对冲
+    hedge = hedge and config.hedge and follow_up is None and mode != "deep research" and not stream
+    if hedge:
+        _HEDGE.note_eligible(config.hedge_max_ratio)
+    started = time.monotonic()
+    attempt = 0
+    try:
+        while True:
+            hedge_delay_s = (
+                _HEDGE.delay_s(mode, fixed_ms=config.hedge_delay_ms, percentile=config.hedge_percentile)
+                if hedge
+                else None
+            )
+            try:
+                payload, lease = _search_once(
+                    config,
+                    perplexity,
+                    hedge_delay_s=hedge_delay_s,
+                    query=query,
+                    mode=mode,
+                    sources=sources,
+                    model=model,
+                    language=language,
+                    incognito=incognito,
+                    follow_up=follow_up,
+                    follow_up_uuid=follow_up_uuid,
+                    account=account,
+                    stream=stream,
+                    strip_thinking=strip_thinking,
+                    ctx=ctx,
+                )
+            except PerplexityUpstreamError as exc:
+                if not exc.retryable or attempt >= config.retry_max:
+                    raise
+                delay_s = _retry_delay_s(config, attempt)
+                log_event(
+                    {
+                        "level": "warn",
+                        "msg": "上游调用失败，稍后重试",
+                        "requestId": ctx.request_id if ctx is not None else None,
+                        "attempt": attempt + 1,
+                        "errorClass": exc.kind,
+                        "delayMs": int(delay_s * 1000),
+                    },
+                    sampled=True,
+                )
+                if not _sleep_before_retry(delay_s, ctx):
+                    if ctx is not None:
+                        check_context(ctx)
+                    raise
+                attempt += 1
+                if ctx is not None:
+                    ctx.stats["retries"] = attempt
+                continue
+            break
+    finally:
+        if ctx is not None:
+            ctx.stats["upstreamMs"] = int((time.monotonic() - started) * 1000)
 
     answer, chunks = _extract_answer(payload)
     extracted_backend_uuid = _extract_backend_uuid(payload)
@@ -117,4 +681,267 @@ def call_perplexity_search(
         else:
             answer = "未从 Perplexity 响应中解析出 answer"
 
-    return PerplexityResult(answer=answer, chunks=chunks, raw=payload, backend_uuid=extracted_backend_uuid)
+    if extracted_backend_uuid:
+        # 续问需要回到创建该会话的账号
+        _ACCOUNT_POOL.bind_thread(extracted_backend_uuid, lease.account.name)
+
+    sources = extract_sources(payload, max_sources=config.response_sources_max) if config.response_sources_max else None
+    if ctx is not None and sources is not None:
+        ctx.stats["sources"] = len(sources)
+
+    return PerplexityResult(
+        answer=answer,
+        chunks=chunks,
+        raw=payload,
+        backend_uuid=extracted_backend_uuid,
+        account=lease.account.name,
+        sources=sources,
+    )
+
+
+def _search_once(
+    config: AppConfig,
+    perplexity: Any,
+    *,
+    hedge_delay_s: Optional[float] = None,
+    ctx: Optional[RequestContext],
+    **kwargs: Any,
+) -> Tuple[Dict[str, Any], AccountLease]:
+    """
+    一次上游调用；给出 hedge_delay_s 时以对冲方式执行。
+    """
+    if hedge_delay_s is None:
+        return _call_upstream(config, perplexity, ctx=ctx, **kwargs)
+    return _call_hedged(config, perplexity, delay_s=hedge_delay_s, ctx=ctx, **kwargs)
+
+
+def _child_context(ctx: Optional[RequestContext], name: str) -> RequestContext:
+    """派生一个共享截止时间的子上下文：父上下文取消时子上下文随之取消，子上下文可单独取消。"""
+    if ctx is None:
+        return RequestContext(request_id=name)
+    child = RequestContext(request_id=f"{ctx.request_id}#{name}", timeout_ms=ctx.timeout_ms)
+    child.deadline = ctx.deadline
+    ctx.on_cancel(child.cancel)
+    return child
+
+
+def _call_hedged(
+    config: AppConfig,
+    perplexity: Any,
+    *,
+    delay_s: float,
+    ctx: Optional[RequestContext],
+    **kwargs: Any,
+) -> Tuple[Dict[str, Any], AccountLease]:
+    """
+    对冲调用：主调用在 delay_s 内未返回且预算允许时，发起一个相同的调用（多账号时换一个账号），
+    取先成功的结果并取消另一个（被取消的调用按放弃处理：关闭其 Client 连接、不归还池中）。
+    两者都失败时抛出先到达的错误；等待结果不超过 ctx 的截止时间（没有截止时间时按 config.timeout_ms），超时抛出 PerplexityTimeoutError。
+    """
+    timeout_ms = ctx.timeout_ms if ctx is not None and ctx.deadline is not None else config.timeout_ms
+    deadline = ctx.deadline if ctx is not None and ctx.deadline is not None else time.monotonic() + timeout_ms / 1000
+    outcomes: "queue.Queue[Tuple[int, Any, Optional[BaseException]]]" = queue.Queue()
+    children: List[RequestContext] = []
+
+    def launch(exclude: Sequence[str]) -> RequestContext:
+        index = len(children)
+        child = _child_context(ctx, "primary" if index == 0 else "hedge")
+        children.append(child)
+
+        def run() -> None:
+            try:
+                outcomes.put((index, _call_upstream(config, perplexity, ctx=child, exclude=exclude, **kwargs), None))
+            except BaseException as exc:  # noqa: BLE001
+                outcomes.put((index, None, exc))
+
+        threading.Thread(target=run, name="perplexity-hedge", daemon=True).start()
+        return child
+
+    primary = launch(())
+    try:
+        try:
+            outcome: Optional[Tuple[int, Any, Optional[BaseException]]] = outcomes.get(timeout=delay_s)
+        except queue.Empty:
+            outcome = None
+            if _HEDGE.try_spend():
+                used = primary.stats.get("account")
+                launch((used,) if used and len(config.account_list()) > 1 else ())
+                if ctx is not None:
+                    ctx.stats["hedged"] = True
+        received = 0
+        first_error: Optional[BaseException] = None
+        while True:
+            if outcome is None:
+                try:
+                    outcome = outcomes.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    # 上游卡住且没有可约束子调用的截止时间：放弃两个子调用（finally 中取消）
+                    raise PerplexityTimeoutError(f"Perplexity 调用超时（超过 {timeout_ms} ms）") from None
+            received += 1
+            index, value, exc = outcome
+            if exc is None:
+                if ctx is not None:
+                    ctx.stats.update(children[index].stats)
+                    if len(children) > 1:
+                        ctx.stats["hedgeWinner"] = "primary" if index == 0 else "hedge"
+                return value
+            first_error = first_error or exc
+            if received >= len(children):
+                raise first_error
+            outcome = None
+    finally:
+        for child in children:
+            child.cancel()
+            if ctx is not None:
+                ctx.remove_cancel_callback(child.cancel)
+
+
+def _call_upstream(
+    config: AppConfig,
+    perplexity: Any,
+    *,
+    query: str,
+    mode: str,
+    sources: Optional[List[str]],
+    model: Optional[str],
+    language: str,
+    incognito: bool,
+    follow_up: Optional[Dict[str, Any]],
+    follow_up_uuid: Optional[str],
+    account: Optional[str],
+    stream: bool,
+    ctx: Optional[RequestContext],
+    strip_thinking: bool = False,
+    exclude: Sequence[str] = (),
+) -> Tuple[Dict[str, Any], AccountLease]:
+    """
+    一次上游调用（限流排队、选择账号、借用 Client、按截止时间等待），返回 payload 与承接调用的账号。
+
+    成功调用的上游耗时（从发起 SDK 调用算起，不含本地限流与账号排队）按 mode 记入对冲策略与负载监控的样本。exclude 为不使用的账号（对冲调用避开主调用的账号）。
+    结果按分类计入所用账号在该通道的熔断器；新对话不选择熔断中的账号，续问必须回到原账号，原账号熔断时直接失败。
+    """
+    lane = breaker_lane(mode)
+    threshold = config.breaker_threshold
+    accounts = config.account_list()
+    if follow_up_uuid is None:
+        blocked: Dict[str, float] = {}
+        for candidate in accounts:
+            wait_s = _BREAKERS.get(candidate.name, lane).retry_after(threshold=threshold)
+            if wait_s is not None:
+                blocked[candidate.name] = wait_s
+        if blocked and all(a.name in blocked or a.name in exclude for a in accounts):
+            raise _circuit_open_error(min(blocked.values()))
+        exclude = (*exclude, *blocked)
+    _throttle(config, f"mode={mode}", config.mode_rate_limits.get(mode), ctx)
+    try:
+        lease = _ACCOUNT_POOL.acquire(accounts, backend_uuid=follow_up_uuid, prefer=account, exclude=exclude, ctx=ctx)
+    except AccountUnavailableError as exc:
+        if ctx is not None:
+            check_context(ctx)
+        raise PerplexityTimeoutError(str(exc)) from exc
+    breaker = _BREAKERS.get(lease.account.name, lane)
+    wait_s, probe = breaker.allow(threshold=threshold)
+    if wait_s is not None:
+        _ACCOUNT_POOL.release(lease)
+        raise _circuit_open_error(wait_s, account=lease.account.name)
+    try:
+        _throttle(config, f"account={lease.account.name}", config.account_rate_limit, ctx)
+    except PerplexityCallError:
+        breaker.release_probe(probe)
+        _ACCOUNT_POOL.release(lease)
+        raise
+    if ctx is not None:
+        ctx.stats["account"] = lease.account.name
+    holder: Dict[str, Any] = {"pooled": None, "abandoned": False, "claimed": False, "streamed": False, "inflight": False}
+    claim_lock = threading.Lock()
+
+    def claim() -> bool:
+        # 账号归还只能发生一次：由上游线程（真正发起调用时）或调用方（上游线程未启动时）认领
+        with claim_lock:
+            if holder["claimed"]:
+                return False
+            holder["claimed"] = True
+            return True
+
+    def search() -> Any:
+        if not claim():
+            raise PerplexityCancelledError("调用已放弃")
+        failure_kind: Optional[str] = None
+        pooled: Optional[PooledClient] = None
+        healthy = False
+        try:
+            pooled = _CLIENT_POOL.acquire(perplexity.Client, lease.account.cookies)
+            holder["pooled"] = pooled
+            LOAD.upstream_started()
+            holder["inflight"] = True
+            holder["started"] = time.monotonic()
+            payload = pooled.client.search(
+                query,
+                mode=mode,
+                model=model,
+                sources=sources or ["web"],
+                files={},
+                stream=stream,
+                language=language,
+                follow_up=follow_up,
+                incognito=incognito,
+            )
+            if stream and ctx is not None and not isinstance(payload, dict):
+                holder["streamed"] = True
+                payload = _consume_stream(
+                    payload, ctx, stopped=lambda: holder["abandoned"], strip_thinking=strip_thinking
+                )
+            healthy = True
+            return payload
+        except Exception as exc:  # noqa: BLE001
+            failure_kind = classify_failure(exc)
+            raise
+        finally:
+            if holder["inflight"]:
+                LOAD.upstream_finished()
+            if pooled is not None:
+                _CLIENT_POOL.release(
+                    pooled,
+                    healthy=healthy and not holder["abandoned"],
+                    max_idle=config.client_pool_size,
+                    max_uses=config.client_max_uses,
+                )
+            _ACCOUNT_POOL.release(lease, failure_kind=failure_kind, cooldown_s=config.account_cooldown_s)
+
+    def abandon() -> None:
+        holder["abandoned"] = True
+        if holder["pooled"] is not None:
+            _close_client(holder["pooled"].client)
+
+    ok = False
+    failure_kind: Optional[str] = None
+    try:
+        payload = _run_with_context(search, ctx, on_abandon=abandon)
+        if not isinstance(payload, dict):
+            failure_kind = "bad_response"
+            raise PerplexityUpstreamError("Perplexity 返回不是对象，无法解析", kind=failure_kind)
+        ok = True
+    except PerplexityCallError:
+        raise
+    except Exception as exc:  # noqa: BLE001
+        failure_kind = classify_failure(exc)
+        raise PerplexityUpstreamError(
+            f"Perplexity 调用失败：{exc}",
+            kind=failure_kind,
+            retryable=failure_kind in _RETRYABLE_KINDS and not holder["streamed"],
+        ) from exc
+    finally:
+        if claim():
+            _ACCOUNT_POOL.release(lease)
+        if ok:
+            breaker.record_success()
+        elif failure_kind in _BREAKER_KINDS:
+            breaker.record_failure(threshold=threshold, cooldown_s=config.breaker_cooldown_s, kind=failure_kind)
+        else:
+            # 超时、取消、账号级失败（auth / rate_limited）：不反映上游健康状况，只让出探测名额
+            breaker.release_probe(probe)
+    # 排队等待由本地限流决定：计入样本会让负载越高对冲越晚，并让本地拥塞（已由队列深度反映）再被当作上游变慢
+    upstream_s = time.monotonic() - holder["started"]
+    _HEDGE.record(mode, upstream_s)
+    LOAD.record_latency(mode, upstream_s)
+    return payload, lease
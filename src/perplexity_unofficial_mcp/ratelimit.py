@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, Hashable, Optional, Tuple
+
+from .config import RateLimit
+from .context import RequestContext
+
+
+class RateLimitExceeded(Exception):
+    """排队等待令牌的时间会超过允许的上限（或请求截止时间）。"""
+
+
+class TokenBucket:
+    """
+    令牌桶：容量 burst，按 rate_per_s 匀速补充。
+
+    reserve() 采用“预约”语义：令牌可以被预支为负数，返回调用方需要等待的秒数，
+    从而让排队请求按到达顺序依次放行，而不是同时醒来争抢。
+    """
+
+    def __init__(self, *, rate_per_s: float, burst: float) -> None:
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+
+    def reserve(self, *, max_wait_s: float) -> Optional[float]:
+        """
+        预约一个令牌；返回需要等待的秒数，若等待会超过 max_wait_s 则不预约并返回 None。
+        """
+        now = time.monotonic()
+        self._refill(now)
+        wait_s = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate_per_s
+        if wait_s > max_wait_s:
+            return None
+        self._tokens -= 1
+        return wait_s
+
+    def refund(self) -> None:
+        self._tokens = min(self.burst, self._tokens + 1)
+
+
+class RateLimiter:
+    """
+    按 key（例如 mode 或账号名）维护令牌桶；超出速率的请求在本地排队，等待时间有上限。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: Dict[Hashable, Tuple[RateLimit, TokenBucket]] = {}
+
+    def _bucket(self, key: Hashable, limit: RateLimit) -> TokenBucket:
+        entry = self._buckets.get(key)
+        if entry is None or entry[0] != limit:
+            bucket = TokenBucket(rate_per_s=limit.count / limit.period_s, burst=limit.count)
+            self._buckets[key] = (limit, bucket)
+            return bucket
+        return entry[1]
+
+    def acquire(
+        self,
+        key: Hashable,
+        limit: RateLimit,
+        *,
+        max_wait_s: float,
+        ctx: Optional[RequestContext] = None,
+    ) -> float:
+        """
+        获取一个令牌，必要时阻塞排队；返回实际等待秒数。
+
+        等待上限取 max_wait_s 与请求剩余时间的较小值；超出时抛出 RateLimitExceeded。
+        排队期间被取消时归还令牌并抛出 RateLimitExceeded。
+        """
+        if ctx is not None:
+            remaining = ctx.remaining_s()
+            if remaining is not None:
+                max_wait_s = min(max_wait_s, max(remaining, 0.0))
+        with self._lock:
+            bucket = self._bucket(key, limit)
+            wait_s = bucket.reserve(max_wait_s=max_wait_s)
+        if wait_s is None:
+            raise RateLimitExceeded(f"{key} 本地限流排队将超过 {int(max_wait_s * 1000)} ms")
+        if wait_s <= 0:
+            return 0.0
+
+        woken = threading.Event()
+        if ctx is not None:
+            ctx.on_cancel(woken.set)
+        try:
+            woken.wait(wait_s)
+        finally:
+            if ctx is not None:
+                ctx.remove_cancel_callback(woken.set)
+        if woken.is_set():
+            with self._lock:
+                bucket.refund()
+            raise RateLimitExceeded(f"{key} 排队期间请求已取消")
+        return wait_s
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Mapping, Optional, Sequence, Tuple
+
+
+@dataclass
+class _Lane:
+    cap: int
+    queue: Deque[Tuple[float, Callable[[], None]]] = field(default_factory=deque)
+    running: int = 0
+
+
+class LaneScheduler:
+    """
+    多通道调度器：固定数量的工作线程服务多个通道（lane），每个通道有独立的队列与并发上限。
+
+    说明：
+    - 工作线程按 priority 顺序挑选通道：靠前的通道（例如 light）只要有排队任务且未达上限就优先派发
+    - 任一通道队首等待超过 max_priority_wait_s 后不再让位，避免低优先级通道在持续高负载下饿死
+    - shutdown(wait=True) 会停止接收新任务、执行完已排队任务后再返回
+    - acquire()/release() 供在自有线程中执行的任务（例如 perplexity_batch 的子查询）占用通道名额，与排队任务共用并发上限
+    """
+
+    max_priority_wait_s: float = 30.0
+
+    def __init__(
+        self,
+        *,
+        workers: int,
+        lane_caps: Mapping[str, int],
+        priority: Sequence[str],
+        thread_name_prefix: str = "mcp-tool",
+    ) -> None:
+        self._cond = threading.Condition()
+        self._lanes: Dict[str, _Lane] = {name: _Lane(cap=max(1, cap)) for name, cap in lane_caps.items()}
+        self._priority = [name for name in priority if name in self._lanes]
+        self._closed = False
+        self._threads: List[threading.Thread] = []
+        for idx in range(max(1, workers)):
+            t = threading.Thread(target=self._worker, name=f"{thread_name_prefix}-{idx}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, lane: str, fn: Callable[..., Any], *args: Any) -> None:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("scheduler 已关闭")
+            target = self._lanes.get(lane) or self._lanes[self._priority[-1]]
+            target.queue.append((time.monotonic(), lambda: fn(*args)))
+            # 条件变量上同时可能有等待名额的 acquire() 调用方，notify() 可能唤醒不了空闲工作线程
+            self._cond.notify_all()
+
+    def acquire(
+        self, lane: str, *, timeout_s: Optional[float] = None, cancelled: Optional[Callable[[], bool]] = None
+    ) -> bool:
+        """
+        在调用线程内占用 lane 的一个并发名额，直到 release(lane)；超时或 cancelled() 为真时返回 False。
+
+        等待中的调用方只在名额释放或 wake() 时被唤醒，取消方应在取消后调用 wake()。
+        """
+        deadline = time.monotonic() + timeout_s if timeout_s is not None else None
+        with self._cond:
+            target = self._lanes.get(lane) or self._lanes[self._priority[-1]]
+            while target.running >= target.cap:
+                if cancelled is not None and cancelled():
+                    return False
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            target.running += 1
+            return True
+
+    def release(self, lane: str) -> None:
+        with self._cond:
+            target = self._lanes.get(lane) or self._lanes[self._priority[-1]]
+            target.running -= 1
+            self._cond.notify_all()
+
+    def wake(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+
+    def _next_task(self) -> Optional[Tuple[_Lane, Callable[[], None]]]:
+        ready = [self._lanes[name] for name in self._priority]
+        ready = [lane for lane in ready if lane.queue and lane.running < lane.cap]
+        if not ready:
+            return None
+        now = time.monotonic()
+        starving = [lane for lane in ready if now - lane.queue[0][0] > self.max_priority_wait_s]
+        lane = min(starving, key=lambda x: x.queue[0][0]) if starving else ready[0]
+        _enqueued_at, task = lane.queue.popleft()
+        lane.running += 1
+        return lane, task
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                picked = self._next_task()
+                while picked is None:
+                    if self._closed and not any(lane.queue for lane in self._lanes.values()):
+                        return
+                    self._cond.wait()
+                    picked = self._next_task()
+            lane, task = picked
+            try:
+                task()
+            except Exception:  # noqa: BLE001
+                # 任务自身负责写回错误响应；这里只保证工作线程不退出
+                pass
+            finally:
+                with self._cond:
+                    lane.running -= 1
+                    self._cond.notify_all()
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return sum(len(lane.queue) for lane in self._lanes.values())
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._cond:
+            return {
+                name: {"queued": len(lane.queue), "running": lane.running, "cap": lane.cap}
+                for name, lane in self._lanes.items()
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
@@ -0,0 +1,534 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from .codec import dumps, use_codec
+from .config import AppConfig, ConfigError, load_config, redact_env
+from .context import ProgressToken, RequestContext
+from .jsonrpc import JsonRpcError, ParsedRequest, make_error, make_result, safe_parse_request
+from .load import LOAD
+from .logging import configure_logging, dropped_log_count, log_event
+from .metrics import METRICS, MetricsFileExporter, start_metrics_server
+from .breaker import STATE_VALUES
+from .perplexity_adapter import circuit_snapshot, warm_up
+from .scheduler import LaneScheduler
+from .tools import ANSWERS, THREADS, call_tool, list_tools, tool_lane, use_lane_scheduler
+
+
+JsonObject = Dict[str, Any]
+# 写出一条消息：单个 JSON-RPC 对象，或批量请求对应的响应数组
+Send = Callable[[Any], None]
+Done = Callable[[], None]
+
+# 启动耗时的基准点：入口导入链中尽早记录（不含解释器自身启动）
+_PROCESS_STARTED = time.monotonic()
+
+
+def startup_elapsed_ms() -> int:
+    return int((time.monotonic() - _PROCESS_STARTED) * 1000)
+
+
+# 通过 MCP resources/read 暴露的指标快照（JSON，直方图附带 p50/p95/p99）
+METRICS_RESOURCE_URI = "perplexity://metrics"
+_METRICS_RESOURCE: JsonObject = {
+    "uri": METRICS_RESOURCE_URI,
+    "name": "metrics",
+    "description": "进程内延迟直方图、错误计数、缓存命中与在途请求数",
+    "mimeType": "application/json",
+}
+
+
+@dataclass
+class ServerState:
+    """
+    单个 MCP 会话的状态（STDIO 下整个进程只有一个；HTTP 下每个 Mcp-Session-Id 一个）。
+    """
+
+    initialized: bool = False
+    protocol_version: str = "2024-11-05"
+    session_id: Optional[str] = None
+    # 在途 tools/call：JSON-RPC id -> 执行上下文，用于响应 notifications/cancelled
+    inflight: Dict[Any, RequestContext] = field(default_factory=dict)
+    inflight_lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def cancel_all(self) -> None:
+        with self.inflight_lock:
+            contexts = list(self.inflight.values())
+        for ctx in contexts:
+            ctx.cancel()
+
+
+def load_config_or_log() -> AppConfig:
+    """
+    加载配置；失败时写结构化日志到 stderr 后重新抛出（stdout 不能输出非 MCP 消息）。
+    """
+    try:
+        return load_config()
+    except ConfigError as exc:
+        log_event(
+            {
+                "level": "error",
+                "msg": "配置加载失败",
+                "error": str(exc),
+                "env": redact_env(dict(os.environ)),
+            }
+        )
+        raise
+
+
+def start_warmup(config: AppConfig) -> Optional[threading.Thread]:
+    """
+    在后台线程中预热 SDK（见 AppConfig.warmup），完成后记录各阶段耗时；不阻塞 initialize 等请求。
+
+    首个 tools/call 若在导入完成前到达，会在 Python 的导入锁上等待同一次导入，而不是重复导入。
+    """
+    if config.warmup == "off":
+        return None
+
+    def run() -> None:
+        try:
+            timings = warm_up(config, clients=config.warmup == "client")
+        except Exception as exc:  # noqa: BLE001
+            log_event({"level": "warn", "msg": "SDK 预热失败", "warmup": config.warmup, "error": str(exc)})
+            return
+        log_event(
+            {"level": "info", "msg": "SDK 预热完成", "warmup": config.warmup, "sinceStartMs": startup_elapsed_ms(), **timings}
+        )
+
+    thread = threading.Thread(target=run, name="mcp-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def _is_response(message: Any) -> bool:
+    return isinstance(message, dict) and "id" in message and ("result" in message or "error" in message)
+
+
+def _encodable(message: Any) -> bool:
+    try:
+        dumps(message)
+    except Exception:  # noqa: BLE001
+        return False
+    return True
+
+
+def unencodable_replacement(message: Any, exc: Exception) -> Any:
+    """
+    写出的消息无法序列化时的替代消息：响应改为同 id 的 -32603 错误，避免客户端一直等待该 id；
+    批量响应只替换无法序列化的成员；通知等其他消息返回 None（丢弃）。
+    """
+    if isinstance(message, list):
+        members = [m if _encodable(m) else unencodable_replacement(m, exc) for m in message]
+        return [m for m in members if m is not None] or None
+    if not _is_response(message):
+        log_event({"level": "warn", "msg": "消息无法序列化，已丢弃", "error": str(exc)})
+        return None
+    log_event({"level": "error", "msg": "响应无法序列化，改为返回内部错误", "requestId": message["id"], "error": str(exc)})
+    return make_error(message["id"], -32603, f"Internal error: 响应无法序列化（{exc}）")
+
+
+def _read_progress_token(params: Mapping[str, Any]) -> Optional[ProgressToken]:
+    meta = params.get("_meta")
+    if not isinstance(meta, dict):
+        return None
+    token = meta.get("progressToken")
+    if isinstance(token, (str, int)) and not isinstance(token, bool):
+        return token
+    return None
+
+
+class _BatchCollector:
+    """
+    汇总一个批量请求中各成员的响应：全部成员结束后一次性写回数组（stream=True 时逐条写回）。
+
+    通知成员与被取消的成员没有响应；全部成员都没有响应时不写回任何内容（JSON-RPC 2.0 约定）。
+    """
+
+    def __init__(self, size: int, *, respond: Send, done: Optional[Done], stream: bool) -> None:
+        self._lock = threading.Lock()
+        self._pending = size
+        self._responses: List[Optional[JsonObject]] = [None] * size
+        self._respond = respond
+        self._done = done
+        self._stream = stream
+
+    def respond_for(self, index: int) -> Send:
+        def _respond(msg: JsonObject) -> None:
+            if self._stream:
+                self._respond(msg)
+                return
+            with self._lock:
+                self._responses[index] = msg
+
+        return _respond
+
+    def member_done(self) -> None:
+        with self._lock:
+            self._pending -= 1
+            if self._pending > 0:
+                return
+            responses = [r for r in self._responses if r is not None]
+        if responses and not self._stream:
+            self._respond(responses)
+        if self._done is not None:
+            self._done()
+
+
+class McpServer:
+    """
+    与传输层无关的 MCP 请求分发：STDIO 与 HTTP 共用同一套处理逻辑、调度器与进程内状态。
+
+    说明：
+    - 控制类方法（initialize / ping / tools/list 等）在调用线程内直接应答
+    - tools/call 交给 LaneScheduler 排队执行，完成后通过 respond 回调写回
+    - respond 对每个非通知请求至多调用一次（被取消的请求不再应答）；notify 用于进度等通知
+    - 调度器与下游的缓存/限流/账号池都是进程级共享的，多个会话之间天然共用
+    """
+
+    def __init__(self, config: AppConfig) -> None:
+        self.config = config
+        # 编解码后端是进程级设置：解析请求、写出响应与日志共用
+        self.codec = use_codec(config.json_codec)
+        configure_logging(
+            level=config.log_level, sample_rate=config.log_sample_rate, buffer_size=config.log_buffer_size
+        )
+        self.scheduler = LaneScheduler(
+            workers=config.max_workers,
+            lane_caps={
+                "light": config.light_lane_concurrency,
+                "heavy": config.heavy_lane_concurrency,
+                # perplexity_batch 的协调者只等待子查询，子查询另行占用 light / heavy 名额
+                "batch": config.light_lane_concurrency,
+            },
+            priority=["light", "batch", "heavy"],
+        )
+        use_lane_scheduler(self.scheduler)
+        self._register_metric_collectors()
+        LOAD.set_queue_depth_source(self.scheduler.queue_depth)
+        if config.thread_max_entries > 0 and config.thread_store_path:
+            THREADS.attach(config.thread_store_path)
+        if config.store_path:
+            ANSWERS.open(config.store_path, max_entries=config.store_max_entries)
+        self._metrics_file = (
+            MetricsFileExporter(METRICS, config.metrics_file, interval_s=config.metrics_interval_s)
+            if config.metrics_file
+            else None
+        )
+        self._metrics_httpd = (
+            start_metrics_server(config.http_host, config.metrics_port) if config.metrics_port is not None else None
+        )
+
+    def _register_metric_collectors(self) -> None:
+        def lanes(field_name: str) -> List[Any]:
+            return [({"lane": lane}, snap[field_name]) for lane, snap in self.scheduler.snapshot().items()]
+
+        METRICS.register_collector("mcp_lane_queued", "gauge", lambda: lanes("queued"))
+        METRICS.register_collector("mcp_lane_running", "gauge", lambda: lanes("running"))
+        METRICS.register_collector("mcp_log_dropped_total", "counter", lambda: [({}, dropped_log_count())])
+        METRICS.register_collector(
+            "mcp_upstream_circuit_state",
+            "gauge",
+            lambda: [
+                ({"account": snap["account"], "lane": snap["lane"]}, STATE_VALUES[snap["state"]])
+                for snap in circuit_snapshot()
+            ],
+        )
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.scheduler.shutdown(wait=wait)
+        use_lane_scheduler(None)
+        if self.config.thread_max_entries > 0 and self.config.thread_store_path:
+            THREADS.close()
+        if self.config.store_path:
+            ANSWERS.close()
+        if self._metrics_httpd is not None:
+            self._metrics_httpd.shutdown()
+            self._metrics_httpd.server_close()
+        if self._metrics_file is not None:
+            self._metrics_file.stop()
+
+    @staticmethod
+    def _record_tool_metrics(name: str, ctx: RequestContext, *, outcome: str, duration_ms: float) -> None:
+        """
+        把单次 tools/call 的观测结果计入进程内指标；mode 为实际使用的 mode（参数校验失败时为空）。
+        """
+        stats = ctx.stats
+        mode = stats.get("mode")
+        METRICS.inc("mcp_tool_calls_total", tool=name, outcome=outcome)
+        if "errorClass" in stats:
+            METRICS.inc("mcp_tool_errors_total", tool=name, error_class=stats["errorClass"])
+        if "cache" in stats:
+            METRICS.inc("mcp_cache_lookups_total", tool=name, result=stats["cache"])
+        METRICS.observe("mcp_tool_queue_ms", stats.get("laneWaitMs", 0), lane=tool_lane(name))
+        METRICS.observe("mcp_tool_duration_ms", duration_ms, tool=name, mode=mode)
+        if "upstreamMs" in stats:
+            METRICS.observe("mcp_upstream_ms", stats["upstreamMs"], tool=name, mode=mode)
+        if "retries" in stats:
+            METRICS.inc("mcp_upstream_retries_total", stats["retries"], tool=name)
+        if "degradedFrom" in stats:
+            METRICS.inc("mcp_mode_degraded_total", tool=name, reason=stats["degradeReason"])
+        if stats.get("hedged"):
+            METRICS.inc("mcp_upstream_hedged_total", tool=name, winner=stats.get("hedgeWinner", "none"))
+
+    @staticmethod
+    def _log_request(
+        state: ServerState,
+        req: ParsedRequest,
+        *,
+        tool_name: Optional[str],
+        start: float,
+        ok: bool,
+        ctx: Optional[RequestContext] = None,
+    ) -> None:
+        duration_ms = int((time.time() - start) * 1000)
+        event: JsonObject = {
+            "level": "info" if ok else "error",
+            "requestId": req.id,
+            "method": req.method,
+            "toolName": tool_name,
+            "durationMs": duration_ms,
+            "ok": ok,
+        }
+        if state.session_id is not None:
+            event["sessionId"] = state.session_id
+        if ctx is not None:
+            event.update(ctx.stats)
+            if ctx.cancelled:
+                event["cancelled"] = True
+        log_event(event, sampled=True)
+
+    def _run_tool_call(
+        self,
+        state: ServerState,
+        req: ParsedRequest,
+        name: str,
+        arguments: Mapping[str, Any],
+        ctx: RequestContext,
+        start: float,
+        respond: Send,
+        done: Optional[Done],
+    ) -> None:
+        """
+        在工作线程中执行 tools/call，完成后按 JSON-RPC id 写回响应（响应顺序与请求顺序无关）。
+
+        已被客户端取消的请求不再写回响应（MCP 约定）。
+        """
+        ok = True
+        outcome = "ok"
+        ctx.stats["laneWaitMs"] = int((time.time() - start) * 1000)
+        try:
+            result = call_tool(self.config, name, arguments, ctx)
+            if result.get("isError"):
+                outcome = "error"
+            if not req.is_notification and not ctx.cancelled:
+                respond(make_result(req.id, result))
+        except Exception as exc:  # noqa: BLE001
+            ok = False
+            outcome = "error"
+            ctx.stats.setdefault("errorClass", "internal")
+            if not req.is_notification and not ctx.cancelled:
+                respond(make_error(req.id, -32603, f"Internal error: {exc}"))
+        finally:
+            with state.inflight_lock:
+                if state.inflight.get(req.id) is ctx:
+                    del state.inflight[req.id]
+            METRICS.add_gauge("mcp_tools_inflight", -1)
+            self._record_tool_metrics(
+                name,
+                ctx,
+                outcome="cancelled" if ctx.cancelled else outcome,
+                duration_ms=(time.time() - start) * 1000,
+            )
+            self._log_request(state, req, tool_name=name, start=start, ok=ok, ctx=ctx)
+            if done is not None:
+                done()
+
+    @staticmethod
+    def _cancel_request(state: ServerState, params: Mapping[str, Any]) -> None:
+        request_id = params.get("requestId")
+        with state.inflight_lock:
+            ctx = state.inflight.get(request_id)
+        if ctx is not None:
+            ctx.cancel()
+
+    def handle(
+        self,
+        state: ServerState,
+        req: ParsedRequest,
+        *,
+        respond: Send,
+        notify: Optional[Send] = None,
+        done: Optional[Done] = None,
+    ) -> None:
+        """
+        处理一条 JSON-RPC 请求。
+
+        notify 为 None 表示该传输无法推送通知（不会启用流式进度）；
+        done 在请求处理结束后调用且只调用一次（无论是否写回了响应，例如通知或已取消的请求）。
+        """
+        start = time.time()
+        tool_name: Optional[str] = None
+        ok = True
+        deferred = False
+        try:
+            if req.method == "initialize":
+                if state.initialized:
+                    raise JsonRpcError(-32600, "Invalid Request: 已初始化")
+                client_proto = req.params.get("protocolVersion")
+                if isinstance(client_proto, str) and client_proto:
+                    state.protocol_version = client_proto
+                state.initialized = True
+                result = {
+                    "protocolVersion": state.protocol_version,
+                    "serverInfo": {
+                        "name": "perplexity-unofficial-mcp",
+                        "version": "0.1.0",
+                    },
+                    "capabilities": {
+                        "tools": {},
+                        "resources": {},
+                    },
+                }
+                if not req.is_notification:
+                    respond(make_result(req.id, result))
+
+            elif req.method in {"notifications/initialized", "initialized"}:
+                # 兼容不同客户端命名；通知无响应
+                pass
+
+            elif req.method == "notifications/cancelled":
+                # 取消在途请求：释放等待中的工作线程，并放弃对应的上游调用
+                self._cancel_request(state, req.params)
+
+            elif req.method == "ping":
+                if not req.is_notification:
+                    respond(make_result(req.id, {}))
+
+            elif req.method == "tools/list":
+                if not state.initialized:
+                    raise JsonRpcError(-32002, "Server not initialized")
+                if not req.is_notification:
+                    respond(make_result(req.id, {"tools": list_tools()}))
+
+            elif req.method == "tools/call":
+                if not state.initialized:
+                    raise JsonRpcError(-32002, "Server not initialized")
+                name = req.params.get("name")
+                arguments = req.params.get("arguments", {})
+                if not isinstance(name, str) or not name:
+                    raise JsonRpcError(-32602, "Invalid params: name 必须是非空字符串")
+                if arguments is None:
+                    arguments = {}
+                if not isinstance(arguments, dict):
+                    raise JsonRpcError(-32602, "Invalid params: arguments 必须是对象")
+                tool_name = name
+                ctx = RequestContext(
+                    request_id=req.id,
+                    timeout_ms=self.config.timeout_ms_for_tool(name),
+                    progress_token=_read_progress_token(req.params),
+                    notify=notify,
+                )
+                if not req.is_notification:
+                    with state.inflight_lock:
+                        state.inflight[req.id] = ctx
+                # 参数校验在调用线程内完成；真正的上游调用交给调度器，避免阻塞后续请求。
+                # 计数须在提交前增加（任务可能在 submit 返回前就已执行完并减回），提交失败时撤销
+                METRICS.add_gauge("mcp_tools_inflight", 1)
+                try:
+                    self.scheduler.submit(
+                        tool_lane(name), self._run_tool_call, state, req, name, arguments, ctx, start, respond, done
+                    )
+                except Exception:
+                    METRICS.add_gauge("mcp_tools_inflight", -1)
+                    with state.inflight_lock:
+                        if state.inflight.get(req.id) is ctx:
+                            del state.inflight[req.id]
+                    raise
+                deferred = True
+
+            elif req.method == "resources/list":
+                if not state.initialized:
+                    raise JsonRpcError(-32002, "Server not initialized")
+                if not req.is_notification:
+                    respond(make_result(req.id, {"resources": [_METRICS_RESOURCE]}))
+
+            elif req.method == "resources/read":
+                if not state.initialized:
+                    raise JsonRpcError(-32002, "Server not initialized")
+                uri = req.params.get("uri")
+                if uri != METRICS_RESOURCE_URI:
+                    raise JsonRpcError(-32002, f"Resource not found: {uri}", data={"uri": uri})
+                contents = {"uri": uri, "mimeType": "application/json", "text": dumps(METRICS.snapshot())}
+                if not req.is_notification:
+                    respond(make_result(req.id, {"contents": [contents]}))
+
+            elif req.method == "prompts/list":
+                if not state.initialized:
+                    raise JsonRpcError(-32002, "Server not initialized")
+                if not req.is_notification:
+                    respond(make_result(req.id, {"prompts": []}))
+
+            else:
+                raise JsonRpcError(-32601, f"Method not found: {req.method}")
+
+        except JsonRpcError as exc:
+            ok = False
+            if not req.is_notification:
+                respond(make_error(req.id, exc.code, exc.message, exc.data))
+        except Exception as exc:  # noqa: BLE001
+            ok = False
+            if not req.is_notification:
+                respond(make_error(req.id, -32603, f"Internal error: {exc}"))
+        finally:
+            if not deferred:
+                self._log_request(state, req, tool_name=tool_name, start=start, ok=ok)
+                if done is not None:
+                    done()
+
+    def handle_message(
+        self,
+        state: ServerState,
+        message: Any,
+        *,
+        respond: Send,
+        notify: Optional[Send] = None,
+        done: Optional[Done] = None,
+        stream_batch: bool = False,
+    ) -> None:
+        """
+        处理一条已解析的 JSON 消息：单个请求对象，或 JSON-RPC 2.0 批量请求数组。
+
+        批量请求的成员并发分发（tools/call 进入调度器），响应按成员顺序汇总为一个数组写回；
+        stream_batch=True 时每个成员完成即单独写回。
+        """
+        if not isinstance(message, list):
+            req, err = safe_parse_request(message)
+            if err is not None:
+                respond(err)
+                if done is not None:
+                    done()
+                return
+            assert req is not None
+            self.handle(state, req, respond=respond, notify=notify, done=done)
+            return
+
+        if not message:
+            respond(make_error(None, -32600, "Invalid Request: 批量请求不能为空数组"))
+            if done is not None:
+                done()
+            return
+
+        collector = _BatchCollector(len(message), respond=respond, done=done, stream=stream_batch)
+        for index, item in enumerate(message):
+            member_respond = collector.respond_for(index)
+            req, err = safe_parse_request(item)
+            if err is not None:
+                member_respond(err)
+                collector.member_done()
+                continue
+            assert req is not None
+            self.handle(state, req, respond=member_respond, notify=notify, done=collector.member_done)
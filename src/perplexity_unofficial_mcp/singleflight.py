@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from .context import RequestContext
+from .perplexity_adapter import PerplexityCancelledError, PerplexityTimeoutError, check_context
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.finished = False
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters: List[threading.Event] = []
+
+
+class SingleFlight:
+    """
+    合并相同 key 的并发调用：同一时刻只有一个 leader 真正执行，其余 follower 等待并共享其结果。
+
+    说明：
+    - leader 的普通失败会原样传给所有 follower
+    - leader 因自身超时/取消而放弃时，follower 不继承该结果，而是重新竞争成为新的 leader
+    - follower 按各自的 ctx 等待：自身被取消或超时时立即退出，不影响 leader
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], *, ctx: Optional[RequestContext] = None) -> Tuple[Any, bool]:
+        """
+        返回（结果, 是否来自其他调用方的共享结果）。
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is None:
+                    call = _Call()
+                    self._calls[key] = call
+                    leader = True
+                else:
+                    leader = False
+                    woken = threading.Event()
+                    call.waiters.append(woken)
+
+            if leader:
+                return self._lead(key, call, fn), False
+
+            self._wait(call, woken, ctx)
+            if isinstance(call.error, (PerplexityCancelledError, PerplexityTimeoutError)):
+                # leader 被自己的截止时间/取消打断：与本调用无关，重新发起
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+    def _lead(self, key: Hashable, call: _Call, fn: Callable[[], Any]) -> Any:
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                call.finished = True
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                waiters = list(call.waiters)
+            for woken in waiters:
+                woken.set()
+
+    @staticmethod
+    def _wait(call: _Call, woken: threading.Event, ctx: Optional[RequestContext]) -> None:
+        if ctx is None:
+            woken.wait()
+            return
+        ctx.on_cancel(woken.set)
+        try:
+            while not call.finished:
+                woken.wait(ctx.remaining_s())
+                if not call.finished:
+                    check_context(ctx)
+        finally:
+            ctx.remove_cancel_callback(woken.set)
+
+    def inflight_count(self) -> int:
+        with self._lock:
+            return len(self._calls)
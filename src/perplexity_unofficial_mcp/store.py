@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+from .codec import dumps, loads
+from .logging import log_event
+from .metrics import METRICS
+
+
+class AnswerStoreError(Exception):
+    """本地答案库不可用（未配置或打开失败）。"""
+
+
+@dataclass(frozen=True)
+class StoredAnswer:
+    tool: str
+    mode: str
+    query: str
+    answer: str
+    backend_uuid: Optional[str] = None
+    # 请求的检索来源过滤（例如 ["web"]）
+    search_sources: Sequence[str] = ()
+    # 回答引用的去重来源（extract_sources 的结果：index / url / title / snippet）
+    sources: Sequence[Dict[str, Any]] = ()
+    chunks: Optional[List[Any]] = None
+    created_at: float = field(default_factory=time.time)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    tool TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    query TEXT NOT NULL,
+    backend_uuid TEXT,
+    sources TEXT NOT NULL,
+    answer BLOB NOT NULL,
+    chunks BLOB,
+    citations TEXT
+);
+CREATE INDEX IF NOT EXISTS answers_created_at ON answers (created_at);
+"""
+
+
+def _compress(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), 6)
+
+
+def _decompress(blob: Optional[bytes]) -> str:
+    return zlib.decompress(blob).decode("utf-8") if blob else ""
+
+
+class AnswerStore:
+    """
+    本地答案库：把每次上游调用的问答持久化到 SQLite，并提供全文检索。
+
+    说明：
+    - 回答与 chunks 以 zlib 压缩存储；全文索引为无内容（contentless）FTS5 表，只保存索引，不重复存放原文
+    - SQLite 支持 trigram 分词器时使用 trigram（对中文等无空格文本可做子串检索），否则使用 unicode61；
+      未编译 FTS5 时退化为只对问题做 LIKE 匹配
+    - 写入经由后台线程排队执行（WAL 模式），请求路径只做入队；检索在调用线程内同步执行
+    - 超过 max_entries 时按写入时间淘汰最早的记录
+    - 写入失败只丢弃该条记录：计入 dropped 与 mcp_answer_store_dropped_total，并按 warn_interval_s 限频输出 warn 日志
+    """
+
+    # 召回结果中单条回答的最大字符数（超出截断并标记 truncated）
+    max_recall_chars: int = 4_000
+    # 每写入多少条检查一次容量
+    prune_every: int = 100
+    # 写入失败的 warn 日志最短间隔（秒）；间隔内的失败只计数，下一条日志给出累计条数
+    warn_interval_s: float = 60.0
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._fts: Optional[str] = None
+        self._max_entries = 0
+        self._queue: "queue.Queue[Optional[StoredAnswer]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._since_prune = 0
+        # 写入失败而丢弃的记录数（只由写线程更新）
+        self.dropped = 0
+        self._unreported_drops = 0
+        self._last_warn: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    def open(self, path: str, *, max_entries: int) -> None:
+        """打开（必要时创建）数据库并启动写线程；重复调用会先关闭已打开的库。"""
+        self.close()
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        # 早期版本的库没有 citations 列（sources 列始终保存请求的检索来源过滤）
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(answers)")}
+        if "citations" not in columns:
+            conn.execute("ALTER TABLE answers ADD COLUMN citations TEXT")
+        fts = None
+        for tokenizer in ("trigram", "unicode61"):
+            try:
+                conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS answers_fts "
+                    f"USING fts5(query, answer, content='', tokenize='{tokenizer}')"
+                )
+            except sqlite3.OperationalError:
+                continue
+            # 已存在的索引沿用其创建时的分词器
+            row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'answers_fts'").fetchone()
+            fts = "trigram" if row and "trigram" in row[0] else "unicode61"
+            break
+        with self._lock:
+            self._conn = conn
+            self._fts = fts
+            self._max_entries = max_entries
+        self._thread = threading.Thread(target=self._run, name="mcp-answer-store", daemon=True)
+        self._thread.start()
+
+    def put(self, record: StoredAnswer) -> None:
+        """入队待写入；未打开时忽略。"""
+        if self._conn is not None:
+            self._queue.put(record)
+
+    def _run(self) -> None:
+        while True:
+            record = self._queue.get()
+            try:
+                if record is None:
+                    return
+                self._insert(record)
+            except Exception as exc:  # noqa: BLE001
+                # 写入失败（磁盘满、文件被删除、chunks 无法编码等）只影响这一条记录
+                self._record_drop(exc)
+            finally:
+                self._queue.task_done()
+
+    def _record_drop(self, exc: Exception) -> None:
+        error_class = type(exc).__name__
+        self.dropped += 1
+        self._unreported_drops += 1
+        METRICS.inc("mcp_answer_store_dropped_total", error_class=error_class)
+        now = time.monotonic()
+        if self._last_warn is not None and now - self._last_warn < self.warn_interval_s:
+            return
+        self._last_warn = now
+        dropped, self._unreported_drops = self._unreported_drops, 0
+        log_event(
+            {
+                "level": "warn",
+                "msg": "答案库写入失败，记录已丢弃",
+                "errorClass": error_class,
+                "error": str(exc),
+                "dropped": dropped,
+            }
+        )
+
+    def _insert(self, record: StoredAnswer) -> None:
+        chunks = _compress(dumps(record.chunks)) if record.chunks is not None else None
+        with self._lock:
+            conn = self._conn
+            if conn is None:
+                return
+            conn.execute("BEGIN")
+            try:
+                cur = conn.execute(
+                    "INSERT INTO answers (created_at, tool, mode, query, backend_uuid, sources, answer, chunks, citations) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        record.created_at,
+                        record.tool,
+                        record.mode,
+                        record.query,
+                        record.backend_uuid,
+                        dumps(list(record.search_sources)),
+                        _compress(record.answer),
+                        chunks,
+                        dumps(list(record.sources)),
+                    ),
+                )
+                if self._fts is not None:
+                    conn.execute(
+                        "INSERT INTO answers_fts (rowid, query, answer) VALUES (?, ?, ?)",
+                        (cur.lastrowid, record.query, record.answer),
+                    )
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+            self._since_prune += 1
+            if self._since_prune >= self.prune_every:
+                self._since_prune = 0
+                self._prune(conn)
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        (count,) = conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+        excess = count - self._max_entries
+        if excess <= 0:
+            return
+        rows = conn.execute("SELECT id, query, answer FROM answers ORDER BY id LIMIT ?", (excess,)).fetchall()
+        conn.execute("BEGIN")
+        for row_id, query, answer in rows:
+            if self._fts is not None:
+                # 无内容 FTS 表删除时需提供原文
+                conn.execute(
+                    "INSERT INTO answers_fts (answers_fts, rowid, query, answer) VALUES ('delete', ?, ?, ?)",
+                    (row_id, query, _decompress(answer)),
+                )
+            conn.execute("DELETE FROM answers WHERE id = ?", (row_id,))
+        conn.execute("COMMIT")
+
+    def _match_expression(self, text: str) -> Optional[str]:
+        terms = [t.replace('"', '""') for t in text.split()]
+        if self._fts == "trigram":
+            # trigram 索引无法匹配少于 3 个字符的片段
+            terms = [t for t in terms if len(t) >= 3]
+        if not terms:
+            return None
+        return " OR ".join(f'"{t}"' for t in terms)
+
+    def search(
+        self, text: str, *, limit: int, tool: Optional[str] = None, max_age_s: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """按相关度返回匹配的历史问答（FTS5 bm25 排序；LIKE 退化模式按时间倒序）。"""
+        filters = ""
+        params: List[Any] = []
+        if tool:
+            filters += " AND a.tool = ?"
+            params.append(tool)
+        if max_age_s is not None:
+            filters += " AND a.created_at >= ?"
+            params.append(time.time() - max_age_s)
+        columns = "a.id, a.created_at, a.tool, a.mode, a.query, a.backend_uuid, a.sources, a.citations, a.answer"
+        with self._lock:
+            conn = self._conn
+            if conn is None:
+                raise AnswerStoreError("未启用本地答案库")
+            if self._fts is not None:
+                expression = self._match_expression(text)
+                if expression is None:
+                    return []
+                rows = conn.execute(
+                    f"SELECT {columns} FROM answers_fts f JOIN answers a ON a.id = f.rowid "
+                    f"WHERE answers_fts MATCH ?{filters} ORDER BY f.rank LIMIT ?",
+                    [expression, *params, limit],
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    f"SELECT {columns} FROM answers a WHERE a.query LIKE ?{filters} ORDER BY a.id DESC LIMIT ?",
+                    [f"%{text.strip()}%", *params, limit],
+                ).fetchall()
+
+        matches = []
+        for row_id, created_at, tool_name, mode, query, backend_uuid, search_sources, citations, answer in rows:
+            body = _decompress(answer)
+            match: Dict[str, Any] = {
+                "id": row_id,
+                "created_at": created_at,
+                "tool": tool_name,
+                "mode": mode,
+                "query": query,
+                "backend_uuid": backend_uuid,
+                "search_sources": loads(search_sources),
+                "sources": loads(citations) if citations else [],
+                "answer": body[: self.max_recall_chars],
+            }
+            if len(body) > self.max_recall_chars:
+                match["truncated"] = True
+            matches.append(match)
+        return matches
+
+    def flush(self) -> None:
+        """等待已入队的记录写完（测试与关闭时使用）。"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(5)
+            self._thread = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+            self._fts = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            if self._conn is None:
+                return 0
+            return int(self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0])
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+from .codec import dumps, loads
+
+
+@dataclass(frozen=True)
+class ThreadInfo:
+    """一轮对话的本地记录：backend_uuid 对应的 mode、账号、轮次与最近一次问答（截断）。"""
+
+    backend_uuid: str
+    # 对话首轮的 backend_uuid，同一对话的各轮共享
+    thread_id: str
+    tool: str
+    mode: str
+    account: Optional[str]
+    turns: int
+    created_at: float
+    last_used_at: float
+    last_query: str
+    last_answer: str
+
+    def to_json(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class ThreadRegistry:
+    """
+    续问会话登记表：backend_uuid -> ThreadInfo，LRU 有界，可选持久化到 JSON 文件。
+
+    说明：
+    - 过期（超过 ttl_s 未使用）的条目不会立即删除，而是保留到被 LRU 淘汰，以便续问时直接拒绝而不必等上游失败
+    - 时间使用墙钟（time.time），持久化后跨进程重启仍然有效
+    - 是否过期只在 lookup() / recent() 读取时按传入的 ttl_s 判定；容量上限 max_entries 在 record() 写入时生效，超出即按 LRU 淘汰
+    - 持久化由后台线程完成：record() 只标记有变更，写线程等待 save_delay_s 合并这段时间内的变更后整表写出一次；
+      close() 停止写线程并写出尚未保存的变更
+    """
+
+    # 保存的回答预览长度上限（字符）；只用于列出会话，不参与续问
+    max_answer_chars: int = 1_000
+    # 首次变更后等待多久再写文件（秒），期间的变更合并为一次写入
+    save_delay_s: float = 1.0
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._entries: "OrderedDict[str, ThreadInfo]" = OrderedDict()
+        self._path: Optional[str] = None
+        self._pending = False
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def attach(self, path: Optional[str]) -> None:
+        """
+        设置持久化文件并载入其中的记录，并启动写线程；文件不存在或无法解析时从空表开始。
+        """
+        self.close()
+        with self._lock:
+            self._path = path
+        if not path:
+            return
+        self._thread = threading.Thread(target=self._run, name="mcp-thread-store", daemon=True)
+        self._thread.start()
+        try:
+            with open(path, encoding="utf-8") as f:
+                raw = loads(f.read())
+        except (OSError, ValueError):
+            return
+        items = raw.get("threads") if isinstance(raw, dict) else None
+        if not isinstance(items, list):
+            return
+        loaded = []
+        for item in items:
+            try:
+                loaded.append(ThreadInfo(**item))
+            except TypeError:
+                continue
+        with self._lock:
+            for info in sorted(loaded, key=lambda x: x.last_used_at):
+                self._entries[info.backend_uuid] = info
+                self._entries.move_to_end(info.backend_uuid)
+
+    def lookup(self, backend_uuid: str, *, ttl_s: float) -> Tuple[Optional[ThreadInfo], bool]:
+        """
+        返回（记录, 是否已过期）；未登记的 backend_uuid 返回 (None, False)。ttl_s 为 0 表示永不过期。
+        """
+        with self._lock:
+            info = self._entries.get(backend_uuid)
+            if info is None:
+                return None, False
+            self._entries.move_to_end(backend_uuid)
+        expired = ttl_s > 0 and time.time() - info.last_used_at > ttl_s
+        return info, expired
+
+    def record(
+        self,
+        backend_uuid: str,
+        *,
+        parent: Optional[str],
+        tool: str,
+        mode: str,
+        account: Optional[str],
+        query: str,
+        answer: str,
+        max_entries: int,
+    ) -> ThreadInfo:
+        """
+        登记一次成功的调用。parent 为本次续问所基于的 backend_uuid（新对话为 None）。
+        """
+        now = time.time()
+        answer = answer[: self.max_answer_chars]
+        with self._lock:
+            existing = self._entries.get(backend_uuid)
+            if existing is not None:
+                # 同一轮被多次登记（例如 single-flight 共享结果）：只刷新使用时间
+                info = replace(existing, last_used_at=now)
+            else:
+                base = self._entries.get(parent) if parent else None
+                info = ThreadInfo(
+                    backend_uuid=backend_uuid,
+                    thread_id=base.thread_id if base is not None else (parent or backend_uuid),
+                    tool=tool,
+                    mode=mode,
+                    account=account,
+                    turns=base.turns + 1 if base is not None else (2 if parent else 1),
+                    created_at=base.created_at if base is not None else now,
+                    last_used_at=now,
+                    last_query=query,
+                    last_answer=answer,
+                )
+            if parent and parent in self._entries:
+                self._entries[parent] = replace(self._entries[parent], last_used_at=now)
+            self._entries[backend_uuid] = info
+            self._entries.move_to_end(backend_uuid)
+            while len(self._entries) > max(1, max_entries):
+                self._entries.popitem(last=False)
+            if self._path is not None:
+                self._pending = True
+                self._wake.set()
+        return info
+
+    def recent(self, limit: int, *, ttl_s: float) -> List[Dict[str, Any]]:
+        """
+        最近使用的会话（每个对话只列出最新一轮），附带 expired 标记。
+        """
+        now = time.time()
+        with self._lock:
+            entries = list(reversed(self._entries.values()))
+        seen = set()
+        result: List[Dict[str, Any]] = []
+        for info in entries:
+            if info.thread_id in seen:
+                continue
+            seen.add(info.thread_id)
+            item = info.to_json()
+            item["expired"] = ttl_s > 0 and now - info.last_used_at > ttl_s
+            result.append(item)
+            if len(result) >= limit:
+                break
+        return result
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            # 合并 save_delay_s 内的后续变更；close() 会提前唤醒并自行写出剩余变更
+            if self._stop.wait(self.save_delay_s):
+                return
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """立即写出尚未保存的变更（测试与关闭时使用）。"""
+        with self._lock:
+            pending = self._pending
+            self._pending = False
+        if pending:
+            self._save()
+
+    def close(self) -> None:
+        """停止写线程并写出尚未保存的变更；之后可重新 attach()。"""
+        thread = self._thread
+        if thread is not None:
+            self._stop.set()
+            self._wake.set()
+            thread.join(5)
+            self._thread = None
+            self._stop.clear()
+            self._wake.clear()
+        self.flush()
+
+    def _save(self) -> None:
+        with self._lock:
+            path = self._path
+            data = {"version": 1, "threads": [info.to_json() for info in self._entries.values()]}
+        if not path:
+            return
+        # 写入串行化：先写临时文件再替换，读取方不会看到写了一半的内容
+        with self._save_lock:
+            tmp = f"{path}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(dumps(data))
+                os.replace(tmp, path)
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        self.close()
+        with self._lock:
+            self._entries.clear()
+            self._path = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -1,18 +1,47 @@
 from __future__ import annotations
 
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Any, Dict, List, Mapping, Optional, Tuple
 
+from .cache import ResponseCache
+from .codec import get_codec
 from .config import AppConfig
+from .context import RequestContext
+from .load import DEGRADED_MODES, LOAD
 from .perplexity_adapter import (
     PerplexityCallError,
+    PerplexityResult,
+    PerplexityThreadExpiredError,
     call_perplexity_search,
+    error_class,
     strip_thinking_tokens,
 )
+from .scheduler import LaneScheduler
+from .singleflight import SingleFlight
+from .store import AnswerStore, AnswerStoreError, StoredAnswer
+from .threads import ThreadRegistry
 
 
 JsonObject = Dict[str, Any]
 
+_CACHE_POLICIES = {"bypass", "refresh"}
+CHUNK_POLICIES = ("full", "trim", "summary", "none")
+
+# 重型工具（耗时以分钟计）走 heavy 通道，其余交互型工具走 light 通道
+HEAVY_TOOLS = {"perplexity_research", "perplexity_reason"}
+# 实际调用上游的工具（perplexity_batch 的子查询只能是这些工具之一）
+SEARCH_TOOLS = ("perplexity_ask", "perplexity_search", "perplexity_reason", "perplexity_research")
+# 允许对冲调用的交互型工具（仅新对话；是否启用由 PERPLEXITY_HEDGE 决定）
+HEDGED_TOOLS = {"perplexity_ask", "perplexity_search"}
+
+_RESPONSE_CACHE = ResponseCache()
+_SINGLE_FLIGHT = SingleFlight()
+THREADS = ThreadRegistry()
+ANSWERS = AnswerStore()
+_LANES: Optional[LaneScheduler] = None
+
 
 @dataclass(frozen=True)
 class ToolDef:
@@ -24,11 +53,34 @@ class ToolDef:
 
 
 def list_tools() -> List[JsonObject]:
-    usage_hint = "请避免频繁调用；尽量将多个子问题合并到一次 query / 一次 perplexity_search 中查清楚。"
+    usage_hint = (
+        "请避免频繁调用；尽量将多个子问题合并到一次 query / 一次 perplexity_search 中查清楚；"
+        "彼此独立、需要分别回答的多个问题可用 perplexity_batch 一次并行提交。"
+    )
     backend_uuid_desc = (
         "续问用的会话标识。通常应直接使用上一轮工具返回的 structuredContent.backend_uuid；"
         "若不提供则视为新对话。"
     )
+    cache_schema: JsonObject = {
+        "type": "string",
+        "enum": sorted(_CACHE_POLICIES),
+        "description": "可选：bypass 跳过缓存；refresh 忽略已有缓存并用最新结果覆盖。默认优先使用缓存。",
+    }
+    chunks_schema: JsonObject = {
+        "type": "string",
+        "enum": list(CHUNK_POLICIES),
+        "description": "可选：structuredContent.chunks 的返回方式。full 原样；trim 按条数/字节上限截断；"
+        "summary 只返回条数与字节数；none 不返回。默认由服务端配置决定。",
+    }
+    compact_schema: JsonObject = {
+        "type": "boolean",
+        "description": "可选：为 true 时 structuredContent 不再重复回答文本（回答只在 content[0].text 中）。",
+    }
+    degrade_schema: JsonObject = {
+        "type": "boolean",
+        "description": "可选：服务端过载时是否允许降级到更快的 mode（默认允许，仅在服务端开启降级时生效）。"
+        "实际使用的 mode 见 structuredContent.mode。",
+    }
     tools: List[ToolDef] = [
         ToolDef(
             name="perplexity_ask",
@@ -39,6 +91,10 @@ def list_tools() -> List[JsonObject]:
                 "properties": {
                     "query": {"type": "string"},
                     "backend_uuid": {"type": "string", "description": backend_uuid_desc},
+                    "cache": cache_schema,
+                    "chunks": chunks_schema,
+                    "compact": compact_schema,
+                    "degrade": degrade_schema,
                 },
                 "required": ["query"],
                 "additionalProperties": True,
@@ -54,6 +110,9 @@ def list_tools() -> List[JsonObject]:
                 "properties": {
                     "query": {"type": "string"},
                     "backend_uuid": {"type": "string", "description": backend_uuid_desc},
+                    "cache": cache_schema,
+                    "chunks": chunks_schema,
+                    "compact": compact_schema,
                     "strip_thinking": {"type": "boolean"},
                 },
                 "required": ["query"],
@@ -70,7 +129,11 @@ def list_tools() -> List[JsonObject]:
                 "properties": {
                     "query": {"type": "string"},
                     "backend_uuid": {"type": "string", "description": backend_uuid_desc},
+                    "cache": cache_schema,
+                    "chunks": chunks_schema,
+                    "compact": compact_schema,
                     "strip_thinking": {"type": "boolean"},
+                    "degrade": degrade_schema,
                 },
                 "required": ["query"],
                 "additionalProperties": True,
@@ -86,12 +149,80 @@ def list_tools() -> List[JsonObject]:
                 "properties": {
                     "query": {"type": "string"},
                     "backend_uuid": {"type": "string", "description": backend_uuid_desc},
+                    "cache": cache_schema,
+                    "chunks": chunks_schema,
+                    "compact": compact_schema,
+                    "degrade": degrade_schema,
                 },
                 "required": ["query"],
                 "additionalProperties": True,
             },
             annotations={"readOnlyHint": True, "openWorldHint": True},
         ),
+        ToolDef(
+            name="perplexity_batch",
+            title="Batch Queries",
+            description="一次提交多个彼此独立的查询，服务端并行调用上游，按顺序返回每个查询的结果、错误与耗时。"
+            "每项可指定 tool（默认 perplexity_search）与续问用的 backend_uuid。请避免频繁调用；一次批量中的每项都会消耗一次上游调用。",
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "items": {
+                        "type": "array",
+                        "minItems": 1,
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "query": {"type": "string"},
+                                "tool": {"type": "string", "enum": list(SEARCH_TOOLS)},
+                                "backend_uuid": {"type": "string", "description": backend_uuid_desc},
+                            },
+                            "required": ["query"],
+                        },
+                    },
+                    "cache": cache_schema,
+                    "chunks": chunks_schema,
+                    "compact": compact_schema,
+                    "degrade": degrade_schema,
+                },
+                "required": ["items"],
+                "additionalProperties": True,
+            },
+            annotations={"readOnlyHint": True, "openWorldHint": True},
+        ),
+        ToolDef(
+            name="perplexity_recall",
+            title="Recall Past Answers",
+            description="在本地答案库中全文检索以往的问答（毫秒级，不调用上游、不消耗额度）。"
+            "提问前可先用它查找近期是否已问过相同或相近的问题；需服务端配置 PERPLEXITY_STORE_PATH。"
+            "只读取本地数据（无需像其他工具那样避免频繁调用）。",
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "检索词，多个词以空格分隔（任一命中即可，按相关度排序）"},
+                    "limit": {"type": "integer", "minimum": 1, "maximum": 20, "description": "最多返回条数，默认 5"},
+                    "tool": {"type": "string", "enum": list(SEARCH_TOOLS), "description": "可选：只检索该工具的问答"},
+                    "max_age_days": {"type": "number", "minimum": 0, "description": "可选：只检索最近若干天内的问答"},
+                },
+                "required": ["query"],
+                "additionalProperties": True,
+            },
+            annotations={"readOnlyHint": True, "openWorldHint": False},
+        ),
+        ToolDef(
+            name="perplexity_threads",
+            title="Recent Threads",
+            description="列出本服务最近的对话（backend_uuid、mode、轮次、最近一次问答摘要），用于挑选要续问的会话。"
+            "只读取本地登记表，不调用上游（无需像其他工具那样避免频繁调用）。",
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "limit": {"type": "integer", "minimum": 1, "maximum": 100, "description": "最多返回的对话数，默认 20"},
+                },
+                "additionalProperties": True,
+            },
+            annotations={"readOnlyHint": True, "openWorldHint": False},
+        ),
     ]
 
     # MCP tools/list 期望字段为 inputSchema（驼峰），这里做一次格式化输出
@@ -110,6 +241,19 @@ def list_tools() -> List[JsonObject]:
     return result
 
 
+def tool_lane(name: str) -> str:
+    if name == "perplexity_batch":
+        # 批量工具本身只等待子查询，走独立的 batch 通道；子查询按各自工具占用 light / heavy 通道名额
+        return "batch"
+    return "heavy" if name in HEAVY_TOOLS else "light"
+
+
+def use_lane_scheduler(scheduler: Optional[LaneScheduler]) -> None:
+    """登记服务端的调度器，perplexity_batch 的子查询据此遵守各通道的并发上限；None 表示不限制。"""
+    global _LANES
+    _LANES = scheduler
+
+
 def _tool_result_text(text: str, *, structured: Optional[JsonObject] = None, is_error: bool = False) -> JsonObject:
     result: JsonObject = {"content": [{"type": "text", "text": text}]}
     if structured is not None:
@@ -137,6 +281,233 @@ def _read_optional_backend_uuid(arguments: Mapping[str, Any]) -> Tuple[Optional[
     return backend_uuid.strip(), None
 
 
+def _read_optional_cache_policy(arguments: Mapping[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    if "cache" not in arguments:
+        return None, None
+    policy = arguments.get("cache")
+    if policy not in _CACHE_POLICIES:
+        return None, "参数错误：cache 仅支持 \"bypass\" 或 \"refresh\"（可选）"
+    return policy, None
+
+
+def _read_optional_chunk_policy(arguments: Mapping[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    if "chunks" not in arguments:
+        return None, None
+    policy = arguments.get("chunks")
+    if policy not in CHUNK_POLICIES:
+        return None, "参数错误：chunks 仅支持 \"full\"、\"trim\"、\"summary\" 或 \"none\"（可选）"
+    return policy, None
+
+
+def _read_optional_compact(arguments: Mapping[str, Any]) -> Tuple[Optional[bool], Optional[str]]:
+    if "compact" not in arguments:
+        return None, None
+    compact = arguments.get("compact")
+    if not isinstance(compact, bool):
+        return None, "参数错误：compact 必须是布尔值（可选）"
+    return compact, None
+
+
+def _read_optional_degrade(arguments: Mapping[str, Any]) -> Tuple[Optional[bool], Optional[str]]:
+    if "degrade" not in arguments:
+        return None, None
+    degrade = arguments.get("degrade")
+    if not isinstance(degrade, bool):
+        return None, "参数错误：degrade 必须是布尔值（可选）"
+    return degrade, None
+
+
+def _shape_chunks(
+    chunks: List[Any], policy: str, *, max_count: int, max_bytes: int
+) -> Tuple[Optional[List[Any]], Optional[JsonObject], Optional[int]]:
+    """
+    按策略裁剪 chunks，返回（保留的 chunks, 摘要, 已测量的字节数）。
+
+    只有 trim / summary 需要逐条编码测量大小；full / none 不做额外序列化。
+    """
+    if policy == "full":
+        return chunks, None, None
+    if policy == "none":
+        return None, None, None
+    codec = get_codec()
+    if policy == "summary":
+        total = sum(len(codec.dumps_bytes(chunk)) for chunk in chunks)
+        return None, {"count": len(chunks), "bytes": total}, total
+    kept: List[Any] = []
+    used = 0
+    for chunk in chunks[:max_count]:
+        size = len(codec.dumps_bytes(chunk))
+        if used + size > max_bytes:
+            break
+        kept.append(chunk)
+        used += size
+    return kept, None, used
+
+
+def _tool_result(
+    config: AppConfig,
+    resp: PerplexityResult,
+    text: str,
+    *,
+    text_key: str,
+    chunk_policy: Optional[str],
+    compact: Optional[bool],
+    ctx: Optional[RequestContext],
+    mode: Optional[str] = None,
+    degraded_from: Optional[str] = None,
+) -> JsonObject:
+    """
+    组装 tools/call 结果：回答放在 content[0].text，structuredContent 按裁剪策略附带 chunks，并附带去重来源与 backend_uuid，
+    并给出实际使用的 mode（因过载降级时附带原 mode：degraded_from）。
+    """
+    policy = chunk_policy or config.response_chunks
+    compact = config.response_compact if compact is None else compact
+    structured: JsonObject = {} if compact else {text_key: text}
+    chunk_bytes: Optional[int] = None
+    if resp.chunks is not None:
+        kept, summary, chunk_bytes = _shape_chunks(
+            resp.chunks,
+            policy,
+            max_count=config.response_chunks_max,
+            max_bytes=config.response_chunks_max_bytes,
+        )
+        if kept is not None:
+            structured["chunks"] = kept
+            if len(kept) < len(resp.chunks):
+                structured["chunks_total"] = len(resp.chunks)
+        if summary is not None:
+            structured["chunks_summary"] = summary
+    if resp.sources:
+        structured["sources"] = resp.sources
+    if resp.backend_uuid:
+        structured["backend_uuid"] = resp.backend_uuid
+    if mode is not None:
+        structured["mode"] = mode
+    if degraded_from is not None:
+        structured["degraded_from"] = degraded_from
+    result = _tool_result_text(text, structured=structured)
+    if ctx is not None:
+        # 结果的实际字节数由写线程在写出时记录（mcp_message_bytes），这里不为统计再编码一次
+        if resp.chunks is not None:
+            ctx.stats["chunks"] = f"{len(structured.get('chunks') or [])}/{len(resp.chunks)}"
+        if chunk_bytes is not None:
+            ctx.stats["chunkBytes"] = chunk_bytes
+    return result
+
+
+def _cache_key(
+    tool_name: str,
+    *,
+    mode: str,
+    model: Optional[str],
+    query: str,
+    language: str,
+    sources: List[str],
+) -> Tuple[Any, ...]:
+    normalized_query = " ".join(query.split()).casefold()
+    return (tool_name, mode, model, normalized_query, language, tuple(sources))
+
+
+def _cached_search(
+    config: AppConfig,
+    tool_name: str,
+    *,
+    query: str,
+    mode: str,
+    model: Optional[str],
+    backend_uuid: Optional[str],
+    cache_policy: Optional[str],
+    ctx: Optional[RequestContext],
+    language: str = "en-US",
+    sources: Optional[List[str]] = None,
+    strip_thinking: bool = False,
+) -> PerplexityResult:
+    """
+    带缓存与 single-flight 合并的上游调用。续问（backend_uuid）依赖会话上下文，始终绕过两者。
+
+    strip_thinking 只影响流式进度通知；返回（与缓存）的回答保持原样，由调用方剥离。
+    """
+    sources = sources or ["web"]
+    if ctx is not None:
+        ctx.stats["mode"] = mode
+    ttl_s = config.cache_ttl_s_for_tool(tool_name)
+    cacheable = backend_uuid is None and ttl_s > 0 and config.cache_max_entries > 0 and cache_policy != "bypass"
+    key = _cache_key(tool_name, mode=mode, model=model, query=query, language=language, sources=sources)
+
+    if cacheable and cache_policy != "refresh":
+        cached = _RESPONSE_CACHE.get(key)
+        if cached is not None:
+            if ctx is not None:
+                ctx.stats["cache"] = "hit"
+            return cached
+
+    account: Optional[str] = None
+    if backend_uuid is not None and config.thread_max_entries > 0:
+        thread, expired = THREADS.lookup(backend_uuid, ttl_s=config.thread_ttl_s)
+        if expired:
+            raise PerplexityThreadExpiredError(
+                f"续问失败：会话 {backend_uuid} 已超过 {config.thread_ttl_s} 秒未使用，请不带 backend_uuid 发起新对话"
+            )
+        if thread is not None:
+            account = thread.account
+            if ctx is not None:
+                ctx.stats["threadTurn"] = thread.turns + 1
+
+    def upstream() -> PerplexityResult:
+        return call_perplexity_search(
+            config,
+            query=query,
+            mode=mode,
+            model=model,
+            sources=sources,
+            language=language,
+            backend_uuid=backend_uuid,
+            account=account,
+            hedge=tool_name in HEDGED_TOOLS,
+            strip_thinking=strip_thinking,
+            ctx=ctx,
+        )
+
+    if backend_uuid is None:
+        # 相同的新对话查询在途时共享同一次上游调用（与工具名无关，只看实际上游参数）
+        flight_key = key[1:]
+        resp, shared = _SINGLE_FLIGHT.do(flight_key, upstream, ctx=ctx)
+    else:
+        resp, shared = upstream(), False
+    if ctx is not None:
+        ctx.stats["cache"] = "miss" if cacheable else "bypass"
+        if shared:
+            ctx.stats["singleFlight"] = "shared"
+    if cacheable:
+        _RESPONSE_CACHE.put(key, resp, ttl_s=ttl_s, max_entries=config.cache_max_entries)
+    if not shared:
+        # single-flight 的跟随方与发起方拿到的是同一份结果，只由发起方写入答案库
+        ANSWERS.put(
+            StoredAnswer(
+                tool=tool_name,
+                mode=mode,
+                query=query,
+                answer=resp.answer,
+                backend_uuid=resp.backend_uuid,
+                search_sources=sources,
+                sources=resp.sources or (),
+                chunks=resp.chunks,
+            )
+        )
+    if resp.backend_uuid and config.thread_max_entries > 0:
+        THREADS.record(
+            resp.backend_uuid,
+            parent=backend_uuid,
+            tool=tool_name,
+            mode=mode,
+            account=resp.account,
+            query=query,
+            answer=resp.answer,
+            max_entries=config.thread_max_entries,
+        )
+    return resp
+
+
 def _cookies_provided(config: AppConfig) -> bool:
     cookies = getattr(config, "cookies", {})
     if not isinstance(cookies, Mapping):
@@ -164,13 +535,182 @@ def _resolve_effective_mode_model(config: AppConfig, tool_name: str) -> Tuple[st
     """
     has_cookies = _cookies_provided(config)
     mode = _default_mode_for_tool(tool_name, has_cookies=has_cookies)
-    model: Optional[str] = None
-    if has_cookies and mode == "pro":
-        model = "gpt-5.2"
-    return mode, model
+    return mode, _default_model_for_mode(mode, has_cookies=has_cookies)
+
+
+def _default_model_for_mode(mode: str, *, has_cookies: bool) -> Optional[str]:
+    return "gpt-5.2" if has_cookies and mode == "pro" else None
+
+
+def _maybe_degrade(
+    config: AppConfig, mode: str, model: Optional[str], *, allowed: bool, ctx: Optional[RequestContext]
+) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    服务端过载时把 mode 降级为更快的 mode（pro → auto、reasoning → pro），返回（mode, model, 原 mode）；
+    未降级时原 mode 为 None。续问与调用方传 degrade=false 的调用不降级。
+    """
+    target = DEGRADED_MODES.get(mode)
+    if not allowed or not config.degrade or target is None:
+        return mode, model, None
+    reason = LOAD.overload_reason(
+        mode,
+        queue_depth=config.degrade_queue_depth,
+        inflight=config.degrade_inflight,
+        latency_ms=config.degrade_latency_ms,
+    )
+    if reason is None:
+        return mode, model, None
+    if ctx is not None:
+        ctx.stats["degradedFrom"] = mode
+        ctx.stats["degradeReason"] = reason
+    return target, _default_model_for_mode(target, has_cookies=_cookies_provided(config)), mode
+
+
+def _list_threads(config: AppConfig, arguments: Mapping[str, Any]) -> JsonObject:
+    limit = arguments.get("limit", 20)
+    if not isinstance(limit, int) or isinstance(limit, bool) or not 1 <= limit <= 100:
+        return _tool_result_text("参数错误：limit 必须是 1~100 的整数（可选）", is_error=True)
+    threads = THREADS.recent(limit, ttl_s=config.thread_ttl_s)
+    if not threads:
+        return _tool_result_text("暂无记录的对话", structured={"threads": []})
+    lines = [
+        f"- {t['backend_uuid']}（{t['tool']} / {t['mode']}，第 {t['turns']} 轮{'，已过期' if t['expired'] else ''}）：{t['last_query']}"
+        for t in threads
+    ]
+    return _tool_result_text("\n".join(lines), structured={"threads": threads})
+
+
+def _recall(arguments: Mapping[str, Any]) -> JsonObject:
+    query, query_err = _read_required_query(arguments)
+    if query_err:
+        return _tool_result_text(query_err, is_error=True)
+    limit = arguments.get("limit", 5)
+    if not isinstance(limit, int) or isinstance(limit, bool) or not 1 <= limit <= 20:
+        return _tool_result_text("参数错误：limit 必须是 1~20 的整数（可选）", is_error=True)
+    tool = arguments.get("tool")
+    if tool is not None and tool not in SEARCH_TOOLS:
+        return _tool_result_text(f"参数错误：tool 仅支持 {', '.join(SEARCH_TOOLS)}（可选）", is_error=True)
+    max_age_days = arguments.get("max_age_days")
+    if max_age_days is not None and (
+        not isinstance(max_age_days, (int, float)) or isinstance(max_age_days, bool) or max_age_days < 0
+    ):
+        return _tool_result_text("参数错误：max_age_days 必须是非负数（可选）", is_error=True)
+    try:
+        matches = ANSWERS.search(
+            query or "",
+            limit=limit,
+            tool=tool,
+            max_age_s=max_age_days * 86_400 if max_age_days is not None else None,
+        )
+    except AnswerStoreError:
+        return _tool_result_text("未启用本地答案库：请在服务端配置 PERPLEXITY_STORE_PATH", is_error=True)
+    if not matches:
+        return _tool_result_text("本地答案库中没有匹配的问答", structured={"matches": []})
+    sections = [f"## {m['query']}（{m['tool']} / {m['mode']}）\n\n{m['answer']}" for m in matches]
+    return _tool_result_text("\n\n".join(sections), structured={"matches": matches})
+
+
+def _read_batch_items(config: AppConfig, arguments: Mapping[str, Any]) -> Tuple[List[JsonObject], Optional[str]]:
+    items = arguments.get("items")
+    if not isinstance(items, list) or not items:
+        return [], "参数错误：items 必须是非空数组"
+    if len(items) > config.batch_tool_max_items:
+        return [], f"参数错误：items 最多 {config.batch_tool_max_items} 项"
+    parsed: List[JsonObject] = []
+    for idx, item in enumerate(items):
+        if not isinstance(item, dict):
+            return [], f"参数错误：items[{idx}] 必须是对象"
+        tool = item.get("tool", "perplexity_search")
+        if tool not in SEARCH_TOOLS:
+            return [], f"参数错误：items[{idx}].tool 仅支持 {', '.join(SEARCH_TOOLS)}"
+        parsed.append({**item, "tool": tool})
+    return parsed, None
+
+
+def _run_batch(config: AppConfig, arguments: Mapping[str, Any], ctx: Optional[RequestContext]) -> JsonObject:
+    """
+    并行执行 perplexity_batch 的子查询：每项走与单独调用相同的缓存 / single-flight / 限流 / 账号池路径。
+
+    子查询共享本次调用的取消信号，各自的超时取该工具的超时与本次调用剩余时间中较小者；
+    执行前占用子查询工具所在通道的名额（与调度器排队的调用共用上限），单项失败只体现在该项结果中。
+    """
+    items, items_err = _read_batch_items(config, arguments)
+    if items_err:
+        return _tool_result_text(items_err, is_error=True)
+    shared = {key: arguments[key] for key in ("cache", "chunks", "compact", "degrade", "strip_thinking") if key in arguments}
+    lanes = _LANES
+
+    def run_item(index: int, item: JsonObject) -> JsonObject:
+        tool = item["tool"]
+        timeout_ms = config.timeout_ms_for_tool(tool)
+        remaining = ctx.remaining_s() if ctx is not None else None
+        if remaining is not None:
+            timeout_ms = min(timeout_ms, max(1, int(remaining * 1000)))
+        child = RequestContext(
+            request_id=f"{ctx.request_id}#{index}" if ctx is not None else None,
+            timeout_ms=timeout_ms,
+        )
+        if ctx is not None:
+            ctx.on_cancel(child.cancel)
+        if lanes is not None:
+            child.on_cancel(lanes.wake)
+        item_args = {**shared, **{k: v for k, v in item.items() if k != "tool"}}
+        lane = tool_lane(tool)
+        started = time.monotonic()
+        try:
+            if lanes is not None and not lanes.acquire(
+                lane, timeout_s=child.remaining_s(), cancelled=lambda: child.cancelled
+            ):
+                result = _tool_result_text(
+                    "已取消" if child.cancelled else f"等待 {lane} 通道空闲超时（超过 {timeout_ms} ms）", is_error=True
+                )
+            else:
+                try:
+                    result = call_tool(config, tool, item_args, child)
+                finally:
+                    if lanes is not None:
+                        lanes.release(lane)
+        except Exception as exc:  # noqa: BLE001
+            result = _tool_result_text(f"Internal error: {exc}", is_error=True)
+        finally:
+            if ctx is not None:
+                ctx.remove_cancel_callback(child.cancel)
+        entry: JsonObject = {
+            "index": index,
+            "tool": tool,
+            "query": item.get("query"),
+            "ok": not result.get("isError"),
+            "durationMs": int((time.monotonic() - started) * 1000),
+        }
+        if result.get("isError"):
+            entry["error"] = result["content"][0]["text"]
+        else:
+            entry["text"] = result["content"][0]["text"]
+            entry["result"] = result.get("structuredContent", {})
+        return entry
 
+    workers = min(len(items), config.batch_tool_concurrency)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mcp-batch") as pool:
+        entries = list(pool.map(run_item, range(len(items)), items))
 
-def call_tool(config: AppConfig, name: str, arguments: Mapping[str, Any]) -> JsonObject:
+    failed = sum(1 for e in entries if not e["ok"])
+    if ctx is not None:
+        ctx.stats["batchItems"] = len(entries)
+        ctx.stats["batchFailed"] = failed
+    sections = [
+        f"## [{e['index'] + 1}] {e['query']}\n\n" + (e["text"] if e["ok"] else f"（失败）{e['error']}") for e in entries
+    ]
+    structured = {"results": entries, "succeeded": len(entries) - failed, "failed": failed}
+    # 全部失败才视为工具级错误；部分失败由各项的 ok / error 表达
+    return _tool_result_text("\n\n".join(sections), structured=structured, is_error=failed == len(entries))
+
+
+def call_tool(
+    config: AppConfig,
+    name: str,
+    arguments: Mapping[str, Any],
+    ctx: Optional[RequestContext] = None,
+) -> JsonObject:
     try:
         if "messages" in arguments:
             return _tool_result_text("参数错误：已不再支持 messages，请改用 query 字符串入参", is_error=True)
@@ -179,91 +719,146 @@ def call_tool(config: AppConfig, name: str, arguments: Mapping[str, Any]) -> Jso
         if "model" in arguments:
             return _tool_result_text("参数错误：已禁用 model 入参，请移除该字段并使用默认策略", is_error=True)
 
+        if name == "perplexity_threads":
+            return _list_threads(config, arguments)
+        if name == "perplexity_batch":
+            return _run_batch(config, arguments, ctx)
+        if name == "perplexity_recall":
+            return _recall(arguments)
+
         effective_mode, effective_model = _resolve_effective_mode_model(config, name)
         backend_uuid, backend_uuid_err = _read_optional_backend_uuid(arguments)
         if backend_uuid_err:
             return _tool_result_text(backend_uuid_err, is_error=True)
+        cache_policy, cache_policy_err = _read_optional_cache_policy(arguments)
+        if cache_policy_err:
+            return _tool_result_text(cache_policy_err, is_error=True)
+
+        chunk_policy, chunk_policy_err = _read_optional_chunk_policy(arguments)
+        if chunk_policy_err:
+            return _tool_result_text(chunk_policy_err, is_error=True)
+        compact, compact_err = _read_optional_compact(arguments)
+        if compact_err:
+            return _tool_result_text(compact_err, is_error=True)
+        degrade, degrade_err = _read_optional_degrade(arguments)
+        if degrade_err:
+            return _tool_result_text(degrade_err, is_error=True)
+        effective_mode, effective_model, degraded_from = _maybe_degrade(
+            config, effective_mode, effective_model, allowed=degrade is not False and backend_uuid is None, ctx=ctx
+        )
 
         if name == "perplexity_ask":
             query, query_err = _read_required_query(arguments)
             if query_err:
                 return _tool_result_text(query_err, is_error=True)
-            resp = call_perplexity_search(
+            resp = _cached_search(
                 config,
+                name,
                 query=query or "",
                 mode=effective_mode or "auto",
                 model=effective_model,
-                sources=["web"],
                 backend_uuid=backend_uuid,
+                cache_policy=cache_policy,
+                ctx=ctx,
+            )
+            return _tool_result(
+                config,
+                resp,
+                resp.answer,
+                text_key="response",
+                chunk_policy=chunk_policy,
+                compact=compact,
+                mode=effective_mode,
+                degraded_from=degraded_from,
+                ctx=ctx,
             )
-            structured: JsonObject = {"response": resp.answer}
-            if resp.chunks is not None:
-                structured["chunks"] = resp.chunks
-            if resp.backend_uuid:
-                structured["backend_uuid"] = resp.backend_uuid
-            return _tool_result_text(resp.answer, structured=structured)
 
         if name == "perplexity_research":
             strip = bool(arguments.get("strip_thinking", False))
             query, query_err = _read_required_query(arguments)
             if query_err:
                 return _tool_result_text(query_err, is_error=True)
-            resp = call_perplexity_search(
+            resp = _cached_search(
                 config,
+                name,
                 query=query or "",
                 mode=effective_mode or "deep research",
                 model=effective_model,
-                sources=["web"],
                 backend_uuid=backend_uuid,
+                cache_policy=cache_policy,
+                strip_thinking=strip,
+                ctx=ctx,
             )
             text = strip_thinking_tokens(resp.answer) if strip else resp.answer
-            structured: JsonObject = {"response": text}
-            if resp.chunks is not None:
-                structured["chunks"] = resp.chunks
-            if resp.backend_uuid:
-                structured["backend_uuid"] = resp.backend_uuid
-            return _tool_result_text(text, structured=structured)
+            return _tool_result(
+                config,
+                resp,
+                text,
+                text_key="response",
+                chunk_policy=chunk_policy,
+                compact=compact,
+                mode=effective_mode,
+                degraded_from=degraded_from,
+                ctx=ctx,
+            )
 
         if name == "perplexity_reason":
             strip = bool(arguments.get("strip_thinking", False))
             query, query_err = _read_required_query(arguments)
             if query_err:
                 return _tool_result_text(query_err, is_error=True)
-            resp = call_perplexity_search(
+            resp = _cached_search(
                 config,
+                name,
                 query=query or "",
                 mode=effective_mode or "reasoning",
                 model=effective_model,
-                sources=["web"],
                 backend_uuid=backend_uuid,
+                cache_policy=cache_policy,
+                strip_thinking=strip,
+                ctx=ctx,
             )
             text = strip_thinking_tokens(resp.answer) if strip else resp.answer
-            structured = {"response": text}
-            if resp.chunks is not None:
-                structured["chunks"] = resp.chunks
-            if resp.backend_uuid:
-                structured["backend_uuid"] = resp.backend_uuid
-            return _tool_result_text(text, structured=structured)
+            return _tool_result(
+                config,
+                resp,
+                text,
+                text_key="response",
+                chunk_policy=chunk_policy,
+                compact=compact,
+                mode=effective_mode,
+                degraded_from=degraded_from,
+                ctx=ctx,
+            )
 
         if name == "perplexity_search":
             query, query_err = _read_required_query(arguments)
             if query_err:
                 return _tool_result_text(query_err, is_error=True)
-            resp = call_perplexity_search(
+            resp = _cached_search(
                 config,
+                name,
                 query=query or "",
                 mode=effective_mode or "auto",
                 model=effective_model,
-                sources=["web"],
                 backend_uuid=backend_uuid,
+                cache_policy=cache_policy,
+                ctx=ctx,
+            )
+            return _tool_result(
+                config,
+                resp,
+                resp.answer,
+                text_key="results",
+                chunk_policy=chunk_policy,
+                compact=compact,
+                mode=effective_mode,
+                degraded_from=degraded_from,
+                ctx=ctx,
             )
-            structured = {"results": resp.answer}
-            if resp.chunks is not None:
-                structured["chunks"] = resp.chunks
-            if resp.backend_uuid:
-                structured["backend_uuid"] = resp.backend_uuid
-            return _tool_result_text(resp.answer, structured=structured)
 
         return _tool_result_text(f"工具不存在：{name}", is_error=True)
     except PerplexityCallError as exc:
+        if ctx is not None:
+            ctx.stats["errorClass"] = error_class(exc)
         return _tool_result_text(str(exc), is_error=True)
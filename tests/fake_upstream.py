@@ -0,0 +1,71 @@
+"""测试共用的假上游：替换 tools.call_perplexity_search，不发真实请求。"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from perplexity_unofficial_mcp import tools as tools_mod
+from perplexity_unofficial_mcp.perplexity_adapter import PerplexityResult
+
+
+def fake_upstream(
+    *,
+    slow_prefix: Optional[str] = None,
+    delay_s: float = 0.5,
+    fail_query: Optional[str] = None,
+    error: Optional[Exception] = None,
+    progress: bool = False,
+    chunks: Optional[Sequence[Dict[str, Any]]] = None,
+    backend_uuid: Optional[str] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    calls: Optional[List[Dict[str, Any]]] = None,
+) -> Callable[..., PerplexityResult]:
+    """构造与 call_perplexity_search 同签名的假实现。
+
+    - slow_prefix：query 以此开头时先休眠 delay_s 秒
+    - fail_query / error：query 等于 fail_query 时抛出 error
+    - progress：调用方请求进度时先上报一次 "partial"
+    - chunks：随结果返回的检索片段（每次调用复制一份）
+    - backend_uuid：固定的 backend_uuid；缺省为 "uuid-<query>"
+    - stats：写入 ctx.stats 的附加统计
+    - calls：按调用顺序追加 {"query", "mode", "model", "backend_uuid"}（线程安全）
+    """
+    lock = threading.Lock()
+
+    def _call(config, *, query, mode, ctx=None, **kwargs):  # type: ignore[no-untyped-def]
+        if calls is not None:
+            with lock:
+                calls.append(
+                    {"query": query, "mode": mode, "model": kwargs.get("model"), "backend_uuid": kwargs.get("backend_uuid")}
+                )
+        if fail_query is not None and query == fail_query:
+            raise error if error is not None else RuntimeError("fake upstream failure")
+        if slow_prefix is not None and query.startswith(slow_prefix):
+            time.sleep(delay_s)
+        if ctx is not None:
+            if progress and ctx.wants_progress:
+                ctx.report_progress(1, message="partial")
+            if stats:
+                ctx.stats.update(stats)
+        result_chunks: List[Dict[str, Any]] = list(chunks) if chunks is not None else []
+        return PerplexityResult(
+            answer="answer: " + query,
+            raw={},
+            chunks=result_chunks,
+            backend_uuid=backend_uuid if backend_uuid is not None else "uuid-" + query,
+        )
+
+    return _call
+
+
+def patch_upstream(test: Any, **options: Any) -> None:
+    """在当前用例内用 fake_upstream(**options) 替换上游调用，并清空响应缓存；用例结束后自动还原。"""
+    tools_mod._RESPONSE_CACHE.clear()
+    patcher = mock.patch.object(tools_mod, "call_perplexity_search", fake_upstream(**options))
+    patcher.start()
+    test.addCleanup(patcher.stop)
@@ -0,0 +1,124 @@
+import sys
+import types
+from dataclasses import replace
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import unittest
+
+from perplexity_unofficial_mcp import perplexity_adapter as adapter_mod
+from perplexity_unofficial_mcp.accounts import AccountPool, AccountUnavailableError
+from perplexity_unofficial_mcp.config import AccountConfig, AppConfig
+from perplexity_unofficial_mcp.context import RequestContext
+from perplexity_unofficial_mcp.perplexity_adapter import PerplexityCallError, call_perplexity_search
+
+
+def _account(name: str, max_concurrency: int = 2) -> AccountConfig:
+    return AccountConfig(
+        name=name,
+        cookies={"next-auth.csrf-token": f"csrf-{name}", "next-auth.session-token": f"session-{name}"},
+        max_concurrency=max_concurrency,
+    )
+
+
+class TestAccountPool(unittest.TestCase):
+    def test_least_loaded_account_is_selected(self) -> None:
+        pool = AccountPool()
+        accounts = [_account("a"), _account("b")]
+        first = pool.acquire(accounts)
+        second = pool.acquire(accounts)
+        self.assertNotEqual(first.account.name, second.account.name)
+        pool.release(first)
+        third = pool.acquire(accounts)
+        self.assertEqual(third.account.name, first.account.name)
+
+    def test_concurrency_limit_blocks_until_deadline(self) -> None:
+        pool = AccountPool()
+        accounts = [_account("a", max_concurrency=1)]
+        pool.acquire(accounts)
+        with self.assertRaises(AccountUnavailableError):
+            pool.acquire(accounts, ctx=RequestContext(timeout_ms=100))
+
+    def test_rate_limited_account_cools_down(self) -> None:
+        pool = AccountPool()
+        accounts = [_account("a"), _account("b")]
+        lease = pool.acquire(accounts)
+        pool.release(lease, failure_kind="rate_limited", cooldown_s=60)
+        for _ in range(3):
+            other = pool.acquire(accounts)
+            self.assertNotEqual(other.account.name, lease.account.name)
+            pool.release(other)
+
+    def test_all_cooling_falls_back_to_earliest(self) -> None:
+        pool = AccountPool()
+        accounts = [_account("a")]
+        lease = pool.acquire(accounts)
+        pool.release(lease, failure_kind="auth", cooldown_s=60)
+        self.assertEqual(pool.acquire(accounts).account.name, "a")
+
+    def test_follow_up_is_sticky(self) -> None:
+        pool = AccountPool()
+        accounts = [_account("a"), _account("b")]
+        pool.bind_thread("thread-1", "b")
+        for _ in range(3):
+            lease = pool.acquire(accounts, backend_uuid="thread-1")
+            self.assertEqual(lease.account.name, "b")
+            pool.release(lease)
+
+
+class TestAdapterAccounts(unittest.TestCase):
+    def setUp(self) -> None:
+        self._original = sys.modules.get("perplexity")
+        adapter_mod._CLIENT_POOL.clear()
+        adapter_mod._ACCOUNT_POOL.clear()
+        self.used = []
+        used = self.used
+
+        class FakeClient:
+            def __init__(self, cookies):  # type: ignore[no-untyped-def]
+                self.cookies = cookies
+
+            def search(self, query, follow_up=None, **kwargs):  # type: ignore[no-untyped-def]
+                used.append(self.cookies["next-auth.session-token"])
+                if query == "limited":
+                    raise RuntimeError("HTTP 429 Too Many Requests")
+                return {"answer": "ok", "backend_uuid": f"uuid-{len(used)}"}
+
+        sys.modules["perplexity"] = types.SimpleNamespace(Client=FakeClient)  # type: ignore[assignment]
+        self.cfg = AppConfig(
+            cookies=_account("a").cookies,
+            timeout_ms=300_000,
+            accounts=(_account("a"), _account("b")),
+        )
+
+    def tearDown(self) -> None:
+        if self._original is None:
+            sys.modules.pop("perplexity", None)
+        else:
+            sys.modules["perplexity"] = self._original
+        adapter_mod._CLIENT_POOL.clear()
+        adapter_mod._ACCOUNT_POOL.clear()
+
+    def test_follow_up_goes_back_to_creating_account(self) -> None:
+        res = call_perplexity_search(self.cfg, query="hi", mode="auto")
+        for _ in range(3):
+            follow = call_perplexity_search(self.cfg, query="more", mode="auto", backend_uuid=res.backend_uuid)
+            self.assertEqual(follow.account, res.account)
+        self.assertEqual(len(set(self.used)), 1)
+
+    def test_rate_limited_account_is_skipped(self) -> None:
+        # 不重试：只观察冷却后的选号
+        cfg = replace(self.cfg, retry_max=0)
+        with self.assertRaises(PerplexityCallError):
+            call_perplexity_search(cfg, query="limited", mode="auto")
+        limited = self.used[0]
+        for _ in range(3):
+            call_perplexity_search(self.cfg, query="hi", mode="auto")
+        self.assertNotIn(limited, self.used[1:])
+        snapshot = adapter_mod._ACCOUNT_POOL.snapshot()
+        self.assertTrue(all(s["inflight"] == 0 for s in snapshot.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import threading
+import time
+import unittest
+
+from perplexity_unofficial_mcp.config import AppConfig
+from perplexity_unofficial_mcp.jsonrpc import safe_load_json_line, safe_parse_json_line
+from perplexity_unofficial_mcp.server import McpServer, ServerState
+
+from fake_upstream import patch_upstream
+
+
+def _call(id_, query):  # type: ignore[no-untyped-def]
+    return {
+        "jsonrpc": "2.0",
+        "id": id_,
+        "method": "tools/call",
+        "params": {"name": "perplexity_search", "arguments": {"query": query}},
+    }
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self) -> None:
+        patch_upstream(self, slow_prefix="slow", delay_s=0.5)
+        self.server = McpServer(
+            AppConfig(
+                cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"},
+                timeout_ms=5_000,
+            )
+        )
+        self.state = ServerState(initialized=True)
+
+    def tearDown(self) -> None:
+        self.server.shutdown(wait=True)
+
+    def _dispatch(self, message, *, stream_batch=False):  # type: ignore[no-untyped-def]
+        written = []
+        finished = threading.Event()
+        self.server.handle_message(
+            self.state, message, respond=written.append, done=finished.set, stream_batch=stream_batch
+        )
+        self.assertTrue(finished.wait(5))
+        return written
+
+    def test_batch_line_is_parsed_as_array(self) -> None:
+        message, err = safe_load_json_line('[{"jsonrpc": "2.0", "id": 1, "method": "ping"}]')
+        self.assertIsNone(err)
+        self.assertIsInstance(message, list)
+        # 单条解析接口保持原语义：数组不是合法的单个请求
+        req, err = safe_parse_json_line("[]")
+        self.assertIsNone(req)
+        self.assertEqual(err["error"]["code"], -32600)
+
+    def test_batch_members_run_concurrently_and_respond_once(self) -> None:
+        started = time.time()
+        written = self._dispatch(
+            [
+                _call(1, "slow one"),
+                {"jsonrpc": "2.0", "method": "notifications/initialized"},
+                _call(2, "slow two"),
+                {"jsonrpc": "2.0", "id": 3, "method": "ping"},
+                {"jsonrpc": "2.0", "id": 4},
+            ]
+        )
+        elapsed = time.time() - started
+
+        self.assertEqual(len(written), 1)
+        responses = written[0]
+        self.assertEqual([r["id"] for r in responses], [1, 2, 3, 4])
+        self.assertEqual(responses[1]["result"]["structuredContent"]["results"], "answer: slow two")
+        self.assertEqual(responses[3]["error"]["code"], -32600)
+        self.assertLess(elapsed, 0.95)
+
+    def test_empty_batch_is_invalid_request(self) -> None:
+        written = self._dispatch([])
+        self.assertEqual(len(written), 1)
+        self.assertEqual(written[0]["error"]["code"], -32600)
+
+    def test_notification_only_batch_has_no_response(self) -> None:
+        written = self._dispatch([{"jsonrpc": "2.0", "method": "notifications/initialized"}])
+        self.assertEqual(written, [])
+
+    def test_stream_batch_writes_each_member(self) -> None:
+        written = self._dispatch([_call(1, "slow one"), {"jsonrpc": "2.0", "id": 2, "method": "ping"}], stream_batch=True)
+        self.assertEqual([msg["id"] for msg in written], [2, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
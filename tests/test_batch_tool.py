@@ -0,0 +1,170 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import threading
+import time
+import unittest
+from dataclasses import replace
+
+from perplexity_unofficial_mcp import tools as tools_mod
+from perplexity_unofficial_mcp.config import AppConfig
+from perplexity_unofficial_mcp.context import RequestContext
+from perplexity_unofficial_mcp.perplexity_adapter import PerplexityCallError, PerplexityResult
+from perplexity_unofficial_mcp.scheduler import LaneScheduler
+
+from fake_upstream import patch_upstream
+
+
+class TestBatchTool(unittest.TestCase):
+    def setUp(self) -> None:
+        self.calls = []
+        self.lock = threading.Lock()
+        patch_upstream(
+            self,
+            slow_prefix="slow",
+            delay_s=0.3,
+            fail_query="boom",
+            error=PerplexityCallError("Perplexity 调用失败：boom"),
+            calls=self.calls,
+        )
+        self.config = AppConfig(
+            cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"},
+            timeout_ms=5_000,
+        )
+
+    def test_items_run_in_parallel_and_keep_order(self) -> None:
+        items = [{"query": f"slow {i}"} for i in range(4)]
+        ctx = RequestContext(request_id=1, timeout_ms=5_000)
+        started = time.monotonic()
+        res = tools_mod.call_tool(self.config, "perplexity_batch", {"items": items}, ctx)
+        elapsed = time.monotonic() - started
+        self.assertLess(elapsed, 0.9)
+        results = res["structuredContent"]["results"]
+        self.assertEqual([r["query"] for r in results], [f"slow {i}" for i in range(4)])
+        self.assertTrue(all(r["ok"] for r in results))
+        self.assertEqual(results[0]["result"]["results"], "answer: slow 0")
+        self.assertEqual(ctx.stats["batchItems"], 4)
+
+    def test_per_item_tool_backend_uuid_and_errors(self) -> None:
+        res = tools_mod.call_tool(
+            self.config,
+            "perplexity_batch",
+            {
+                "items": [
+                    {"query": "a", "tool": "perplexity_reason"},
+                    {"query": "b", "backend_uuid": "prev"},
+                    {"query": "boom"},
+                ]
+            },
+        )
+        self.assertFalse(res.get("isError"))
+        structured = res["structuredContent"]
+        self.assertEqual((structured["succeeded"], structured["failed"]), (2, 1))
+        self.assertIn("boom", structured["results"][2]["error"])
+        by_query = {c["query"]: c for c in self.calls}
+        self.assertEqual(by_query["a"]["mode"], "reasoning")
+        self.assertEqual(by_query["b"]["backend_uuid"], "prev")
+
+    def test_all_failed_is_tool_error(self) -> None:
+        res = tools_mod.call_tool(self.config, "perplexity_batch", {"items": [{"query": "boom"}]})
+        self.assertTrue(res["isError"])
+
+    def test_validation(self) -> None:
+        for args in (
+            {"items": []},
+            {"items": [{"query": "q", "tool": "perplexity_batch"}]},
+            {"items": [{"query": str(i)} for i in range(11)]},
+            {"items": ["q"]},
+        ):
+            res = tools_mod.call_tool(self.config, "perplexity_batch", args)
+            self.assertTrue(res["isError"], args)
+        self.assertEqual(self.calls, [])
+
+    def test_items_inherit_deadline_and_cancellation(self) -> None:
+        ctx = RequestContext(request_id=1, timeout_ms=5_000)
+        seen = []
+
+        def fake_call(config, *, query, mode, ctx=None, **kwargs):  # type: ignore[no-untyped-def]
+            seen.append(ctx)
+            cancelled = threading.Event()
+            ctx.on_cancel(cancelled.set)
+            cancelled.wait(2)
+            return PerplexityResult(answer="cancelled" if ctx.cancelled else "ok", raw={})
+
+        tools_mod.call_perplexity_search = fake_call  # type: ignore[assignment]
+        threading.Timer(0.1, ctx.cancel).start()
+        res = tools_mod.call_tool(self.config, "perplexity_batch", {"items": [{"query": "x"}]}, ctx)
+        child = seen[0]
+        self.assertIsNot(child, ctx)
+        self.assertLessEqual(child.timeout_ms, 5_000)
+        self.assertTrue(child.cancelled)
+        self.assertEqual(res["structuredContent"]["results"][0]["text"], "cancelled")
+
+    def test_item_timeout_is_bounded_by_tool_timeout(self) -> None:
+        config = replace(self.config, timeout_ms=60_000, tool_timeouts_ms={"perplexity_search": 1_000})
+        seen = {}
+
+        def fake_call(config, *, query, mode, ctx=None, **kwargs):  # type: ignore[no-untyped-def]
+            seen[query] = ctx.timeout_ms
+            return PerplexityResult(answer="ok", raw={})
+
+        tools_mod.call_perplexity_search = fake_call  # type: ignore[assignment]
+        ctx = RequestContext(request_id=1, timeout_ms=30_000)
+        items = [{"query": "s", "tool": "perplexity_search"}, {"query": "a", "tool": "perplexity_ask"}]
+        tools_mod.call_tool(config, "perplexity_batch", {"items": items}, ctx)
+        self.assertEqual(seen["s"], 1_000)
+        self.assertGreater(seen["a"], 1_000)
+        self.assertLessEqual(seen["a"], 30_000)
+
+    def test_heavy_items_respect_heavy_lane_cap(self) -> None:
+        scheduler = LaneScheduler(workers=1, lane_caps={"light": 4, "heavy": 2}, priority=["light", "heavy"])
+        tools_mod.use_lane_scheduler(scheduler)
+        running = 0
+        peak = 0
+
+        def fake_call(config, *, query, mode, ctx=None, **kwargs):  # type: ignore[no-untyped-def]
+            nonlocal running, peak
+            with self.lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.1)
+            with self.lock:
+                running -= 1
+            return PerplexityResult(answer="ok", raw={})
+
+        tools_mod.call_perplexity_search = fake_call  # type: ignore[assignment]
+        config = replace(self.config, batch_tool_concurrency=6)
+        items = [{"query": f"r{i}", "tool": "perplexity_reason"} for i in range(6)]
+        try:
+            res = tools_mod.call_tool(config, "perplexity_batch", {"items": items}, RequestContext(timeout_ms=5_000))
+        finally:
+            tools_mod.use_lane_scheduler(None)
+            scheduler.shutdown()
+        self.assertEqual(res["structuredContent"]["succeeded"], 6)
+        self.assertEqual(peak, 2)
+        self.assertEqual(scheduler.snapshot()["heavy"]["running"], 0)
+
+    def test_waiting_for_lane_slot_times_out(self) -> None:
+        scheduler = LaneScheduler(workers=1, lane_caps={"light": 1, "heavy": 1}, priority=["light", "heavy"])
+        tools_mod.use_lane_scheduler(scheduler)
+        self.assertTrue(scheduler.acquire("heavy"))
+        try:
+            res = tools_mod.call_tool(
+                self.config,
+                "perplexity_batch",
+                {"items": [{"query": "r", "tool": "perplexity_reason"}]},
+                RequestContext(timeout_ms=200),
+            )
+        finally:
+            scheduler.release("heavy")
+            tools_mod.use_lane_scheduler(None)
+            scheduler.shutdown()
+        self.assertTrue(res["isError"])
+        self.assertIn("heavy", res["structuredContent"]["results"][0]["error"])
+        self.assertEqual(self.calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import unittest
+
+from benchmarks import sources_bench
+from benchmarks.stdio_bench import format_table, percentile, run_level
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_percentile(self) -> None:
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_run_level_against_fake_sdk(self) -> None:
+        profile = {
+            "seed": 7,
+            "modes": {"*": {"median_ms": 0, "answer_bytes": 500, "chunks": 2, "error_rate": 0.0}},
+        }
+        row = run_level(profile=profile, tool="perplexity_search", concurrency=2, requests=10)
+        self.assertEqual(row["requests"], 10)
+        self.assertEqual(row["errors"], 0)
+        self.assertGreater(row["rps"], 0)
+        self.assertGreater(row["avg_response_bytes"], 500)
+        self.assertIsNotNone(row["server_serialize_p99_ms"])
+        self.assertIn("req/s", format_table([row]))
+
+    def test_error_rate_is_reported(self) -> None:
+        profile = {"seed": 7, "modes": {"*": {"median_ms": 0, "error_rate": 1.0}}}
+        row = run_level(profile=profile, tool="perplexity_ask", concurrency=1, requests=3)
+        self.assertEqual(row["errors"], 3)
+
+    def test_sources_bench(self) -> None:
+        row = sources_bench.run(steps=3, results=30, chunks=40, answer_bytes=1_000, max_sources=100, iterations=2)
+        self.assertEqual(row["sources"], 30)
+        self.assertGreater(row["payload_bytes"], row["output_bytes"])
+        self.assertIn("p99 ms", sources_bench.format_table([row]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import unittest
+
+from perplexity_unofficial_mcp import tools as tools_mod
+from perplexity_unofficial_mcp.cache import ResponseCache
+from perplexity_unofficial_mcp.config import AppConfig
+from perplexity_unofficial_mcp.perplexity_adapter import PerplexityResult
+
+
+class TestResponseCache(unittest.TestCase):
+    def test_entries_expire_after_ttl(self) -> None:
+        cache = ResponseCache()
+        cache.put("k", "v", ttl_s=0.05, max_entries=10)
+        self.assertEqual(cache.get("k"), "v")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("k"))
+
+    def test_least_recently_used_entry_is_evicted(self) -> None:
+        cache = ResponseCache()
+        cache.put("a", 1, ttl_s=60, max_entries=2)
+        cache.put("b", 2, ttl_s=60, max_entries=2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3, ttl_s=60, max_entries=2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+
+
+class TestToolCache(unittest.TestCase):
+    def setUp(self) -> None:
+        tools_mod._RESPONSE_CACHE.clear()
+        self.calls = []
+
+        def fake_call(config, *, query, mode, sources=None, model=None, **kwargs):  # type: ignore[no-untyped-def]
+            self.calls.append({"query": query, "backend_uuid": kwargs.get("backend_uuid")})
+            return PerplexityResult(answer=f"answer {len(self.calls)}", raw={}, backend_uuid="b")
+
+        self._original = tools_mod.call_perplexity_search
+        tools_mod.call_perplexity_search = fake_call  # type: ignore[assignment]
+        self.cfg = AppConfig(
+            cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"},
+            timeout_ms=300_000,
+        )
+
+    def tearDown(self) -> None:
+        tools_mod.call_perplexity_search = self._original  # type: ignore[assignment]
+        tools_mod._RESPONSE_CACHE.clear()
+
+    def test_repeated_query_is_served_from_cache(self) -> None:
+        first = tools_mod.call_tool(self.cfg, "perplexity_search", {"query": "What is MCP?"})
+        second = tools_mod.call_tool(self.cfg, "perplexity_search", {"query": "  what is   mcp? "})
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(first["structuredContent"], second["structuredContent"])
+
+    def test_cache_is_keyed_per_tool(self) -> None:
+        tools_mod.call_tool(self.cfg, "perplexity_search", {"query": "q"})
+        tools_mod.call_tool(self.cfg, "perplexity_ask", {"query": "q"})
+        self.assertEqual(len(self.calls), 2)
+
+    def test_bypass_and_refresh(self) -> None:
+        tools_mod.call_tool(self.cfg, "perplexity_ask", {"query": "q"})
+        bypass = tools_mod.call_tool(self.cfg, "perplexity_ask", {"query": "q", "cache": "bypass"})
+        self.assertEqual(bypass["structuredContent"]["response"], "answer 2")
+        cached = tools_mod.call_tool(self.cfg, "perplexity_ask", {"query": "q"})
+        self.assertEqual(cached["structuredContent"]["response"], "answer 1")
+        refreshed = tools_mod.call_tool(self.cfg, "perplexity_ask", {"query": "q", "cache": "refresh"})
+        self.assertEqual(refreshed["structuredContent"]["response"], "answer 3")
+        cached = tools_mod.call_tool(self.cfg, "perplexity_ask", {"query": "q"})
+        self.assertEqual(cached["structuredContent"]["response"], "answer 3")
+        self.assertEqual(len(self.calls), 3)
+
+    def test_follow_up_bypasses_cache(self) -> None:
+        tools_mod.call_tool(self.cfg, "perplexity_ask", {"query": "q", "backend_uuid": "prev"})
+        tools_mod.call_tool(self.cfg, "perplexity_ask", {"query": "q", "backend_uuid": "prev"})
+        self.assertEqual(len(self.calls), 2)
+
+    def test_tool_ttl_zero_disables_cache(self) -> None:
+        cfg = AppConfig(
+            cookies=self.cfg.cookies,
+            timeout_ms=300_000,
+            cache_tool_ttls_s={"perplexity_research": 0},
+        )
+        tools_mod.call_tool(cfg, "perplexity_research", {"query": "q"})
+        tools_mod.call_tool(cfg, "perplexity_research", {"query": "q"})
+        self.assertEqual(len(self.calls), 2)
+
+    def test_invalid_cache_policy_is_rejected(self) -> None:
+        res = tools_mod.call_tool(self.cfg, "perplexity_ask", {"query": "q", "cache": "always"})
+        self.assertTrue(res.get("isError"))
+        self.assertEqual(self.calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
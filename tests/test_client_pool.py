@@ -0,0 +1,104 @@
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import unittest
+
+from perplexity_unofficial_mcp import perplexity_adapter as adapter_mod
+from perplexity_unofficial_mcp.config import AppConfig
+from perplexity_unofficial_mcp.perplexity_adapter import PerplexityCallError, call_perplexity_search, warm_up
+
+
+def _make_fake_module(instances, *, fail_queries=()):  # type: ignore[no-untyped-def]
+    class FakeClient:
+        def __init__(self, cookies):  # type: ignore[no-untyped-def]
+            self.cookies = cookies
+            instances.append(self)
+
+        def search(self, query, **kwargs):  # type: ignore[no-untyped-def]
+            if query in fail_queries:
+                raise RuntimeError("boom")
+            return {"answer": "ok"}
+
+    return types.SimpleNamespace(Client=FakeClient)
+
+
+class TestClientPool(unittest.TestCase):
+    def setUp(self) -> None:
+        self._original = sys.modules.get("perplexity")
+        adapter_mod._CLIENT_POOL.clear()
+
+    def tearDown(self) -> None:
+        if self._original is None:
+            sys.modules.pop("perplexity", None)
+        else:
+            sys.modules["perplexity"] = self._original
+        adapter_mod._CLIENT_POOL.clear()
+
+    def _cfg(self, **kwargs) -> AppConfig:  # type: ignore[no-untyped-def]
+        return AppConfig(
+            cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"},
+            timeout_ms=300_000,
+            **kwargs,
+        )
+
+    def test_client_is_reused_across_calls(self) -> None:
+        instances = []
+        sys.modules["perplexity"] = _make_fake_module(instances)  # type: ignore[assignment]
+        cfg = self._cfg()
+        for _ in range(3):
+            call_perplexity_search(cfg, query="hi", mode="auto")
+        self.assertEqual(len(instances), 1)
+
+    def test_client_is_discarded_after_error(self) -> None:
+        instances = []
+        sys.modules["perplexity"] = _make_fake_module(instances, fail_queries={"bad"})  # type: ignore[assignment]
+        cfg = self._cfg()
+        call_perplexity_search(cfg, query="hi", mode="auto")
+        with self.assertRaises(PerplexityCallError):
+            call_perplexity_search(cfg, query="bad", mode="auto")
+        call_perplexity_search(cfg, query="hi", mode="auto")
+        self.assertEqual(len(instances), 2)
+
+    def test_client_is_recycled_after_max_uses(self) -> None:
+        instances = []
+        sys.modules["perplexity"] = _make_fake_module(instances)  # type: ignore[assignment]
+        cfg = self._cfg(client_max_uses=2)
+        for _ in range(4):
+            call_perplexity_search(cfg, query="hi", mode="auto")
+        self.assertEqual(len(instances), 2)
+
+    def test_different_cookies_use_different_clients(self) -> None:
+        instances = []
+        sys.modules["perplexity"] = _make_fake_module(instances)  # type: ignore[assignment]
+        call_perplexity_search(self._cfg(), query="hi", mode="auto")
+        other = AppConfig(
+            cookies={"next-auth.csrf-token": "csrf2", "next-auth.session-token": "session2"},
+            timeout_ms=300_000,
+        )
+        call_perplexity_search(other, query="hi", mode="auto")
+        self.assertEqual(len(instances), 2)
+        self.assertEqual(instances[1].cookies["next-auth.csrf-token"], "csrf2")
+
+    def test_warm_up_parks_a_client_for_the_first_call(self) -> None:
+        instances = []
+        sys.modules["perplexity"] = _make_fake_module(instances)  # type: ignore[assignment]
+        cfg = self._cfg()
+        timings = warm_up(cfg, clients=True)
+        self.assertEqual(timings["clientsWarmed"], 1)
+        self.assertIn("importMs", timings)
+        self.assertEqual(adapter_mod._CLIENT_POOL.idle_count(), 1)
+        call_perplexity_search(cfg, query="hi", mode="auto")
+        self.assertEqual(len(instances), 1)
+
+    def test_warm_up_import_only(self) -> None:
+        instances = []
+        sys.modules["perplexity"] = _make_fake_module(instances)  # type: ignore[assignment]
+        self.assertNotIn("clientMs", warm_up(self._cfg()))
+        self.assertEqual(instances, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
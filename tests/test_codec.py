@@ -0,0 +1,122 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import io
+import json
+import threading
+import unittest
+
+from perplexity_unofficial_mcp.codec import CodecDecodeError, JsonCodec, LineWriter, resolve_codec
+from perplexity_unofficial_mcp.server import unencodable_replacement
+
+
+class _CountingStream(io.StringIO):
+    def __init__(self) -> None:
+        super().__init__()
+        self.flushes = 0
+        self.gate = threading.Event()
+
+    def write(self, s: str) -> int:
+        # 第一次写入时阻塞，模拟慢速管道，让后续消息在队列中积压
+        self.gate.wait(5)
+        return super().write(s)
+
+    def flush(self) -> None:
+        self.flushes += 1
+
+
+class TestCodec(unittest.TestCase):
+    def _codecs(self):  # type: ignore[no-untyped-def]
+        codecs = [JsonCodec()]
+        fast = resolve_codec("auto")
+        if fast.name != "stdlib":
+            codecs.append(fast)
+        return codecs
+
+    def test_round_trip_keeps_unicode_on_one_line(self) -> None:
+        obj = {"jsonrpc": "2.0", "id": 1, "result": {"text": "中文\n换行", "n": [1, 2.5, None, True]}}
+        for codec in self._codecs():
+            with self.subTest(codec=codec.name):
+                line = codec.dumps(obj)
+                self.assertNotIn("\n", line)
+                self.assertIn("中文", line)
+                self.assertEqual(codec.loads(line), obj)
+                self.assertEqual(json.loads(line), obj)
+
+    def test_decode_error_is_unified(self) -> None:
+        for codec in self._codecs():
+            with self.subTest(codec=codec.name):
+                with self.assertRaises(CodecDecodeError):
+                    codec.loads("{not json")
+
+    def test_unsupported_input_falls_back_to_stdlib(self) -> None:
+        for codec in self._codecs():
+            with self.subTest(codec=codec.name):
+                self.assertEqual(json.loads(codec.dumps({1: 2 ** 70})), {"1": 2 ** 70})
+
+    def test_missing_optional_backend_falls_back(self) -> None:
+        codec = resolve_codec("msgspec")
+        try:
+            import msgspec  # noqa: F401
+        except ImportError:
+            self.assertEqual(codec.name, "stdlib")
+        else:
+            self.assertEqual(codec.name, "msgspec")
+
+
+class TestLineWriter(unittest.TestCase):
+    def test_writes_one_line_per_message_in_order_and_coalesces_flushes(self) -> None:
+        stream = _CountingStream()
+        writer = LineWriter(lambda: stream)
+        for i in range(50):
+            writer.write({"id": i})
+        stream.gate.set()
+        writer.close()
+
+        ids = [json.loads(line)["id"] for line in stream.getvalue().splitlines()]
+        self.assertEqual(ids, list(range(50)))
+        self.assertLess(stream.flushes, 50)
+
+    def test_write_after_close_is_synchronous(self) -> None:
+        stream = _CountingStream()
+        stream.gate.set()
+        writer = LineWriter(lambda: stream)
+        writer.close()
+        writer.write({"id": "late"})
+        self.assertEqual(json.loads(stream.getvalue()), {"id": "late"})
+
+    def test_unencodable_response_becomes_internal_error(self) -> None:
+        stream = _CountingStream()
+        stream.gate.set()
+        writer = LineWriter(lambda: stream, encode_error=unencodable_replacement)
+        writer.write({"jsonrpc": "2.0", "id": 1, "result": {"bad": object()}})
+        writer.write({"jsonrpc": "2.0", "method": "notifications/progress", "params": {"bad": object()}})
+        writer.write([{"jsonrpc": "2.0", "id": 2, "result": {}}, {"jsonrpc": "2.0", "id": 3, "result": object()}])
+        writer.write({"jsonrpc": "2.0", "id": 4, "result": {}})
+        writer.close()
+
+        messages = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(len(messages), 3)
+        self.assertEqual((messages[0]["id"], messages[0]["error"]["code"]), (1, -32603))
+        self.assertEqual(messages[1][0], {"jsonrpc": "2.0", "id": 2, "result": {}})
+        self.assertEqual((messages[1][1]["id"], messages[1][1]["error"]["code"]), (3, -32603))
+        self.assertEqual(messages[2]["id"], 4)
+
+    def test_on_write_reports_encoded_size_per_message(self) -> None:
+        stream = _CountingStream()
+        stream.gate.set()
+        reports = []
+        writer = LineWriter(lambda: stream, on_write=lambda *args: reports.append(args))
+        writer.write({"id": 1, "result": {"text": "答案"}})
+        writer.close()
+
+        line = stream.getvalue().splitlines()[0]
+        messages, nbytes, encode_ms, sizes = reports[0]
+        self.assertEqual((messages, nbytes, len(encode_ms)), (1, len(line.encode("utf-8")) + 1, 1))
+        self.assertEqual(sizes, [len(line.encode("utf-8"))])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,7 +3,9 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
 
+import json
 import os
+import tempfile
 import unittest
 
 from perplexity_unofficial_mcp.config import ConfigError, load_config, redact_env
@@ -43,13 +45,154 @@ class TestConfig(unittest.TestCase):
             load_config(env={"PERPLEXITY_COOKIES_JSON": '{"x":"y"}'})
         self.assertIn("已移除", str(ctx.exception))
 
+    def test_tool_timeouts_override_default(self) -> None:
+        cfg = load_config(
+            env={
+                "PERPLEXITY_TIMEOUT_MS": "1000",
+                "PERPLEXITY_TOOL_TIMEOUTS_MS": "perplexity_research=900000, perplexity_search=5000",
+            }
+        )
+        self.assertEqual(cfg.timeout_ms_for_tool("perplexity_research"), 900_000)
+        self.assertEqual(cfg.timeout_ms_for_tool("perplexity_search"), 5_000)
+        self.assertEqual(cfg.timeout_ms_for_tool("perplexity_ask"), 1_000)
+
+    def test_tool_timeouts_reject_invalid_values(self) -> None:
+        with self.assertRaises(ConfigError):
+            load_config(env={"PERPLEXITY_TOOL_TIMEOUTS_MS": "perplexity_research"})
+        with self.assertRaises(ConfigError):
+            load_config(env={"PERPLEXITY_TOOL_TIMEOUTS_MS": "perplexity_research=0"})
+
+    def test_http_transport_settings(self) -> None:
+        cfg = load_config(env={})
+        self.assertEqual(cfg.transport, "stdio")
+        self.assertEqual((cfg.http_session_idle_s, cfg.http_max_sessions), (3600, 1000))
+        cfg = load_config(
+            env={
+                "PERPLEXITY_TRANSPORT": "HTTP",
+                "PERPLEXITY_HTTP_PORT": "9000",
+                "PERPLEXITY_HTTP_ALLOWED_ORIGINS": "https://app.example/, https://other.example",
+                "PERPLEXITY_HTTP_SESSION_IDLE_S": "0",
+                "PERPLEXITY_HTTP_MAX_SESSIONS": "50",
+            }
+        )
+        self.assertEqual(cfg.transport, "http")
+        self.assertEqual(cfg.http_port, 9000)
+        self.assertEqual((cfg.http_session_idle_s, cfg.http_max_sessions), (0, 50))
+        self.assertEqual(cfg.http_allowed_origins, ("https://app.example", "https://other.example"))
+        with self.assertRaises(ConfigError):
+            load_config(env={"PERPLEXITY_TRANSPORT": "websocket"})
+
+    def test_json_codec(self) -> None:
+        self.assertEqual(load_config(env={}).json_codec, "auto")
+        self.assertEqual(load_config(env={"PERPLEXITY_JSON_CODEC": "stdlib"}).json_codec, "stdlib")
+        with self.assertRaises(ConfigError):
+            load_config(env={"PERPLEXITY_JSON_CODEC": "ujson"})
+
+    def test_log_settings(self) -> None:
+        cfg = load_config(env={"PERPLEXITY_LOG_LEVEL": "WARNING", "PERPLEXITY_LOG_SAMPLE_RATE": "0.1"})
+        self.assertEqual(cfg.log_level, "warn")
+        self.assertEqual(cfg.log_sample_rate, 0.1)
+        with self.assertRaises(ConfigError):
+            load_config(env={"PERPLEXITY_LOG_SAMPLE_RATE": "2"})
+        with self.assertRaises(ConfigError):
+            load_config(env={"PERPLEXITY_LOG_LEVEL": "trace"})
+
+    def test_metrics_settings(self) -> None:
+        cfg = load_config(env={})
+        self.assertIsNone(cfg.metrics_file)
+        self.assertIsNone(cfg.metrics_port)
+        cfg = load_config(env={"PERPLEXITY_METRICS_FILE": "/tmp/mcp.prom", "PERPLEXITY_METRICS_PORT": "0"})
+        self.assertEqual(cfg.metrics_file, "/tmp/mcp.prom")
+        self.assertEqual(cfg.metrics_port, 0)
+        with self.assertRaises(ConfigError):
+            load_config(env={"PERPLEXITY_METRICS_INTERVAL_S": "0"})
+
+    def test_warmup(self) -> None:
+        self.assertEqual(load_config(env={}).warmup, "import")
+        self.assertEqual(load_config(env={"PERPLEXITY_WARMUP": "Client"}).warmup, "client")
+        with self.assertRaises(ConfigError):
+            load_config(env={"PERPLEXITY_WARMUP": "eager"})
+
+    def test_retry_and_breaker(self) -> None:
+        cfg = load_config(env={})
+        self.assertEqual((cfg.retry_max, cfg.breaker_threshold, cfg.breaker_cooldown_s), (2, 5, 30))
+        cfg = load_config(env={"PERPLEXITY_RETRY_MAX": "0", "PERPLEXITY_BREAKER_THRESHOLD": "0"})
+        self.assertEqual((cfg.retry_max, cfg.breaker_threshold), (0, 0))
+        with self.assertRaises(ConfigError):
+            load_config(env={"PERPLEXITY_RETRY_BASE_MS": "-1"})
+
+    def test_hedge(self) -> None:
+        cfg = load_config(env={})
+        self.assertFalse(cfg.hedge)
+        self.assertEqual((cfg.hedge_delay_ms, cfg.hedge_percentile, cfg.hedge_max_ratio), (0, 0.95, 0.1))
+        cfg = load_config(env={"PERPLEXITY_HEDGE": "1", "PERPLEXITY_HEDGE_DELAY_MS": "1500"})
+        self.assertTrue(cfg.hedge)
+        self.assertEqual(cfg.hedge_delay_ms, 1500)
+        with self.assertRaises(ConfigError):
+            load_config(env={"PERPLEXITY_HEDGE_MAX_RATIO": "2"})
+
+    def test_degrade(self) -> None:
+        cfg = load_config(env={"PERPLEXITY_MAX_WORKERS": "6"})
+        self.assertFalse(cfg.degrade)
+        self.assertEqual((cfg.degrade_queue_depth, cfg.degrade_inflight, cfg.degrade_latency_ms), (6, 0, 0))
+        cfg = load_config(env={"PERPLEXITY_DEGRADE": "true", "PERPLEXITY_DEGRADE_LATENCY_MS": "20000"})
+        self.assertTrue(cfg.degrade)
+        self.assertEqual(cfg.degrade_latency_ms, 20_000)
+
+    def test_response_sources_max(self) -> None:
+        self.assertEqual(load_config(env={}).response_sources_max, 20)
+        self.assertEqual(load_config(env={"PERPLEXITY_RESPONSE_SOURCES_MAX": "0"}).response_sources_max, 0)
+
+    def test_numbered_accounts(self) -> None:
+        cfg = load_config(
+            env={
+                "PERPLEXITY_CSRF_TOKEN_1": "c1",
+                "PERPLEXITY_SESSION_TOKEN_1": "s1",
+                "PERPLEXITY_CSRF_TOKEN_2": "c2",
+                "PERPLEXITY_SESSION_TOKEN_2": "s2",
+                "PERPLEXITY_ACCOUNT_MAX_CONCURRENCY": "3",
+            }
+        )
+        self.assertEqual([a.name for a in cfg.account_list()], ["env-1", "env-2"])
+        self.assertEqual(cfg.account_list()[1].cookies["next-auth.session-token"], "s2")
+        self.assertEqual(cfg.account_list()[0].max_concurrency, 3)
+        # 未配置主账号时，主 Cookies 取账号池第一个账号
+        self.assertEqual(cfg.cookies["next-auth.csrf-token"], "c1")
+
+    def test_numbered_account_requires_both_tokens(self) -> None:
+        with self.assertRaises(ConfigError):
+            load_config(env={"PERPLEXITY_CSRF_TOKEN_1": "c1"})
+
+    def test_accounts_file_with_primary_account(self) -> None:
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "accounts.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump([{"name": "team", "csrf_token": "c", "session_token": "s", "max_concurrency": 2}], f)
+            cfg = load_config(
+                env={
+                    "PERPLEXITY_CSRF_TOKEN": "csrf",
+                    "PERPLEXITY_SESSION_TOKEN": "session",
+                    "PERPLEXITY_ACCOUNTS_FILE": path,
+                }
+            )
+        self.assertEqual([a.name for a in cfg.account_list()], ["default", "team"])
+        self.assertEqual(cfg.account_list()[1].max_concurrency, 2)
+        self.assertEqual(cfg.cookies["next-auth.csrf-token"], "csrf")
+
+    def test_single_account_by_default(self) -> None:
+        cfg = load_config(env={"PERPLEXITY_CSRF_TOKEN": "csrf", "PERPLEXITY_SESSION_TOKEN": "session"})
+        self.assertEqual(len(cfg.account_list()), 1)
+        self.assertEqual(cfg.account_list()[0].cookies, cfg.cookies)
+
     def test_redact_env(self) -> None:
         env = {
             "PERPLEXITY_CSRF_TOKEN": "csrf",
             "PERPLEXITY_SESSION_TOKEN": "session",
+            "PERPLEXITY_SESSION_TOKEN_2": "session2",
             "OTHER": "x",
         }
         redacted = redact_env(env)
+        self.assertEqual(redacted["PERPLEXITY_SESSION_TOKEN_2"], "***REDACTED***")
         self.assertEqual(redacted["PERPLEXITY_CSRF_TOKEN"], "***REDACTED***")
         self.assertEqual(redacted["PERPLEXITY_SESSION_TOKEN"], "***REDACTED***")
         self.assertEqual(redacted["OTHER"], "x")
@@ -0,0 +1,83 @@
+import sys
+import threading
+import time
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import unittest
+
+from perplexity_unofficial_mcp import perplexity_adapter as adapter_mod
+from perplexity_unofficial_mcp import tools as tools_mod
+from perplexity_unofficial_mcp.config import AppConfig
+from perplexity_unofficial_mcp.context import RequestContext
+from perplexity_unofficial_mcp.perplexity_adapter import (
+    PerplexityCancelledError,
+    PerplexityTimeoutError,
+    call_perplexity_search,
+)
+
+
+class _SlowClient:
+    release = threading.Event()
+
+    def __init__(self, cookies):  # type: ignore[no-untyped-def]
+        self.cookies = cookies
+
+    def search(self, query, **kwargs):  # type: ignore[no-untyped-def]
+        self.release.wait(5)
+        return {"answer": "late"}
+
+
+class TestDeadline(unittest.TestCase):
+    def setUp(self) -> None:
+        self._original = sys.modules.get("perplexity")
+        sys.modules["perplexity"] = types.SimpleNamespace(Client=_SlowClient)  # type: ignore[assignment]
+        _SlowClient.release.clear()
+        adapter_mod._CLIENT_POOL.clear()
+        self.cfg = AppConfig(
+            cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"},
+            timeout_ms=300_000,
+        )
+
+    def tearDown(self) -> None:
+        _SlowClient.release.set()
+        if self._original is None:
+            sys.modules.pop("perplexity", None)
+        else:
+            sys.modules["perplexity"] = self._original
+        adapter_mod._CLIENT_POOL.clear()
+
+    def test_timeout_is_enforced(self) -> None:
+        ctx = RequestContext(request_id=1, timeout_ms=100)
+        started = time.monotonic()
+        with self.assertRaises(PerplexityTimeoutError):
+            call_perplexity_search(self.cfg, query="hi", mode="auto", ctx=ctx)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_cancel_releases_caller(self) -> None:
+        ctx = RequestContext(request_id=1, timeout_ms=10_000)
+        threading.Timer(0.1, ctx.cancel).start()
+        started = time.monotonic()
+        with self.assertRaises(PerplexityCancelledError):
+            call_perplexity_search(self.cfg, query="hi", mode="auto", ctx=ctx)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_abandoned_client_is_not_returned_to_pool(self) -> None:
+        ctx = RequestContext(request_id=1, timeout_ms=50)
+        with self.assertRaises(PerplexityTimeoutError):
+            call_perplexity_search(self.cfg, query="hi", mode="auto", ctx=ctx)
+        _SlowClient.release.set()
+        time.sleep(0.1)
+        self.assertEqual(adapter_mod._CLIENT_POOL.idle_count(), 0)
+
+    def test_timeout_becomes_tool_error(self) -> None:
+        ctx = RequestContext(request_id=1, timeout_ms=50)
+        res = tools_mod.call_tool(self.cfg, "perplexity_search", {"query": "hi"}, ctx)
+        self.assertTrue(res.get("isError"))
+        self.assertIn("超时", res["content"][0]["text"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import time
+import unittest
+
+from perplexity_unofficial_mcp import tools as tools_mod
+from perplexity_unofficial_mcp.config import AppConfig
+from perplexity_unofficial_mcp.context import RequestContext
+from perplexity_unofficial_mcp.load import LOAD, LoadMonitor
+
+from fake_upstream import patch_upstream
+
+
+class TestLoadMonitor(unittest.TestCase):
+    def test_signals(self) -> None:
+        monitor = LoadMonitor()
+        self.assertIsNone(monitor.overload_reason("pro", queue_depth=2, inflight=2, latency_ms=1_000))
+        monitor.set_queue_depth_source(lambda: 2)
+        self.assertEqual(monitor.overload_reason("pro", queue_depth=2, inflight=0, latency_ms=0), "queue")
+        self.assertIsNone(monitor.overload_reason("pro", queue_depth=0, inflight=0, latency_ms=0))
+        monitor.upstream_started()
+        monitor.upstream_started()
+        self.assertEqual(monitor.overload_reason("pro", queue_depth=0, inflight=2, latency_ms=0), "inflight")
+        monitor.upstream_finished()
+        self.assertIsNone(monitor.overload_reason("pro", queue_depth=0, inflight=2, latency_ms=0))
+
+    def test_latency_is_smoothed_and_expires(self) -> None:
+        monitor = LoadMonitor()
+        monitor.record_latency("pro", 1.0)
+        monitor.record_latency("pro", 2.0)
+        self.assertEqual(monitor.latency_ms("pro"), 1_200)
+        self.assertEqual(monitor.overload_reason("pro", queue_depth=0, inflight=0, latency_ms=1_000), "latency")
+        self.assertIsNone(monitor.overload_reason("auto", queue_depth=0, inflight=0, latency_ms=1_000))
+        monitor.stale_after_s = 0.01
+        time.sleep(0.02)
+        # 没有新样本（例如已降级到其他 mode）时不再视为过载
+        self.assertIsNone(monitor.latency_ms("pro"))
+
+
+class TestModeDegradation(unittest.TestCase):
+    def setUp(self) -> None:
+        self.calls = []
+        patch_upstream(self, calls=self.calls)
+        self.queued = 5
+        LOAD.set_queue_depth_source(lambda: self.queued)
+        self.config = AppConfig(
+            cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"},
+            timeout_ms=5_000,
+            cache_max_entries=0,
+            degrade=True,
+            degrade_queue_depth=4,
+        )
+
+    def tearDown(self) -> None:
+        LOAD.set_queue_depth_source(None)
+        LOAD.clear()
+
+    def _last_call(self):  # type: ignore[no-untyped-def]
+        return self.calls[-1]["mode"], self.calls[-1]["model"]
+
+    def test_overloaded_calls_use_faster_modes(self) -> None:
+        ctx = RequestContext(timeout_ms=5_000)
+        res = tools_mod.call_tool(self.config, "perplexity_ask", {"query": "q"}, ctx)
+        self.assertEqual(self._last_call(), ("auto", None))
+        self.assertEqual(res["structuredContent"]["mode"], "auto")
+        self.assertEqual(res["structuredContent"]["degraded_from"], "pro")
+        self.assertEqual(ctx.stats["degradeReason"], "queue")
+
+        res = tools_mod.call_tool(self.config, "perplexity_reason", {"query": "q"})
+        self.assertEqual(self._last_call(), ("pro", "gpt-5.2"))
+        self.assertEqual(res["structuredContent"]["degraded_from"], "reasoning")
+
+        tools_mod.call_tool(self.config, "perplexity_research", {"query": "q"})
+        self.assertEqual(self._last_call(), ("deep research", None))
+
+    def test_opt_outs_and_normal_load_keep_configured_mode(self) -> None:
+        tools_mod.call_tool(self.config, "perplexity_search", {"query": "q", "degrade": False})
+        self.assertEqual(self._last_call(), ("pro", "gpt-5.2"))
+        tools_mod.call_tool(self.config, "perplexity_search", {"query": "q", "backend_uuid": "uuid-1"})
+        self.assertEqual(self._last_call(), ("pro", "gpt-5.2"))
+        self.queued = 0
+        res = tools_mod.call_tool(self.config, "perplexity_search", {"query": "q"})
+        self.assertEqual(self._last_call(), ("pro", "gpt-5.2"))
+        self.assertEqual(res["structuredContent"]["mode"], "pro")
+        self.assertNotIn("degraded_from", res["structuredContent"])
+        self.assertTrue(tools_mod.call_tool(self.config, "perplexity_search", {"query": "q", "degrade": "no"})["isError"])
+
+    def test_disabled_by_default(self) -> None:
+        config = AppConfig(cookies=self.config.cookies, timeout_ms=5_000, cache_max_entries=0)
+        tools_mod.call_tool(config, "perplexity_ask", {"query": "q"})
+        self.assertEqual(self._last_call(), ("pro", "gpt-5.2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import threading
+import time
+import unittest
+from dataclasses import replace
+
+from perplexity_unofficial_mcp import perplexity_adapter as adapter_mod
+from perplexity_unofficial_mcp.config import AccountConfig, AppConfig, RateLimit
+from perplexity_unofficial_mcp.context import RequestContext
+from perplexity_unofficial_mcp.hedge import HedgePolicy
+from perplexity_unofficial_mcp.load import LOAD
+from perplexity_unofficial_mcp.perplexity_adapter import PerplexityTimeoutError, call_perplexity_search
+
+
+def _account(name: str) -> AccountConfig:
+    return AccountConfig(
+        name=name,
+        cookies={"next-auth.csrf-token": f"csrf-{name}", "next-auth.session-token": f"session-{name}"},
+        max_concurrency=2,
+    )
+
+
+class TestHedgePolicy(unittest.TestCase):
+    def test_learned_delay_needs_samples(self) -> None:
+        policy = HedgePolicy()
+        self.assertIsNone(policy.delay_s("pro", fixed_ms=0, percentile=0.95))
+        self.assertEqual(policy.delay_s("pro", fixed_ms=250, percentile=0.95), 0.25)
+        for i in range(1, 101):
+            policy.record("pro", i / 100)
+        self.assertAlmostEqual(policy.delay_s("pro", fixed_ms=0, percentile=0.95), 0.95)
+        self.assertIsNone(policy.delay_s("auto", fixed_ms=0, percentile=0.95))
+
+    def test_budget_caps_hedge_ratio(self) -> None:
+        policy = HedgePolicy()
+        spent = 0
+        for _ in range(100):
+            policy.note_eligible(0.1)
+            spent += policy.try_spend()
+        self.assertEqual(spent, 10)
+        policy.clear()
+        for _ in range(1_000):
+            policy.note_eligible(0.1)
+        # 积分有上限：空闲后只允许少量突发
+        self.assertEqual(sum(policy.try_spend() for _ in range(20)), int(HedgePolicy.max_credit))
+
+
+class TestAdapterHedging(unittest.TestCase):
+    def setUp(self) -> None:
+        self._original = sys.modules.get("perplexity")
+        adapter_mod._CLIENT_POOL.clear()
+        adapter_mod._ACCOUNT_POOL.clear()
+        adapter_mod._HEDGE.clear()
+        self.release = threading.Event()
+        self.calls = []
+        test = self
+
+        class FakeClient:
+            def __init__(self, cookies):  # type: ignore[no-untyped-def]
+                self.cookies = cookies
+
+            def search(self, query, mode=None, follow_up=None, **kwargs):  # type: ignore[no-untyped-def]
+                test.calls.append(self.cookies["next-auth.session-token"])
+                if len(test.calls) == 1:
+                    # 第一次调用卡住，模拟长尾
+                    test.release.wait(5)
+                return {"answer": f"answer-{len(test.calls)}", "backend_uuid": f"uuid-{len(test.calls)}"}
+
+        sys.modules["perplexity"] = types.SimpleNamespace(Client=FakeClient)  # type: ignore[assignment]
+        self.cfg = AppConfig(
+            cookies=_account("a").cookies,
+            timeout_ms=5_000,
+            accounts=(_account("a"), _account("b")),
+            hedge=True,
+            hedge_delay_ms=50,
+            hedge_max_ratio=1.0,
+        )
+
+    def tearDown(self) -> None:
+        self.release.set()
+        if self._original is None:
+            sys.modules.pop("perplexity", None)
+        else:
+            sys.modules["perplexity"] = self._original
+        adapter_mod._CLIENT_POOL.clear()
+        adapter_mod._ACCOUNT_POOL.clear()
+        adapter_mod._HEDGE.clear()
+        adapter_mod._RATE_LIMITER.clear()
+        LOAD.clear()
+
+    def test_slow_call_is_hedged_on_another_account(self) -> None:
+        ctx = RequestContext(timeout_ms=5_000)
+        started = time.monotonic()
+        res = call_perplexity_search(self.cfg, query="q", mode="pro", hedge=True, ctx=ctx)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(res.answer, "answer-2")
+        self.assertEqual(len(set(self.calls)), 2)
+        self.assertEqual(ctx.stats["hedgeWinner"], "hedge")
+        self.assertEqual(ctx.stats["account"], res.account)
+        # 被取消的主调用释放了账号占用
+        self.release.set()
+        time.sleep(0.1)
+        self.assertTrue(all(s["inflight"] == 0 for s in adapter_mod._ACCOUNT_POOL.snapshot().values()))
+
+    def test_follow_ups_and_deep_research_are_never_hedged(self) -> None:
+        for kwargs in ({"mode": "pro", "backend_uuid": "uuid-x"}, {"mode": "deep research"}):
+            self.calls.clear()
+            self.release.clear()
+            threading.Timer(0.3, self.release.set).start()
+            ctx = RequestContext(timeout_ms=5_000)
+            res = call_perplexity_search(self.cfg, query="q", hedge=True, ctx=ctx, **kwargs)  # type: ignore[arg-type]
+            self.assertEqual(res.answer, "answer-1")
+            self.assertEqual(len(self.calls), 1)
+            self.assertNotIn("hedged", ctx.stats)
+
+    def test_no_hedge_without_budget(self) -> None:
+        cfg = AppConfig(
+            cookies=self.cfg.cookies,
+            timeout_ms=5_000,
+            accounts=self.cfg.accounts,
+            hedge=True,
+            hedge_delay_ms=50,
+            hedge_max_ratio=0.0,
+        )
+        threading.Timer(0.3, self.release.set).start()
+        res = call_perplexity_search(cfg, query="q", mode="pro", hedge=True)
+        self.assertEqual(res.answer, "answer-1")
+        self.assertEqual(len(self.calls), 1)
+
+    def test_stuck_upstream_without_context_times_out(self) -> None:
+        cfg = replace(self.cfg, timeout_ms=300, hedge_max_ratio=0.0)
+        started = time.monotonic()
+        with self.assertRaises(PerplexityTimeoutError):
+            call_perplexity_search(cfg, query="q", mode="pro", hedge=True)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_samples_exclude_local_queueing(self) -> None:
+        self.release.set()
+        cfg = replace(self.cfg, hedge=False, mode_rate_limits={"pro": RateLimit(count=1, period_s=0.3)})
+        ctx = RequestContext(timeout_ms=5_000)
+        for _ in range(2):
+            call_perplexity_search(cfg, query="q", mode="pro", ctx=ctx)
+        self.assertGreaterEqual(ctx.stats["queueMs"], 200)
+        samples = adapter_mod._HEDGE._samples["pro"]
+        self.assertEqual(len(samples), 2)
+        self.assertLess(max(samples), 0.1)
+        # 负载监控同样只看上游耗时：本地排队不应被当作上游变慢而触发降级
+        self.assertLess(LOAD.latency_ms("pro"), 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
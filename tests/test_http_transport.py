@@ -0,0 +1,201 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import http.client
+import json
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+
+from perplexity_unofficial_mcp.config import AppConfig
+from perplexity_unofficial_mcp.context import RequestContext
+from perplexity_unofficial_mcp.mcp_http import SessionRegistry, create_http_server
+from perplexity_unofficial_mcp.server import McpServer
+
+from fake_upstream import patch_upstream
+
+
+class TestHttpTransport(unittest.TestCase):
+    def setUp(self) -> None:
+        patch_upstream(self, progress=True)
+        cfg = AppConfig(
+            cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"},
+            timeout_ms=5_000,
+            transport="http",
+            http_port=0,
+        )
+        self.mcp = McpServer(cfg)
+        self.httpd = create_http_server(cfg, self.mcp)
+        self.url = "http://127.0.0.1:%d/mcp" % self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.mcp.shutdown(wait=True)
+
+    def _post(self, body, *, session=None, accept="application/json, text/event-stream", origin=None):  # type: ignore[no-untyped-def]
+        headers = {"Content-Type": "application/json", "Accept": accept}
+        if session is not None:
+            headers["Mcp-Session-Id"] = session
+        if origin is not None:
+            headers["Origin"] = origin
+        req = urllib.request.Request(self.url, data=json.dumps(body).encode("utf-8"), headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(req, timeout=10) as resp:
+                return resp.status, dict(resp.headers), resp.read().decode("utf-8")
+        except urllib.error.HTTPError as exc:
+            return exc.code, dict(exc.headers), exc.read().decode("utf-8")
+
+    def _initialize(self) -> str:
+        status, headers, body = self._post(
+            {"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {"protocolVersion": "2024-11-05"}},
+            accept="application/json",
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["result"]["serverInfo"]["name"], "perplexity-unofficial-mcp")
+        return headers["Mcp-Session-Id"]
+
+    @staticmethod
+    def _sse_messages(body: str):  # type: ignore[no-untyped-def]
+        return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+    def test_session_lifecycle(self) -> None:
+        session = self._initialize()
+
+        status, _, body = self._post({"jsonrpc": "2.0", "id": 2, "method": "tools/list"}, session=session, accept="application/json")
+        self.assertEqual(status, 200)
+        self.assertTrue(json.loads(body)["result"]["tools"])
+
+        status, _, _ = self._post({"jsonrpc": "2.0", "method": "notifications/initialized"}, session=session)
+        self.assertEqual(status, 202)
+
+        status, _, _ = self._post({"jsonrpc": "2.0", "id": 3, "method": "ping"})
+        self.assertEqual(status, 400)
+        status, _, _ = self._post({"jsonrpc": "2.0", "id": 3, "method": "ping"}, session="unknown")
+        self.assertEqual(status, 404)
+
+        req = urllib.request.Request(self.url, headers={"Mcp-Session-Id": session}, method="DELETE")
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            self.assertEqual(resp.status, 204)
+        status, _, _ = self._post({"jsonrpc": "2.0", "id": 4, "method": "ping"}, session=session)
+        self.assertEqual(status, 404)
+
+    def test_sessions_are_independent(self) -> None:
+        first = self._initialize()
+        second = self._initialize()
+        self.assertNotEqual(first, second)
+
+    def test_tools_call_json_response(self) -> None:
+        session = self._initialize()
+        status, headers, body = self._post(
+            {"jsonrpc": "2.0", "id": 5, "method": "tools/call", "params": {"name": "perplexity_search", "arguments": {"query": "hi"}}},
+            session=session,
+            accept="application/json",
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["Content-Type"], "application/json")
+        msg = json.loads(body)
+        self.assertEqual(msg["id"], 5)
+        self.assertEqual(msg["result"]["structuredContent"]["backend_uuid"], "uuid-hi")
+
+    def test_tools_call_sse_streams_progress_then_result(self) -> None:
+        session = self._initialize()
+        status, headers, body = self._post(
+            {
+                "jsonrpc": "2.0",
+                "id": 6,
+                "method": "tools/call",
+                "params": {"name": "perplexity_search", "arguments": {"query": "hi"}, "_meta": {"progressToken": "p1"}},
+            },
+            session=session,
+        )
+        self.assertEqual(status, 200)
+        self.assertTrue(headers["Content-Type"].startswith("text/event-stream"))
+        messages = self._sse_messages(body)
+        self.assertEqual(messages[0]["method"], "notifications/progress")
+        self.assertEqual(messages[0]["params"]["progressToken"], "p1")
+        self.assertEqual(messages[-1]["id"], 6)
+        self.assertIn("result", messages[-1])
+
+    def test_batch_post_returns_array(self) -> None:
+        session = self._initialize()
+        status, _, body = self._post(
+            [
+                {"jsonrpc": "2.0", "id": 7, "method": "ping"},
+                {"jsonrpc": "2.0", "id": 8, "method": "tools/call", "params": {"name": "perplexity_search", "arguments": {"query": "a"}}},
+            ],
+            session=session,
+            accept="application/json",
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual([msg["id"] for msg in json.loads(body)], [7, 8])
+
+    def test_foreign_origin_is_rejected(self) -> None:
+        status, _, _ = self._post(
+            {"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {}}, origin="https://evil.example"
+        )
+        self.assertEqual(status, 403)
+        status, _, _ = self._post(
+            {"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {}}, origin="http://localhost:3000"
+        )
+        self.assertEqual(status, 200)
+
+    def test_invalid_content_length_is_parse_error(self) -> None:
+        for value in ("abc", "-5", "1.5"):
+            conn = http.client.HTTPConnection("127.0.0.1", self.httpd.server_address[1], timeout=10)
+            try:
+                conn.putrequest("POST", "/mcp")
+                conn.putheader("Content-Type", "application/json")
+                conn.putheader("Content-Length", value)
+                conn.endheaders()
+                resp = conn.getresponse()
+                self.assertEqual(resp.status, 400, value)
+                self.assertEqual(json.loads(resp.read())["error"]["code"], -32700)
+            finally:
+                conn.close()
+        # 处理线程未崩溃，服务仍可用
+        self._initialize()
+
+
+class TestSessionRegistry(unittest.TestCase):
+    def test_idle_sessions_expire(self) -> None:
+        sessions = SessionRegistry(idle_ttl_s=0.1, max_sessions=0)
+        idle = sessions.create()
+        busy = sessions.create()
+        busy_ctx = RequestContext(request_id=1)
+        busy.inflight[1] = busy_ctx
+        active = sessions.create()
+        time.sleep(0.06)
+        sessions.get(active.session_id)  # type: ignore[arg-type]
+        time.sleep(0.06)
+        self.assertIs(sessions.get(active.session_id), active)  # type: ignore[arg-type]
+        self.assertIsNone(sessions.get(idle.session_id))  # type: ignore[arg-type]
+        # 有在途请求的会话不算空闲
+        self.assertIs(sessions.get(busy.session_id), busy)  # type: ignore[arg-type]
+        self.assertFalse(busy_ctx.cancelled)
+        self.assertEqual(len(sessions), 2)
+
+    def test_max_sessions_evicts_least_recently_used(self) -> None:
+        sessions = SessionRegistry(idle_ttl_s=0, max_sessions=2)
+        first = sessions.create()
+        second = sessions.create()
+        second.inflight[1] = RequestContext(request_id=1)
+        sessions.get(first.session_id)  # type: ignore[arg-type]
+        third = sessions.create()
+        self.assertEqual(len(sessions), 2)
+        # second 最久未使用但有在途请求，优先淘汰空闲的 first
+        self.assertIsNone(sessions.get(first.session_id))  # type: ignore[arg-type]
+        self.assertIs(sessions.get(second.session_id), second)  # type: ignore[arg-type]
+        sessions.create()
+        self.assertIsNone(sessions.get(third.session_id))  # type: ignore[arg-type]
+        self.assertEqual(len(sessions), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
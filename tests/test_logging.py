@@ -0,0 +1,81 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import io
+import json
+import threading
+import time
+import unittest
+
+from perplexity_unofficial_mcp import logging as logging_mod
+from perplexity_unofficial_mcp.codec import LineWriter
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.events = []
+        self.dropped = 0
+        self.max_queue = None
+
+    def write(self, obj):  # type: ignore[no-untyped-def]
+        self.events.append(obj)
+        return True
+
+
+class _BlockedStream(io.StringIO):
+    def __init__(self) -> None:
+        super().__init__()
+        self.gate = threading.Event()
+
+    def write(self, s: str) -> int:
+        self.gate.wait(5)
+        return super().write(s)
+
+
+class TestLogging(unittest.TestCase):
+    def setUp(self) -> None:
+        self._original = logging_mod._WRITER
+        self.recorder = _Recorder()
+        logging_mod._WRITER = self.recorder  # type: ignore[assignment]
+
+    def tearDown(self) -> None:
+        logging_mod.configure_logging()
+        logging_mod._WRITER = self._original
+
+    def test_min_level_filters_events(self) -> None:
+        logging_mod.configure_logging(level="warn")
+        logging_mod.log_event({"level": "info", "msg": "a"})
+        logging_mod.log_event({"level": "error", "msg": "b"})
+        self.assertEqual([e["msg"] for e in self.recorder.events], ["b"])
+        self.assertIn("ts", self.recorder.events[0])
+
+    def test_sampling_only_applies_to_sampled_info_events(self) -> None:
+        logging_mod.configure_logging(sample_rate=0.0)
+        logging_mod.log_event({"level": "info", "msg": "request"}, sampled=True)
+        logging_mod.log_event({"level": "error", "msg": "failed"}, sampled=True)
+        logging_mod.log_event({"level": "info", "msg": "startup"})
+        self.assertEqual([e["msg"] for e in self.recorder.events], ["failed", "startup"])
+
+
+class TestBoundedWriter(unittest.TestCase):
+    def test_full_buffer_drops_without_blocking_and_reports(self) -> None:
+        stream = _BlockedStream()
+        writer = LineWriter(lambda: stream, max_queue=3, drop_notice=lambda n: {"dropped": n})
+        started = time.time()
+        results = [writer.write({"i": i}) for i in range(20)]
+        self.assertLess(time.time() - started, 0.5)
+        self.assertFalse(all(results))
+        self.assertGreater(writer.dropped, 0)
+
+        stream.gate.set()
+        writer.close()
+        lines = stream.getvalue().splitlines()
+        # 已入队的消息照常写出，随后追加一条丢弃提示
+        self.assertEqual([json.loads(line).get("i") for line in lines[:-1]], list(range(len(lines) - 1)))
+        self.assertEqual(json.loads(lines[-1]), {"dropped": writer.dropped})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from perplexity_unofficial_mcp.config import AppConfig
+from perplexity_unofficial_mcp.metrics import METRICS, Histogram, MetricsFileExporter, MetricsRegistry
+from perplexity_unofficial_mcp.perplexity_adapter import PerplexityCallError
+from perplexity_unofficial_mcp.server import METRICS_RESOURCE_URI, McpServer, ServerState
+from perplexity_unofficial_mcp.jsonrpc import safe_parse_json_line
+
+from fake_upstream import patch_upstream
+
+
+class TestHistogram(unittest.TestCase):
+    def test_quantiles_interpolate_within_bucket(self) -> None:
+        h = Histogram(bounds=(10, 100))
+        for _ in range(50):
+            h.observe(5)
+        for _ in range(50):
+            h.observe(50)
+        self.assertEqual(h.quantile(0.5), 10.0)
+        self.assertAlmostEqual(h.quantile(0.99), 10 + 90 * 0.98)
+
+    def test_empty_and_overflow(self) -> None:
+        h = Histogram(bounds=(10,))
+        self.assertIsNone(h.quantile(0.5))
+        h.observe(1_000)
+        self.assertEqual(h.quantile(0.99), 10.0)
+
+
+class TestRegistry(unittest.TestCase):
+    def test_prometheus_text(self) -> None:
+        reg = MetricsRegistry()
+        reg.inc("mcp_tool_calls_total", tool="perplexity_search", outcome="ok")
+        reg.observe("mcp_tool_duration_ms", 3, tool="perplexity_search", mode="pro")
+        reg.register_collector("mcp_lane_queued", "gauge", lambda: [({"lane": "light"}, 2)])
+        text = reg.render_prometheus()
+        self.assertIn("# TYPE mcp_tool_calls_total counter", text)
+        self.assertIn('mcp_tool_calls_total{outcome="ok",tool="perplexity_search"} 1', text)
+        self.assertIn('mcp_tool_duration_ms_bucket{mode="pro",tool="perplexity_search",le="5"} 1', text)
+        self.assertIn('mcp_tool_duration_ms_bucket{mode="pro",tool="perplexity_search",le="+Inf"} 1', text)
+        self.assertIn('mcp_lane_queued{lane="light"} 2', text)
+
+    def test_failing_collector_is_skipped(self) -> None:
+        reg = MetricsRegistry()
+        reg.register_collector("broken", "gauge", lambda: 1 / 0)  # type: ignore[arg-type,return-value]
+        reg.inc("ok_total")
+        self.assertIn("ok_total 1", reg.render_prometheus())
+
+    def test_file_exporter_writes_atomically(self) -> None:
+        reg = MetricsRegistry()
+        reg.inc("mcp_messages_written_total", 3, transport="stdio")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "mcp.prom")
+            exporter = MetricsFileExporter(reg, path, interval_s=3600)
+            exporter.stop()
+            with open(path, encoding="utf-8") as f:
+                self.assertIn('mcp_messages_written_total{transport="stdio"} 3', f.read())
+            self.assertFalse(os.path.exists(path + ".tmp"))
+
+
+class TestServerMetrics(unittest.TestCase):
+    def setUp(self) -> None:
+        METRICS.clear()
+        patch_upstream(
+            self,
+            fail_query="boom",
+            error=PerplexityCallError("Perplexity 调用失败：HTTP 429 Too Many Requests"),
+            stats={"upstreamMs": 12},
+        )
+        self.server = McpServer(
+            AppConfig(
+                cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"},
+                timeout_ms=5_000,
+            )
+        )
+        self.state = ServerState(initialized=True)
+
+    def tearDown(self) -> None:
+        self.server.shutdown(wait=True)
+
+    def _dispatch(self, message):  # type: ignore[no-untyped-def]
+        req, _ = safe_parse_json_line(json.dumps(message))
+        written = []
+        finished = threading.Event()
+        self.server.handle(self.state, req, respond=written.append, done=finished.set)  # type: ignore[arg-type]
+        self.assertTrue(finished.wait(5))
+        return written[0]
+
+    def _call(self, id_, query):  # type: ignore[no-untyped-def]
+        return self._dispatch(
+            {
+                "jsonrpc": "2.0",
+                "id": id_,
+                "method": "tools/call",
+                "params": {"name": "perplexity_search", "arguments": {"query": query}},
+            }
+        )
+
+    def _counter(self, snapshot, name, **labels):  # type: ignore[no-untyped-def]
+        for row in snapshot["counters"]:
+            if row["name"] == name and all(row["labels"].get(k) == v for k, v in labels.items()):
+                return row["value"]
+        return 0
+
+    def test_tool_calls_are_recorded(self) -> None:
+        self._call(1, "hello")
+        self._call(2, "hello")
+        self._call(3, "boom")
+        snap = METRICS.snapshot()
+        self.assertEqual(self._counter(snap, "mcp_tool_calls_total", tool="perplexity_search", outcome="ok"), 2)
+        self.assertEqual(self._counter(snap, "mcp_tool_calls_total", outcome="error"), 1)
+        self.assertEqual(self._counter(snap, "mcp_tool_errors_total", error_class="rate_limited"), 1)
+        self.assertEqual(self._counter(snap, "mcp_cache_lookups_total", result="hit"), 1)
+        upstream = [h for h in snap["histograms"] if h["name"] == "mcp_upstream_ms"]
+        self.assertEqual(upstream[0]["labels"], {"mode": "pro", "tool": "perplexity_search"})
+        self.assertEqual(upstream[0]["count"], 1)
+        inflight = [g for g in snap["gauges"] if g["name"] == "mcp_tools_inflight"]
+        self.assertEqual(inflight[0]["value"], 0)
+
+    def test_rejected_submit_does_not_leak_inflight_gauge(self) -> None:
+        self.server.scheduler.shutdown(wait=True)
+        res = self._call(1, "hello")
+        self.assertEqual(res["error"]["code"], -32603)
+        inflight = [g for g in METRICS.snapshot()["gauges"] if g["name"] == "mcp_tools_inflight"]
+        self.assertEqual(inflight[0]["value"], 0)
+        self.assertEqual(self.state.inflight, {})
+
+    def test_metrics_resource(self) -> None:
+        self._call(1, "hello")
+        listed = self._dispatch({"jsonrpc": "2.0", "id": 2, "method": "resources/list"})
+        self.assertEqual(listed["result"]["resources"][0]["uri"], METRICS_RESOURCE_URI)
+        read = self._dispatch(
+            {"jsonrpc": "2.0", "id": 3, "method": "resources/read", "params": {"uri": METRICS_RESOURCE_URI}}
+        )
+        snapshot = json.loads(read["result"]["contents"][0]["text"])
+        names = {h["name"] for h in snapshot["histograms"]}
+        self.assertIn("mcp_tool_duration_ms", names)
+        self.assertIn("p99", snapshot["histograms"][0])
+        lanes = {g["labels"]["lane"] for g in snapshot["gauges"] if g["name"] == "mcp_lane_queued"}
+        self.assertEqual(lanes, {"batch", "heavy", "light"})
+
+        missing = self._dispatch(
+            {"jsonrpc": "2.0", "id": 4, "method": "resources/read", "params": {"uri": "perplexity://nope"}}
+        )
+        self.assertEqual(missing["error"]["code"], -32002)
+
+
+if __name__ == "__main__":
+    unittest.main()
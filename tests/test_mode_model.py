@@ -11,6 +11,9 @@ from perplexity_unofficial_mcp import tools as tools_mod
 
 
 class TestModeModel(unittest.TestCase):
+    def setUp(self) -> None:
+        tools_mod._RESPONSE_CACHE.clear()
+
     def test_ask_defaults_to_pro_gpt52_when_has_cookies(self) -> None:
         calls = []
 
@@ -0,0 +1,117 @@
+import sys
+import time
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import unittest
+
+from perplexity_unofficial_mcp import perplexity_adapter as adapter_mod
+from perplexity_unofficial_mcp.config import AppConfig, ConfigError, RateLimit, load_config
+from perplexity_unofficial_mcp.context import RequestContext
+from perplexity_unofficial_mcp.perplexity_adapter import PerplexityRateLimitedError, call_perplexity_search
+from perplexity_unofficial_mcp.ratelimit import RateLimiter, RateLimitExceeded
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_burst_then_queue(self) -> None:
+        limiter = RateLimiter()
+        limit = RateLimit(count=2, period_s=0.2)
+        self.assertEqual(limiter.acquire("k", limit, max_wait_s=1), 0.0)
+        self.assertEqual(limiter.acquire("k", limit, max_wait_s=1), 0.0)
+        started = time.monotonic()
+        waited = limiter.acquire("k", limit, max_wait_s=1)
+        self.assertGreater(waited, 0.05)
+        self.assertGreater(time.monotonic() - started, 0.05)
+
+    def test_wait_is_bounded(self) -> None:
+        limiter = RateLimiter()
+        limit = RateLimit(count=1, period_s=60)
+        limiter.acquire("k", limit, max_wait_s=1)
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire("k", limit, max_wait_s=1)
+
+    def test_wait_is_bounded_by_deadline(self) -> None:
+        limiter = RateLimiter()
+        limit = RateLimit(count=1, period_s=2)
+        limiter.acquire("k", limit, max_wait_s=10)
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire("k", limit, max_wait_s=10, ctx=RequestContext(timeout_ms=100))
+
+    def test_keys_are_independent(self) -> None:
+        limiter = RateLimiter()
+        limit = RateLimit(count=1, period_s=60)
+        limiter.acquire("a", limit, max_wait_s=0)
+        self.assertEqual(limiter.acquire("b", limit, max_wait_s=0), 0.0)
+
+
+class TestRateLimitConfig(unittest.TestCase):
+    def test_parse_mode_and_account_limits(self) -> None:
+        cfg = load_config(
+            env={
+                "PERPLEXITY_RATE_LIMITS": "deep research=2/60, pro=30/60",
+                "PERPLEXITY_ACCOUNT_RATE_LIMIT": "100/60",
+                "PERPLEXITY_RATE_LIMIT_MAX_WAIT_MS": "5000",
+            }
+        )
+        self.assertEqual(cfg.mode_rate_limits["deep research"], RateLimit(count=2, period_s=60.0))
+        self.assertEqual(cfg.mode_rate_limits["pro"], RateLimit(count=30, period_s=60.0))
+        self.assertEqual(cfg.account_rate_limit, RateLimit(count=100, period_s=60.0))
+        self.assertEqual(cfg.rate_limit_max_wait_ms, 5000)
+
+    def test_invalid_limit_is_rejected(self) -> None:
+        with self.assertRaises(ConfigError):
+            load_config(env={"PERPLEXITY_RATE_LIMITS": "pro=30"})
+
+
+class TestAdapterRateLimit(unittest.TestCase):
+    def setUp(self) -> None:
+        self._original = sys.modules.get("perplexity")
+        adapter_mod._RATE_LIMITER.clear()
+
+        class FakeClient:
+            def __init__(self, cookies):  # type: ignore[no-untyped-def]
+                self.cookies = cookies
+
+            def search(self, query, **kwargs):  # type: ignore[no-untyped-def]
+                return {"answer": "ok"}
+
+        sys.modules["perplexity"] = types.SimpleNamespace(Client=FakeClient)  # type: ignore[assignment]
+
+    def tearDown(self) -> None:
+        if self._original is None:
+            sys.modules.pop("perplexity", None)
+        else:
+            sys.modules["perplexity"] = self._original
+        adapter_mod._RATE_LIMITER.clear()
+
+    def test_excess_calls_queue_and_report_wait(self) -> None:
+        cfg = AppConfig(
+            cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"},
+            timeout_ms=300_000,
+            mode_rate_limits={"deep research": RateLimit(count=1, period_s=0.2)},
+        )
+        call_perplexity_search(cfg, query="a", mode="deep research")
+        ctx = RequestContext(request_id=2, timeout_ms=5_000)
+        call_perplexity_search(cfg, query="b", mode="deep research", ctx=ctx)
+        self.assertGreater(ctx.stats.get("queueMs", 0), 50)
+        # 其他 mode 不受影响
+        other = RequestContext(request_id=3, timeout_ms=5_000)
+        call_perplexity_search(cfg, query="c", mode="pro", ctx=other)
+        self.assertNotIn("queueMs", other.stats)
+
+    def test_wait_beyond_bound_fails(self) -> None:
+        cfg = AppConfig(
+            cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"},
+            timeout_ms=300_000,
+            mode_rate_limits={"pro": RateLimit(count=1, period_s=60)},
+            rate_limit_max_wait_ms=100,
+        )
+        call_perplexity_search(cfg, query="a", mode="pro")
+        with self.assertRaises(PerplexityRateLimitedError):
+            call_perplexity_search(cfg, query="b", mode="pro")
+
+
+if __name__ == "__main__":
+    unittest.main()
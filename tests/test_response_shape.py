@@ -0,0 +1,76 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import unittest
+from dataclasses import replace
+
+from perplexity_unofficial_mcp import tools as tools_mod
+from perplexity_unofficial_mcp.codec import get_codec
+from perplexity_unofficial_mcp.config import AppConfig, ConfigError, load_config
+from perplexity_unofficial_mcp.context import RequestContext
+
+from fake_upstream import patch_upstream
+
+_CHUNKS = [{"url": f"https://example.com/{i}", "snippet": "x" * 100} for i in range(20)]
+
+
+class TestResponseShape(unittest.TestCase):
+    def setUp(self) -> None:
+        patch_upstream(self, chunks=_CHUNKS, backend_uuid="b1")
+        self.config = AppConfig(
+            cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"},
+            timeout_ms=5_000,
+        )
+
+    def test_default_keeps_full_result(self) -> None:
+        ctx = RequestContext()
+        res = tools_mod.call_tool(self.config, "perplexity_ask", {"query": "q"}, ctx)
+        self.assertNotIn("resultBytes", ctx.stats)
+        structured = res["structuredContent"]
+        self.assertEqual(structured["response"], "answer: q")
+        self.assertEqual(len(structured["chunks"]), 20)
+        self.assertEqual(structured["backend_uuid"], "b1")
+
+    def test_trim_respects_count_and_byte_budget(self) -> None:
+        one = len(get_codec().dumps_bytes(_CHUNKS[0]))
+        config = replace(self.config, response_chunks="trim", response_chunks_max=5, response_chunks_max_bytes=one * 3)
+        ctx = RequestContext()
+        res = tools_mod.call_tool(config, "perplexity_search", {"query": "q"}, ctx)
+        structured = res["structuredContent"]
+        self.assertEqual(len(structured["chunks"]), 3)
+        self.assertEqual(structured["chunks_total"], 20)
+        self.assertEqual(ctx.stats["chunks"], "3/20")
+        self.assertLessEqual(ctx.stats["chunkBytes"], one * 3)
+
+    def test_per_call_arguments_override_server_default(self) -> None:
+        ctx = RequestContext()
+        res = tools_mod.call_tool(self.config, "perplexity_search", {"query": "q", "chunks": "summary", "compact": True}, ctx)
+        structured = res["structuredContent"]
+        self.assertNotIn("results", structured)
+        self.assertNotIn("chunks", structured)
+        self.assertEqual(structured["chunks_summary"]["count"], 20)
+        self.assertEqual(res["content"][0]["text"], "answer: q")
+        self.assertNotIn("resultBytes", ctx.stats)
+
+        res = tools_mod.call_tool(self.config, "perplexity_ask", {"query": "q", "chunks": "none"})
+        self.assertNotIn("chunks", res["structuredContent"])
+        self.assertEqual(res["structuredContent"]["backend_uuid"], "b1")
+
+    def test_invalid_arguments(self) -> None:
+        res = tools_mod.call_tool(self.config, "perplexity_ask", {"query": "q", "chunks": "all"})
+        self.assertTrue(res["isError"])
+        res = tools_mod.call_tool(self.config, "perplexity_ask", {"query": "q", "compact": "yes"})
+        self.assertTrue(res["isError"])
+
+    def test_config(self) -> None:
+        cfg = load_config(env={"PERPLEXITY_RESPONSE_CHUNKS": "trim", "PERPLEXITY_RESPONSE_COMPACT": "1"})
+        self.assertEqual(cfg.response_chunks, "trim")
+        self.assertTrue(cfg.response_compact)
+        with self.assertRaises(ConfigError):
+            load_config(env={"PERPLEXITY_RESPONSE_CHUNKS": "some"})
+
+
+if __name__ == "__main__":
+    unittest.main()
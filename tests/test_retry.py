@@ -0,0 +1,215 @@
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import time
+import unittest
+from dataclasses import replace
+
+from perplexity_unofficial_mcp import perplexity_adapter as adapter_mod
+from perplexity_unofficial_mcp.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakers
+from perplexity_unofficial_mcp.config import AccountConfig, AppConfig
+from perplexity_unofficial_mcp.context import RequestContext
+from perplexity_unofficial_mcp.perplexity_adapter import (
+    PerplexityCircuitOpenError,
+    PerplexityTimeoutError,
+    PerplexityUpstreamError,
+    call_perplexity_search,
+    classify_failure,
+    error_class,
+)
+
+
+class TestClassifyFailure(unittest.TestCase):
+    def test_kinds(self) -> None:
+        self.assertEqual(classify_failure(RuntimeError("HTTP 429 Too Many Requests")), "rate_limited")
+        self.assertEqual(classify_failure(RuntimeError("403 Forbidden")), "auth")
+        self.assertEqual(classify_failure(ConnectionResetError("reset")), "transient")
+        self.assertEqual(classify_failure(RuntimeError("HTTP 503 Service Unavailable")), "transient")
+        self.assertEqual(classify_failure(ValueError("Expecting value: line 1 column 1")), "bad_response")
+        self.assertEqual(classify_failure(RuntimeError("boom")), "upstream")
+        self.assertEqual(error_class(PerplexityCircuitOpenError("x")), "circuit_open")
+        self.assertEqual(error_class(PerplexityUpstreamError("x", kind="transient")), "transient")
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_threshold_and_probes_once(self) -> None:
+        changes = []
+        breaker = CircuitBreaker(lambda old, new, info: changes.append((old, new)))
+        for _ in range(2):
+            self.assertEqual(breaker.allow(threshold=2), (None, None))
+            breaker.record_failure(threshold=2, cooldown_s=0.05, kind="transient")
+        self.assertEqual(breaker.state, OPEN)
+        self.assertGreater(breaker.allow(threshold=2)[0], 0)
+        self.assertGreater(breaker.retry_after(threshold=2), 0)
+        time.sleep(0.06)
+        self.assertIsNone(breaker.retry_after(threshold=2))
+        wait_s, probe = breaker.allow(threshold=2)
+        self.assertIsNone(wait_s)
+        self.assertIsNotNone(probe)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        # 探测进行中，其余调用直接失败
+        self.assertEqual(breaker.allow(threshold=2), (0.0, None))
+        self.assertEqual(breaker.retry_after(threshold=2), 0.0)
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(changes, [(CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, CLOSED)])
+
+    def test_only_the_probe_holder_can_release_it(self) -> None:
+        breaker = CircuitBreaker()
+        breaker.record_failure(threshold=1, cooldown_s=0, kind="transient")
+        _wait_s, probe = breaker.allow(threshold=1)
+        # 非探测调用方（令牌为 None 或过期令牌）释放无效，不会放行第二个探测
+        breaker.release_probe(None)
+        breaker.release_probe(probe + 1)  # type: ignore[operator]
+        self.assertEqual(breaker.allow(threshold=1), (0.0, None))
+        breaker.release_probe(probe)
+        wait_s, retaken = breaker.allow(threshold=1)
+        self.assertIsNone(wait_s)
+        self.assertNotEqual(retaken, probe)
+        breaker.record_failure(threshold=1, cooldown_s=60, kind="transient")
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_zero_threshold_disables(self) -> None:
+        breaker = CircuitBreaker()
+        for _ in range(10):
+            breaker.record_failure(threshold=0, cooldown_s=60, kind="transient")
+        self.assertEqual(breaker.allow(threshold=0), (None, None))
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_registry_keys_by_account_and_lane(self) -> None:
+        changes = []
+        breakers = CircuitBreakers(lambda old, new, info: changes.append(info))
+        breakers.get("a", "heavy").record_failure(threshold=1, cooldown_s=60, kind="transient")
+        self.assertEqual(breakers.get("a", "heavy").state, OPEN)
+        self.assertEqual(breakers.get("a", "light").state, CLOSED)
+        self.assertEqual(breakers.get("b", "heavy").state, CLOSED)
+        self.assertEqual((changes[0]["account"], changes[0]["lane"]), ("a", "heavy"))
+        states = {(snap["account"], snap["lane"]): snap["state"] for snap in breakers.snapshot()}
+        self.assertEqual(states[("a", "heavy")], OPEN)
+
+
+class TestAdapterRetry(unittest.TestCase):
+    def setUp(self) -> None:
+        self._original = sys.modules.get("perplexity")
+        adapter_mod._CLIENT_POOL.clear()
+        adapter_mod._ACCOUNT_POOL.clear()
+        adapter_mod._BREAKERS.reset()
+        self.failures = []
+        self.calls = 0
+        self.sessions = []
+        test = self
+
+        class FakeClient:
+            def __init__(self, cookies):  # type: ignore[no-untyped-def]
+                self.session = cookies.get("next-auth.session-token")
+
+            def search(self, query, **kwargs):  # type: ignore[no-untyped-def]
+                test.calls += 1
+                test.sessions.append(self.session)
+                if self.session == "broken":
+                    raise RuntimeError("boom")
+                if query == "slow":
+                    time.sleep(0.3)
+                if test.failures:
+                    raise test.failures.pop(0)
+                return {"answer": "ok"}
+
+        sys.modules["perplexity"] = types.SimpleNamespace(Client=FakeClient)  # type: ignore[assignment]
+        self.cfg = AppConfig(
+            cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"},
+            timeout_ms=5_000,
+            retry_max=2,
+            retry_base_ms=1,
+            retry_max_delay_ms=5,
+            breaker_threshold=3,
+            breaker_cooldown_s=60,
+        )
+
+    def tearDown(self) -> None:
+        if self._original is None:
+            sys.modules.pop("perplexity", None)
+        else:
+            sys.modules["perplexity"] = self._original
+        adapter_mod._CLIENT_POOL.clear()
+        adapter_mod._ACCOUNT_POOL.clear()
+        adapter_mod._BREAKERS.reset()
+
+    def test_transient_failure_is_retried(self) -> None:
+        self.failures = [ConnectionResetError("connection reset by peer"), RuntimeError("HTTP 502 Bad Gateway")]
+        ctx = RequestContext(timeout_ms=5_000)
+        res = call_perplexity_search(self.cfg, query="q", mode="auto", ctx=ctx)
+        self.assertEqual(res.answer, "ok")
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(ctx.stats["retries"], 2)
+        self.assertEqual(adapter_mod._BREAKERS.get("default", "light").state, CLOSED)
+
+    def test_auth_failure_is_not_retried(self) -> None:
+        self.failures = [RuntimeError("401 Unauthorized")]
+        with self.assertRaises(PerplexityUpstreamError) as caught:
+            call_perplexity_search(self.cfg, query="q", mode="auto")
+        self.assertEqual(caught.exception.kind, "auth")
+        self.assertEqual(self.calls, 1)
+
+    def test_retries_stop_at_limit(self) -> None:
+        self.failures = [TimeoutError("read timed out")] * 5
+        with self.assertRaises(PerplexityUpstreamError):
+            call_perplexity_search(self.cfg, query="q", mode="auto")
+        self.assertEqual(self.calls, 3)
+
+    def test_no_retry_when_deadline_is_too_close(self) -> None:
+        self.failures = [TimeoutError("read timed out")] * 5
+        cfg = AppConfig(
+            cookies=self.cfg.cookies, timeout_ms=5_000, retry_base_ms=10_000, retry_max_delay_ms=10_000
+        )
+        with self.assertRaises(PerplexityUpstreamError):
+            call_perplexity_search(cfg, query="q", mode="auto", ctx=RequestContext(timeout_ms=500))
+        self.assertEqual(self.calls, 1)
+
+    def test_breaker_fails_fast_after_repeated_failures(self) -> None:
+        self.failures = [RuntimeError("boom")] * 3
+        for _ in range(3):
+            with self.assertRaises(PerplexityUpstreamError):
+                call_perplexity_search(self.cfg, query="q", mode="auto")
+        self.assertEqual(adapter_mod._BREAKERS.get("default", "light").state, OPEN)
+        started = time.monotonic()
+        with self.assertRaises(PerplexityCircuitOpenError):
+            call_perplexity_search(self.cfg, query="q", mode="auto", ctx=RequestContext(timeout_ms=5_000))
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertEqual(self.calls, 3)
+
+    def test_auth_failures_and_timeouts_do_not_trip_the_breaker(self) -> None:
+        cfg = replace(self.cfg, breaker_threshold=1, retry_max=0)
+        self.failures = [RuntimeError("401 Unauthorized")]
+        with self.assertRaises(PerplexityUpstreamError):
+            call_perplexity_search(cfg, query="q", mode="auto")
+        with self.assertRaises(PerplexityTimeoutError):
+            call_perplexity_search(cfg, query="slow", mode="auto", ctx=RequestContext(timeout_ms=50))
+        self.assertEqual(adapter_mod._BREAKERS.get("default", "light").state, CLOSED)
+        self.assertEqual(call_perplexity_search(cfg, query="q", mode="auto").answer, "ok")
+
+    def test_breaker_is_per_account_and_lane(self) -> None:
+        accounts = (
+            AccountConfig(name="bad", cookies={"next-auth.csrf-token": "c", "next-auth.session-token": "broken"}),
+            AccountConfig(name="good", cookies={"next-auth.csrf-token": "c", "next-auth.session-token": "fine"}),
+        )
+        cfg = replace(self.cfg, accounts=accounts, breaker_threshold=1, retry_max=0)
+        for _ in range(4):
+            try:
+                call_perplexity_search(cfg, query="q", mode="auto")
+            except PerplexityUpstreamError:
+                pass
+        self.assertEqual(adapter_mod._BREAKERS.get("bad", "light").state, OPEN)
+        self.assertEqual(adapter_mod._BREAKERS.get("good", "light").state, CLOSED)
+        self.assertEqual(adapter_mod._BREAKERS.get("bad", "heavy").state, CLOSED)
+        # 熔断后不再选择 bad 账号
+        self.sessions.clear()
+        for _ in range(3):
+            self.assertEqual(call_perplexity_search(cfg, query="q", mode="auto").account, "good")
+        self.assertEqual(self.sessions, ["fine"] * 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
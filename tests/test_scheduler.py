@@ -0,0 +1,62 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import unittest
+
+from perplexity_unofficial_mcp.scheduler import LaneScheduler
+from perplexity_unofficial_mcp.tools import tool_lane
+
+
+class TestLaneScheduler(unittest.TestCase):
+    def test_heavy_lane_cap_leaves_room_for_light_calls(self) -> None:
+        scheduler = LaneScheduler(workers=2, lane_caps={"light": 2, "heavy": 1}, priority=["light", "heavy"])
+        release = threading.Event()
+        light_done = threading.Event()
+        started = []
+        try:
+            scheduler.submit("heavy", lambda: (started.append("h1"), release.wait(5)))
+            scheduler.submit("heavy", lambda: (started.append("h2"), release.wait(5)))
+            scheduler.submit("light", lambda: (started.append("l1"), light_done.set()))
+            self.assertTrue(light_done.wait(2))
+            self.assertEqual(started.count("h2"), 0)
+            self.assertEqual(scheduler.snapshot()["heavy"]["queued"], 1)
+        finally:
+            release.set()
+            scheduler.shutdown(wait=True)
+        self.assertIn("h2", started)
+
+    def test_light_calls_are_dispatched_first(self) -> None:
+        scheduler = LaneScheduler(workers=1, lane_caps={"light": 1, "heavy": 1}, priority=["light", "heavy"])
+        gate = threading.Event()
+        order = []
+        scheduler.submit("heavy", lambda: gate.wait(5))
+        time.sleep(0.05)
+        scheduler.submit("heavy", lambda: order.append("heavy"))
+        scheduler.submit("light", lambda: order.append("light"))
+        gate.set()
+        scheduler.shutdown(wait=True)
+        self.assertEqual(order, ["light", "heavy"])
+
+    def test_shutdown_drains_queue(self) -> None:
+        scheduler = LaneScheduler(workers=1, lane_caps={"light": 1, "heavy": 1}, priority=["light", "heavy"])
+        done = []
+        for i in range(5):
+            scheduler.submit("light", done.append, i)
+        scheduler.shutdown(wait=True)
+        self.assertEqual(done, [0, 1, 2, 3, 4])
+        with self.assertRaises(RuntimeError):
+            scheduler.submit("light", done.append, 5)
+
+    def test_tool_lanes(self) -> None:
+        self.assertEqual(tool_lane("perplexity_research"), "heavy")
+        self.assertEqual(tool_lane("perplexity_reason"), "heavy")
+        self.assertEqual(tool_lane("perplexity_search"), "light")
+        self.assertEqual(tool_lane("perplexity_ask"), "light")
+
+
+if __name__ == "__main__":
+    unittest.main()
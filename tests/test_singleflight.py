@@ -0,0 +1,148 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import unittest
+
+from perplexity_unofficial_mcp import tools as tools_mod
+from perplexity_unofficial_mcp.config import AppConfig
+from perplexity_unofficial_mcp.context import RequestContext
+from perplexity_unofficial_mcp.perplexity_adapter import (
+    PerplexityCallError,
+    PerplexityCancelledError,
+    PerplexityResult,
+    PerplexityTimeoutError,
+)
+from perplexity_unofficial_mcp.singleflight import SingleFlight
+
+
+def _run_concurrently(n, fn):  # type: ignore[no-untyped-def]
+    results = [None] * n
+    errors = [None] * n
+
+    def worker(i):  # type: ignore[no-untyped-def]
+        try:
+            results[i] = fn(i)
+        except BaseException as exc:  # noqa: BLE001
+            errors[i] = exc
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return results, errors
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_callers_share_one_execution(self) -> None:
+        flight = SingleFlight()
+        calls = []
+
+        def fn():  # type: ignore[no-untyped-def]
+            calls.append(1)
+            time.sleep(0.2)
+            return "shared"
+
+        results, errors = _run_concurrently(5, lambda i: flight.do("k", fn))
+        self.assertEqual(calls, [1])
+        self.assertEqual([r[0] for r in results], ["shared"] * 5)
+        self.assertEqual(sum(1 for r in results if r[1]), 4)
+        self.assertEqual(errors, [None] * 5)
+        self.assertEqual(flight.inflight_count(), 0)
+
+    def test_leader_failure_is_propagated(self) -> None:
+        flight = SingleFlight()
+
+        def fn():  # type: ignore[no-untyped-def]
+            time.sleep(0.2)
+            raise PerplexityCallError("upstream down")
+
+        _results, errors = _run_concurrently(3, lambda i: flight.do("k", fn))
+        self.assertTrue(all(isinstance(e, PerplexityCallError) for e in errors))
+
+    def test_follower_retries_when_leader_times_out(self) -> None:
+        flight = SingleFlight()
+        calls = []
+
+        def fn():  # type: ignore[no-untyped-def]
+            calls.append(1)
+            if len(calls) == 1:
+                time.sleep(0.2)
+                raise PerplexityTimeoutError("leader deadline")
+            return "second"
+
+        leader_error = []
+
+        def leader():  # type: ignore[no-untyped-def]
+            try:
+                flight.do("k", fn)
+            except PerplexityTimeoutError as exc:
+                leader_error.append(exc)
+
+        t = threading.Thread(target=leader)
+        t.start()
+        time.sleep(0.05)
+        value, shared = flight.do("k", fn)
+        t.join(5)
+        self.assertEqual(value, "second")
+        self.assertFalse(shared)
+        self.assertEqual(len(leader_error), 1)
+
+    def test_cancelled_follower_returns_immediately(self) -> None:
+        flight = SingleFlight()
+        release = threading.Event()
+        t = threading.Thread(target=lambda: flight.do("k", lambda: release.wait(5)))
+        t.start()
+        time.sleep(0.05)
+        ctx = RequestContext(request_id=2, timeout_ms=5_000)
+        threading.Timer(0.05, ctx.cancel).start()
+        started = time.monotonic()
+        with self.assertRaises(PerplexityCancelledError):
+            flight.do("k", lambda: None, ctx=ctx)
+        self.assertLess(time.monotonic() - started, 1.0)
+        release.set()
+        t.join(5)
+
+
+class TestToolSingleFlight(unittest.TestCase):
+    def setUp(self) -> None:
+        tools_mod._RESPONSE_CACHE.clear()
+        self.calls = []
+
+        def fake_call(config, *, query, mode, sources=None, model=None, **kwargs):  # type: ignore[no-untyped-def]
+            self.calls.append(query)
+            time.sleep(0.2)
+            return PerplexityResult(answer="ok", raw={})
+
+        self._original = tools_mod.call_perplexity_search
+        tools_mod.call_perplexity_search = fake_call  # type: ignore[assignment]
+        self.cfg = AppConfig(
+            cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"},
+            timeout_ms=300_000,
+            cache_max_entries=0,
+        )
+
+    def tearDown(self) -> None:
+        tools_mod.call_perplexity_search = self._original  # type: ignore[assignment]
+
+    def test_identical_queries_share_upstream_call(self) -> None:
+        results, _errors = _run_concurrently(
+            4, lambda i: tools_mod.call_tool(self.cfg, "perplexity_search", {"query": "burst"})
+        )
+        self.assertEqual(self.calls, ["burst"])
+        self.assertTrue(all(r["structuredContent"]["results"] == "ok" for r in results))
+
+    def test_follow_ups_are_not_merged(self) -> None:
+        _run_concurrently(
+            2,
+            lambda i: tools_mod.call_tool(self.cfg, "perplexity_search", {"query": "burst", "backend_uuid": "prev"}),
+        )
+        self.assertEqual(self.calls, ["burst", "burst"])
+
+
+if __name__ == "__main__":
+    unittest.main()
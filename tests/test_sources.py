@@ -0,0 +1,93 @@
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import json
+import unittest
+
+from perplexity_unofficial_mcp import perplexity_adapter as adapter_mod
+from perplexity_unofficial_mcp import tools as tools_mod
+from perplexity_unofficial_mcp.config import AppConfig
+from perplexity_unofficial_mcp.perplexity_adapter import call_perplexity_search, extract_sources
+
+
+class TestExtractSources(unittest.TestCase):
+    def test_dedupes_in_first_seen_order(self) -> None:
+        payload = {
+            "answer": "[1] answer text",
+            "chunks": [
+                {"url": "https://a.example.com/x", "title": "A"},
+                "plain chunk",
+                {"url": "https://B.example.com/y/", "snippet": "b snippet"},
+                {"url": "https://a.example.com/x#section", "snippet": "a snippet"},
+                {"url": "ftp://ignored.example.com"},
+            ],
+            "web_results": [{"name": "B title", "url": "https://b.example.com/y"}],
+        }
+        sources = extract_sources(payload, max_sources=10)
+        self.assertEqual(
+            sources,
+            [
+                {"index": 1, "url": "https://a.example.com/x", "title": "A", "snippet": "a snippet"},
+                {"index": 2, "url": "https://B.example.com/y/", "snippet": "b snippet", "title": "B title"},
+            ],
+        )
+
+    def test_embedded_json_steps_are_walked(self) -> None:
+        steps = [
+            {"step_type": "SEARCH_RESULTS", "content": {"web_results": [{"name": "S", "url": "https://s.example.com"}]}},
+            {"step_type": "FINAL", "content": {"answer": json.dumps({"web_results": [{"url": "https://f.example.com"}]})}},
+        ]
+        sources = extract_sources({"answer": "x", "text": json.dumps(steps)}, max_sources=10)
+        self.assertEqual([s["url"] for s in sources], ["https://s.example.com", "https://f.example.com"])
+
+    def test_output_is_bounded(self) -> None:
+        payload = {"chunks": [{"url": f"https://e.example.com/{i}", "snippet": "s" * 1_000} for i in range(100)]}
+        sources = extract_sources(payload, max_sources=5)
+        self.assertEqual([s["index"] for s in sources], [1, 2, 3, 4, 5])
+        self.assertEqual(len(sources[0]["snippet"]), 300)
+
+
+class TestSourcesInResults(unittest.TestCase):
+    def setUp(self) -> None:
+        self._original = sys.modules.get("perplexity")
+        adapter_mod._CLIENT_POOL.clear()
+        tools_mod._RESPONSE_CACHE.clear()
+
+        class FakeClient:
+            def __init__(self, cookies):  # type: ignore[no-untyped-def]
+                pass
+
+            def search(self, query, **kwargs):  # type: ignore[no-untyped-def]
+                return {
+                    "answer": "ok",
+                    "chunks": [{"url": "https://a.example.com", "title": "A"}, {"url": "https://a.example.com/"}],
+                }
+
+        sys.modules["perplexity"] = types.SimpleNamespace(Client=FakeClient)  # type: ignore[assignment]
+        self.cfg = AppConfig(
+            cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"}, timeout_ms=5_000
+        )
+
+    def tearDown(self) -> None:
+        if self._original is None:
+            sys.modules.pop("perplexity", None)
+        else:
+            sys.modules["perplexity"] = self._original
+        adapter_mod._CLIENT_POOL.clear()
+        tools_mod._RESPONSE_CACHE.clear()
+
+    def test_sources_are_returned_in_structured_content(self) -> None:
+        res = tools_mod.call_tool(self.cfg, "perplexity_search", {"query": "q", "chunks": "none"})
+        self.assertEqual(res["structuredContent"]["sources"], [{"index": 1, "url": "https://a.example.com", "title": "A"}])
+        self.assertNotIn("chunks", res["structuredContent"])
+
+    def test_extraction_can_be_disabled(self) -> None:
+        cfg = AppConfig(cookies=self.cfg.cookies, timeout_ms=5_000, response_sources_max=0)
+        self.assertIsNone(call_perplexity_search(cfg, query="q", mode="auto").sources)
+
+
+if __name__ == "__main__":
+    unittest.main()
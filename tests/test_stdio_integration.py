@@ -2,10 +2,35 @@ import json
 import os
 import subprocess
 import sys
+import tempfile
+import textwrap
+import time
 import unittest
 from pathlib import Path
 
 
+_FAKE_SDK = textwrap.dedent(
+    """
+    import time
+
+
+    class Client:
+        def __init__(self, cookies):
+            self.cookies = cookies
+
+        def search(self, query, mode="auto", model=None, sources=None, files=None, stream=False,
+                   language="en-US", follow_up=None, incognito=False):
+            if query.startswith("slow"):
+                time.sleep(1.5)
+            answer = "answer: " + query
+            if stream:
+                return iter([{"answer": answer[:i]} for i in range(1, len(answer))]
+                            + [{"answer": answer, "backend_uuid": "uuid-" + query}])
+            return {"answer": answer, "backend_uuid": "uuid-" + query}
+    """
+)
+
+
 class TestStdioIntegration(unittest.TestCase):
     def test_initialize_and_tools_list(self) -> None:
         repo_root = Path(__file__).resolve().parents[1]
@@ -149,6 +174,227 @@ class TestStdioIntegration(unittest.TestCase):
         self.assertIn("result", res)
         self.assertTrue(res["result"].get("isError"))
 
+    def test_warmup_runs_in_background_and_logs_timings(self) -> None:
+        repo_root = Path(__file__).resolve().parents[1]
+        with tempfile.TemporaryDirectory() as fake_dir:
+            Path(fake_dir, "perplexity.py").write_text(_FAKE_SDK, encoding="utf-8")
+            env = os.environ.copy()
+            env["PERPLEXITY_CSRF_TOKEN"] = "csrf"
+            env["PERPLEXITY_SESSION_TOKEN"] = "session"
+            env["PERPLEXITY_WARMUP"] = "client"
+            env["PYTHONPATH"] = os.pathsep.join([fake_dir, str(repo_root / "src")])
+
+            proc = subprocess.Popen(
+                [sys.executable, "-m", "perplexity_unofficial_mcp.cli"],
+                cwd=str(repo_root),
+                env=env,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+            try:
+                assert proc.stdin is not None and proc.stdout is not None and proc.stderr is not None
+                proc.stdin.write(
+                    json.dumps(
+                        {
+                            "jsonrpc": "2.0",
+                            "id": 1,
+                            "method": "initialize",
+                            "params": {"protocolVersion": "2024-11-05", "capabilities": {}},
+                        }
+                    )
+                    + "\n"
+                )
+                proc.stdin.flush()
+                self.assertEqual(json.loads(proc.stdout.readline())["id"], 1)
+
+                events = []
+                deadline = time.time() + 5
+                while time.time() < deadline:
+                    line = proc.stderr.readline()
+                    if not line:
+                        break
+                    events.append(json.loads(line))
+                    if {"MCP Server 启动", "SDK 预热完成"} <= {e.get("msg") for e in events}:
+                        break
+            finally:
+                proc.communicate(timeout=5)
+
+        startup = next(e for e in events if e.get("msg") == "MCP Server 启动")
+        self.assertIn("startupMs", startup)
+        warm = next(e for e in events if e.get("msg") == "SDK 预热完成")
+        self.assertEqual(warm["clientsWarmed"], 1)
+        self.assertIn("importMs", warm)
+
+    def test_tools_call_runs_concurrently_and_responds_out_of_order(self) -> None:
+        repo_root = Path(__file__).resolve().parents[1]
+        with tempfile.TemporaryDirectory() as fake_dir:
+            Path(fake_dir, "perplexity.py").write_text(_FAKE_SDK, encoding="utf-8")
+            env = os.environ.copy()
+            env["PERPLEXITY_CSRF_TOKEN"] = "csrf"
+            env["PERPLEXITY_SESSION_TOKEN"] = "session"
+            env["PERPLEXITY_MAX_WORKERS"] = "4"
+            env["PYTHONPATH"] = os.pathsep.join([fake_dir, str(repo_root / "src")])
+
+            proc = subprocess.Popen(
+                [sys.executable, "-m", "perplexity_unofficial_mcp.cli"],
+                cwd=str(repo_root),
+                env=env,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+
+            def call(id_: int, query: str) -> str:
+                return json.dumps(
+                    {
+                        "jsonrpc": "2.0",
+                        "id": id_,
+                        "method": "tools/call",
+                        "params": {"name": "perplexity_search", "arguments": {"query": query}},
+                    }
+                )
+
+            input_lines = "\n".join(
+                [
+                    json.dumps(
+                        {
+                            "jsonrpc": "2.0",
+                            "id": 1,
+                            "method": "initialize",
+                            "params": {"protocolVersion": "2024-11-05", "capabilities": {}},
+                        }
+                    ),
+                    call(2, "slow one"),
+                    call(3, "slow two"),
+                    call(4, "fast"),
+                    json.dumps({"jsonrpc": "2.0", "id": 5, "method": "ping"}),
+                    "",
+                ]
+            )
+
+            started = time.time()
+            stdout, _stderr = proc.communicate(input=input_lines, timeout=10)
+            elapsed = time.time() - started
+
+        parsed = [json.loads(line) for line in stdout.splitlines() if line.strip()]
+        ids = [msg["id"] for msg in parsed]
+        self.assertEqual(sorted(ids), [1, 2, 3, 4, 5])
+        # 慢调用不阻塞后续请求：ping 与快调用先于慢调用返回
+        self.assertLess(ids.index(5), ids.index(2))
+        self.assertLess(ids.index(4), ids.index(2))
+        # 两个慢调用并行执行，总耗时接近单次而非两次之和
+        self.assertLess(elapsed, 2.9)
+        by_id = {msg["id"]: msg for msg in parsed}
+        self.assertEqual(by_id[3]["result"]["structuredContent"]["results"], "answer: slow two")
+
+    def test_cancelled_tools_call_gets_no_response(self) -> None:
+        repo_root = Path(__file__).resolve().parents[1]
+        with tempfile.TemporaryDirectory() as fake_dir:
+            Path(fake_dir, "perplexity.py").write_text(_FAKE_SDK, encoding="utf-8")
+            env = os.environ.copy()
+            env["PYTHONPATH"] = os.pathsep.join([fake_dir, str(repo_root / "src")])
+
+            proc = subprocess.Popen(
+                [sys.executable, "-m", "perplexity_unofficial_mcp.cli"],
+                cwd=str(repo_root),
+                env=env,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+
+            input_lines = "\n".join(
+                [
+                    json.dumps(
+                        {
+                            "jsonrpc": "2.0",
+                            "id": 1,
+                            "method": "initialize",
+                            "params": {"protocolVersion": "2024-11-05", "capabilities": {}},
+                        }
+                    ),
+                    json.dumps(
+                        {
+                            "jsonrpc": "2.0",
+                            "id": 2,
+                            "method": "tools/call",
+                            "params": {"name": "perplexity_research", "arguments": {"query": "slow research"}},
+                        }
+                    ),
+                    json.dumps(
+                        {"jsonrpc": "2.0", "method": "notifications/cancelled", "params": {"requestId": 2}}
+                    ),
+                    json.dumps({"jsonrpc": "2.0", "id": 3, "method": "ping"}),
+                    "",
+                ]
+            )
+
+            started = time.time()
+            stdout, stderr = proc.communicate(input=input_lines, timeout=10)
+            elapsed = time.time() - started
+
+        ids = [json.loads(line)["id"] for line in stdout.splitlines() if line.strip()]
+        self.assertEqual(ids, [1, 3])
+        self.assertLess(elapsed, 1.4)
+        events = [json.loads(line) for line in stderr.splitlines() if line.strip()]
+        self.assertTrue(any(event.get("requestId") == 2 and event.get("cancelled") for event in events))
+
+    def test_progress_notifications_precede_result(self) -> None:
+        repo_root = Path(__file__).resolve().parents[1]
+        with tempfile.TemporaryDirectory() as fake_dir:
+            Path(fake_dir, "perplexity.py").write_text(_FAKE_SDK, encoding="utf-8")
+            env = os.environ.copy()
+            env["PYTHONPATH"] = os.pathsep.join([fake_dir, str(repo_root / "src")])
+
+            proc = subprocess.Popen(
+                [sys.executable, "-m", "perplexity_unofficial_mcp.cli"],
+                cwd=str(repo_root),
+                env=env,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+
+            input_lines = "\n".join(
+                [
+                    json.dumps(
+                        {
+                            "jsonrpc": "2.0",
+                            "id": 1,
+                            "method": "initialize",
+                            "params": {"protocolVersion": "2024-11-05", "capabilities": {}},
+                        }
+                    ),
+                    json.dumps(
+                        {
+                            "jsonrpc": "2.0",
+                            "id": 2,
+                            "method": "tools/call",
+                            "params": {
+                                "name": "perplexity_ask",
+                                "arguments": {"query": "stream me"},
+                                "_meta": {"progressToken": "p-2"},
+                            },
+                        }
+                    ),
+                    "",
+                ]
+            )
+
+            stdout, _stderr = proc.communicate(input=input_lines, timeout=10)
+
+        parsed = [json.loads(line) for line in stdout.splitlines() if line.strip()]
+        progress = [m for m in parsed if m.get("method") == "notifications/progress"]
+        self.assertTrue(progress)
+        self.assertEqual("".join(m["params"]["message"] for m in progress), "answer: stream me")
+        self.assertEqual(parsed[-1]["id"], 2)
+        self.assertEqual(parsed[-1]["result"]["structuredContent"]["response"], "answer: stream me")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,180 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from perplexity_unofficial_mcp import store as store_mod
+from perplexity_unofficial_mcp import tools as tools_mod
+from perplexity_unofficial_mcp.config import AppConfig
+from perplexity_unofficial_mcp.metrics import METRICS
+from perplexity_unofficial_mcp.perplexity_adapter import PerplexityResult
+from perplexity_unofficial_mcp.store import AnswerStore, AnswerStoreError, StoredAnswer
+
+
+def _answer(query, answer, **kwargs):  # type: ignore[no-untyped-def]
+    return StoredAnswer(tool="perplexity_search", mode="pro", query=query, answer=answer, **kwargs)
+
+
+class TestAnswerStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "answers.db")
+        self.store = AnswerStore()
+        self.store.open(self.path, max_entries=1_000)
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self._tmp.cleanup()
+
+    def test_search_ranks_and_filters(self) -> None:
+        self.store.put(_answer("python asyncio tutorial", "event loops and coroutines", backend_uuid="u1"))
+        self.store.put(_answer("rust ownership", "borrow checker rules"))
+        self.store.put(
+            StoredAnswer(tool="perplexity_ask", mode="pro", query="asyncio vs threads", answer="GIL notes")
+        )
+        self.store.flush()
+        matches = self.store.search("asyncio", limit=5)
+        self.assertEqual({m["query"] for m in matches}, {"python asyncio tutorial", "asyncio vs threads"})
+        only_search = self.store.search("asyncio", limit=5, tool="perplexity_search")
+        self.assertEqual(len(only_search), 1)
+        self.assertEqual(only_search[0]["backend_uuid"], "u1")
+        self.assertEqual(self.store.search("borrow", limit=5)[0]["answer"], "borrow checker rules")
+        self.assertEqual(self.store.search("asyncio", limit=5, max_age_s=0.0), [])
+
+    def test_bodies_are_compressed_and_database_uses_wal(self) -> None:
+        body = "重复的回答内容 " * 2_000
+        self.store.put(_answer("中文问题检索", body))
+        self.store.flush()
+        conn = sqlite3.connect(self.path)
+        try:
+            (stored,) = conn.execute("SELECT answer FROM answers").fetchone()
+            (mode,) = conn.execute("PRAGMA journal_mode").fetchone()
+        finally:
+            conn.close()
+        self.assertLess(len(stored), len(body.encode("utf-8")) // 10)
+        self.assertEqual(mode, "wal")
+        match = self.store.search("问题检索", limit=1)[0]
+        self.assertTrue(match["truncated"])
+        self.assertEqual(len(match["answer"]), AnswerStore.max_recall_chars)
+
+    def test_prune_keeps_newest_entries(self) -> None:
+        self.store.close()
+        self.store = AnswerStore()
+        self.store.prune_every = 1
+        self.store.open(self.path, max_entries=3)
+        for i in range(6):
+            self.store.put(_answer(f"question number{i}", f"answer{i}"))
+        self.store.flush()
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.store.search("number0", limit=5), [])
+        self.assertEqual(len(self.store.search("number5", limit=5)), 1)
+
+    def test_persisted_across_reopen(self) -> None:
+        self.store.put(_answer("persisted question", "kept"))
+        self.store.close()
+        reopened = AnswerStore()
+        reopened.open(self.path, max_entries=1_000)
+        try:
+            self.assertEqual(reopened.search("persisted", limit=1)[0]["answer"], "kept")
+        finally:
+            reopened.close()
+
+    def test_old_schema_gains_citations_column(self) -> None:
+        self.store.close()
+        os.remove(self.path)
+        conn = sqlite3.connect(self.path)
+        conn.executescript(
+            "CREATE TABLE answers (id INTEGER PRIMARY KEY, created_at REAL NOT NULL, tool TEXT NOT NULL, "
+            "mode TEXT NOT NULL, query TEXT NOT NULL, backend_uuid TEXT, sources TEXT NOT NULL, "
+            "answer BLOB NOT NULL, chunks BLOB)"
+        )
+        conn.close()
+        self.store = AnswerStore()
+        self.store.open(self.path, max_entries=1_000)
+        self.store.put(_answer("migrated question", "ok", sources=[{"index": 1, "url": "https://example.com/a"}]))
+        self.store.flush()
+        match = self.store.search("migrated", limit=1)[0]
+        self.assertEqual(match["sources"][0]["url"], "https://example.com/a")
+        self.assertEqual(match["search_sources"], [])
+
+    def test_failed_inserts_are_counted_and_logged(self) -> None:
+        METRICS.clear()
+        with mock.patch.object(store_mod, "log_event") as log:
+            for i in range(3):
+                self.store.put(_answer(f"broken{i}", "x", chunks=[object()]))
+            self.store.put(_answer("healthy question", "kept"))
+            self.store.flush()
+        self.assertEqual(self.store.dropped, 3)
+        self.assertEqual(len(self.store.search("healthy", limit=1)), 1)
+        # 限频：间隔内只输出一条 warn
+        (event,), _ = log.call_args
+        self.assertEqual(log.call_count, 1)
+        self.assertEqual((event["level"], event["errorClass"], event["dropped"]), ("warn", "TypeError", 1))
+        counters = [c for c in METRICS.snapshot()["counters"] if c["name"] == "mcp_answer_store_dropped_total"]
+        self.assertEqual([(c["labels"], c["value"]) for c in counters], [({"error_class": "TypeError"}, 3)])
+
+    def test_closed_store_raises(self) -> None:
+        closed = AnswerStore()
+        with self.assertRaises(AnswerStoreError):
+            closed.search("x", limit=1)
+
+
+class TestRecallTool(unittest.TestCase):
+    def setUp(self) -> None:
+        tools_mod._RESPONSE_CACHE.clear()
+        self._tmp = tempfile.TemporaryDirectory()
+        tools_mod.ANSWERS.open(os.path.join(self._tmp.name, "answers.db"), max_entries=1_000)
+        self._original = tools_mod.call_perplexity_search
+
+        def fake_call(config, *, query, mode, **kwargs):  # type: ignore[no-untyped-def]
+            return PerplexityResult(
+                answer="answer about " + query,
+                raw={},
+                backend_uuid="uuid-1",
+                sources=[{"index": 1, "url": "https://kubernetes.io/docs/probes", "title": "Probes"}],
+            )
+
+        tools_mod.call_perplexity_search = fake_call  # type: ignore[assignment]
+        self.config = AppConfig(
+            cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"},
+            timeout_ms=5_000,
+        )
+
+    def tearDown(self) -> None:
+        tools_mod.call_perplexity_search = self._original  # type: ignore[assignment]
+        tools_mod.ANSWERS.close()
+        self._tmp.cleanup()
+
+    def test_answers_are_recorded_and_recalled(self) -> None:
+        tools_mod.call_tool(self.config, "perplexity_ask", {"query": "kubernetes liveness probes"})
+        # 缓存命中不会重复写入
+        tools_mod.call_tool(self.config, "perplexity_ask", {"query": "kubernetes liveness probes"})
+        tools_mod.ANSWERS.flush()
+        started = time.monotonic()
+        res = tools_mod.call_tool(self.config, "perplexity_recall", {"query": "liveness"})
+        self.assertLess(time.monotonic() - started, 0.5)
+        matches = res["structuredContent"]["matches"]
+        self.assertEqual(len(matches), 1)
+        self.assertEqual(matches[0]["answer"], "answer about kubernetes liveness probes")
+        self.assertEqual(matches[0]["backend_uuid"], "uuid-1")
+        self.assertEqual(matches[0]["search_sources"], ["web"])
+        self.assertEqual([src["url"] for src in matches[0]["sources"]], ["https://kubernetes.io/docs/probes"])
+
+    def test_validation_and_disabled_store(self) -> None:
+        self.assertTrue(tools_mod.call_tool(self.config, "perplexity_recall", {"query": "x", "limit": 50})["isError"])
+        self.assertTrue(tools_mod.call_tool(self.config, "perplexity_recall", {"query": "x", "tool": "other"})["isError"])
+        tools_mod.ANSWERS.close()
+        res = tools_mod.call_tool(self.config, "perplexity_recall", {"query": "anything"})
+        self.assertTrue(res["isError"])
+        self.assertIn("PERPLEXITY_STORE_PATH", res["content"][0]["text"])
+
+
+if __name__ == "__main__":
+    unittest.main()
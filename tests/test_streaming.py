@@ -0,0 +1,82 @@
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import unittest
+
+from perplexity_unofficial_mcp import perplexity_adapter as adapter_mod
+from perplexity_unofficial_mcp.config import AppConfig
+from perplexity_unofficial_mcp.context import RequestContext
+from perplexity_unofficial_mcp.perplexity_adapter import call_perplexity_search
+
+
+class _StreamingClient:
+    calls = []
+
+    def __init__(self, cookies):  # type: ignore[no-untyped-def]
+        self.cookies = cookies
+
+    def search(self, query, stream=False, **kwargs):  # type: ignore[no-untyped-def]
+        self.calls.append(stream)
+        events = [
+            {"status": "pending"},
+            {"answer": "Hello"},
+            {"answer": "Hello, wor"},
+            {"answer": "Hello, world", "backend_uuid": "b-stream"},
+        ]
+        if stream:
+            return iter(events)
+        return events[-1]
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self) -> None:
+        self._original = sys.modules.get("perplexity")
+        sys.modules["perplexity"] = types.SimpleNamespace(Client=_StreamingClient)  # type: ignore[assignment]
+        _StreamingClient.calls = []
+        adapter_mod._CLIENT_POOL.clear()
+        self.cfg = AppConfig(
+            cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"},
+            timeout_ms=300_000,
+        )
+
+    def tearDown(self) -> None:
+        if self._original is None:
+            sys.modules.pop("perplexity", None)
+        else:
+            sys.modules["perplexity"] = self._original
+        adapter_mod._CLIENT_POOL.clear()
+
+    def test_progress_notifications_carry_incremental_text(self) -> None:
+        sent = []
+        ctx = RequestContext(request_id=1, timeout_ms=5_000, progress_token="tok", notify=sent.append)
+        res = call_perplexity_search(self.cfg, query="hi", mode="auto", ctx=ctx)
+
+        self.assertEqual(_StreamingClient.calls, [True])
+        self.assertEqual(res.answer, "Hello, world")
+        self.assertEqual(res.backend_uuid, "b-stream")
+        params = [m["params"] for m in sent]
+        self.assertTrue(all(m["method"] == "notifications/progress" for m in sent))
+        self.assertEqual([p["message"] for p in params], ["Hello", ", wor", "ld"])
+        self.assertEqual([p["progress"] for p in params], [2, 3, 4])
+        self.assertTrue(all(p["progressToken"] == "tok" for p in params))
+
+    def test_without_progress_token_uses_non_streaming_call(self) -> None:
+        ctx = RequestContext(request_id=1, timeout_ms=5_000, notify=lambda msg: None)
+        res = call_perplexity_search(self.cfg, query="hi", mode="auto", ctx=ctx)
+        self.assertEqual(_StreamingClient.calls, [False])
+        self.assertEqual(res.answer, "Hello, world")
+
+    def test_stream_can_be_disabled_by_config(self) -> None:
+        cfg = AppConfig(cookies=self.cfg.cookies, timeout_ms=300_000, stream=False)
+        sent = []
+        ctx = RequestContext(request_id=1, timeout_ms=5_000, progress_token=7, notify=sent.append)
+        call_perplexity_search(cfg, query="hi", mode="auto", ctx=ctx)
+        self.assertEqual(_StreamingClient.calls, [False])
+        self.assertEqual(sent, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
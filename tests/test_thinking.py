@@ -0,0 +1,94 @@
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import unittest
+
+from perplexity_unofficial_mcp import perplexity_adapter as adapter_mod
+from perplexity_unofficial_mcp import tools as tools_mod
+from perplexity_unofficial_mcp.config import AppConfig
+from perplexity_unofficial_mcp.context import RequestContext
+from perplexity_unofficial_mcp.perplexity_adapter import ThinkStripper, strip_thinking_tokens
+
+
+def _feed_in_pieces(text: str, size: int) -> str:
+    stripper = ThinkStripper()
+    out = [stripper.feed(text[i : i + size]) for i in range(0, len(text), size)]
+    return "".join(out) + stripper.finish()
+
+
+class TestThinkStripper(unittest.TestCase):
+    def test_full_text(self) -> None:
+        self.assertEqual(strip_thinking_tokens("<think>step 1\nstep 2</think>\n\nAnswer"), "Answer")
+        self.assertEqual(strip_thinking_tokens("a<think>x</think>b<think>y</think>c"), "abc")
+        self.assertEqual(strip_thinking_tokens("no tags, just <b>html</b> and a < b"), "no tags, just <b>html</b> and a < b")
+
+    def test_unterminated_block_is_dropped(self) -> None:
+        self.assertEqual(strip_thinking_tokens("Answer<think>never closed"), "Answer")
+        self.assertEqual(strip_thinking_tokens("Answer <thin"), "Answer <thin")
+
+    def test_tags_split_across_every_boundary(self) -> None:
+        text = "intro <think>hidden <thin> </thi> text</think>visible<think>more</think> end <"
+        expected = "intro visible end <"
+        for size in range(1, len(text) + 1):
+            self.assertEqual(_feed_in_pieces(text, size), expected, size)
+
+    def test_pending_partial_tag_is_not_emitted_early(self) -> None:
+        stripper = ThinkStripper()
+        self.assertEqual(stripper.feed("Hello <th"), "Hello ")
+        self.assertEqual(stripper.feed("ere"), "<there")
+
+
+class _ThinkingClient:
+    def __init__(self, cookies):  # type: ignore[no-untyped-def]
+        pass
+
+    def search(self, query, stream=False, **kwargs):  # type: ignore[no-untyped-def]
+        events = [
+            {"answer": "<thi"},
+            {"answer": "<think>reasoning"},
+            {"answer": "<think>reasoning</think>Fin"},
+            {"answer": "<think>reasoning</think>Final answer"},
+        ]
+        return iter(events) if stream else events[-1]
+
+
+class TestThinkingStripped(unittest.TestCase):
+    def setUp(self) -> None:
+        self._original = sys.modules.get("perplexity")
+        sys.modules["perplexity"] = types.SimpleNamespace(Client=_ThinkingClient)  # type: ignore[assignment]
+        adapter_mod._CLIENT_POOL.clear()
+        tools_mod._RESPONSE_CACHE.clear()
+        self.cfg = AppConfig(
+            cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"},
+            timeout_ms=5_000,
+            response_compact=True,
+        )
+
+    def tearDown(self) -> None:
+        if self._original is None:
+            sys.modules.pop("perplexity", None)
+        else:
+            sys.modules["perplexity"] = self._original
+        adapter_mod._CLIENT_POOL.clear()
+        tools_mod._RESPONSE_CACHE.clear()
+
+    def test_streaming_progress_and_result_are_stripped(self) -> None:
+        sent = []
+        ctx = RequestContext(request_id=1, timeout_ms=5_000, progress_token="tok", notify=sent.append)
+        res = tools_mod.call_tool(self.cfg, "perplexity_reason", {"query": "q", "strip_thinking": True}, ctx)
+        self.assertEqual(res["content"][0]["text"], "Final answer")
+        self.assertEqual("".join(m["params"]["message"] for m in sent), "Final answer")
+
+    def test_without_strip_thinking_progress_is_raw(self) -> None:
+        sent = []
+        ctx = RequestContext(request_id=1, timeout_ms=5_000, progress_token="tok", notify=sent.append)
+        res = tools_mod.call_tool(self.cfg, "perplexity_research", {"query": "q"}, ctx)
+        self.assertEqual(res["content"][0]["text"], "<think>reasoning</think>Final answer")
+        self.assertEqual("".join(m["params"]["message"] for m in sent), "<think>reasoning</think>Final answer")
+
+
+if __name__ == "__main__":
+    unittest.main()
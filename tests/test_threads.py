@@ -0,0 +1,169 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from dataclasses import replace
+
+from perplexity_unofficial_mcp import tools as tools_mod
+from perplexity_unofficial_mcp.accounts import AccountPool
+from perplexity_unofficial_mcp.config import AccountConfig, AppConfig, load_config
+from perplexity_unofficial_mcp.context import RequestContext
+from perplexity_unofficial_mcp.perplexity_adapter import PerplexityResult
+from perplexity_unofficial_mcp.threads import ThreadRegistry
+
+
+def _record(reg, uuid, parent=None, max_entries=10):  # type: ignore[no-untyped-def]
+    return reg.record(
+        uuid, parent=parent, tool="perplexity_ask", mode="pro", account="a1", query="q " + uuid, answer="a", max_entries=max_entries
+    )
+
+
+class TestThreadRegistry(unittest.TestCase):
+    def test_follow_up_increments_turns_within_thread(self) -> None:
+        reg = ThreadRegistry()
+        _record(reg, "u1")
+        info = _record(reg, "u2", parent="u1")
+        self.assertEqual(info.turns, 2)
+        self.assertEqual(info.thread_id, "u1")
+        # 同一轮重复登记不增加轮次
+        self.assertEqual(_record(reg, "u2", parent="u1").turns, 2)
+        recent = reg.recent(10, ttl_s=0)
+        self.assertEqual([t["backend_uuid"] for t in recent], ["u2"])
+
+    def test_lru_bound_and_expiry(self) -> None:
+        reg = ThreadRegistry()
+        for i in range(5):
+            _record(reg, f"u{i}", max_entries=3)
+        self.assertEqual(len(reg), 3)
+        self.assertEqual(reg.lookup("u0", ttl_s=60), (None, False))
+        info, expired = reg.lookup("u4", ttl_s=60)
+        self.assertIsNotNone(info)
+        self.assertFalse(expired)
+        reg._entries["u4"] = replace(reg._entries["u4"], last_used_at=time.time() - 120)
+        self.assertTrue(reg.lookup("u4", ttl_s=60)[1])
+        self.assertFalse(reg.lookup("u4", ttl_s=0)[1])
+
+    def test_persisted_across_instances(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "threads.json")
+            reg = ThreadRegistry()
+            reg.attach(path)
+            _record(reg, "u1")
+            _record(reg, "u2", parent="u1")
+            reg.close()
+
+            restored = ThreadRegistry()
+            restored.attach(path)
+            info, _expired = restored.lookup("u2", ttl_s=0)
+            self.assertIsNotNone(info)
+            self.assertEqual(info.turns, 2)  # type: ignore[union-attr]
+            self.assertEqual(info.account, "a1")  # type: ignore[union-attr]
+
+    def test_saves_are_coalesced_off_the_request_thread(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "threads.json")
+            reg = ThreadRegistry()
+            reg.save_delay_s = 0.2
+            saved = []
+            original_save = reg._save
+
+            def counting_save() -> None:
+                saved.append(threading.current_thread().name)
+                original_save()
+
+            reg._save = counting_save  # type: ignore[method-assign]
+            reg.attach(path)
+            try:
+                for i in range(20):
+                    _record(reg, f"u{i}")
+                self.assertEqual(saved, [])
+                self.assertFalse(os.path.exists(path))
+                deadline = time.monotonic() + 2
+                while not saved and time.monotonic() < deadline:
+                    time.sleep(0.02)
+                self.assertEqual(saved, ["mcp-thread-store"])
+                _record(reg, "last")
+            finally:
+                reg.close()
+            restored = ThreadRegistry()
+            restored.attach(path)
+            restored.close()
+            self.assertIsNotNone(restored.lookup("last", ttl_s=0)[0])
+
+    def test_account_pool_prefers_hint_without_sticky_entry(self) -> None:
+        pool = AccountPool()
+        accounts = [AccountConfig(name="a1", cookies={}), AccountConfig(name="a2", cookies={})]
+        leases = [pool.acquire(accounts, backend_uuid="unknown", prefer="a2") for _ in range(3)]
+        self.assertEqual({lease.account.name for lease in leases}, {"a2"})
+
+
+class TestThreadTools(unittest.TestCase):
+    def setUp(self) -> None:
+        tools_mod._RESPONSE_CACHE.clear()
+        tools_mod.THREADS.clear()
+        self.calls = []
+        self._original = tools_mod.call_perplexity_search
+
+        def fake_call(config, *, query, mode, backend_uuid=None, account=None, ctx=None, **kwargs):  # type: ignore[no-untyped-def]
+            self.calls.append({"backend_uuid": backend_uuid, "account": account})
+            return PerplexityResult(answer="answer: " + query, raw={}, backend_uuid=f"uuid-{len(self.calls)}", account="acc-1")
+
+        tools_mod.call_perplexity_search = fake_call  # type: ignore[assignment]
+        self.config = AppConfig(
+            cookies={"next-auth.csrf-token": "csrf", "next-auth.session-token": "session"},
+            timeout_ms=5_000,
+        )
+
+    def tearDown(self) -> None:
+        tools_mod.call_perplexity_search = self._original  # type: ignore[assignment]
+        tools_mod.THREADS.clear()
+
+    def test_follow_up_routes_to_recorded_account(self) -> None:
+        tools_mod.call_tool(self.config, "perplexity_ask", {"query": "first"})
+        ctx = RequestContext()
+        res = tools_mod.call_tool(self.config, "perplexity_ask", {"query": "second", "backend_uuid": "uuid-1"}, ctx)
+        self.assertFalse(res.get("isError"))
+        self.assertEqual(self.calls[1], {"backend_uuid": "uuid-1", "account": "acc-1"})
+        self.assertEqual(ctx.stats["threadTurn"], 2)
+
+        listed = tools_mod.call_tool(self.config, "perplexity_threads", {})
+        threads = listed["structuredContent"]["threads"]
+        self.assertEqual(len(threads), 1)
+        self.assertEqual(threads[0]["backend_uuid"], "uuid-2")
+        self.assertEqual(threads[0]["turns"], 2)
+
+    def test_expired_thread_is_rejected_without_upstream_call(self) -> None:
+        tools_mod.call_tool(self.config, "perplexity_ask", {"query": "first"})
+        entry = tools_mod.THREADS._entries["uuid-1"]
+        tools_mod.THREADS._entries["uuid-1"] = replace(entry, last_used_at=time.time() - 10)
+        ctx = RequestContext()
+        config = replace(self.config, thread_ttl_s=5)
+        res = tools_mod.call_tool(config, "perplexity_ask", {"query": "again", "backend_uuid": "uuid-1"}, ctx)
+        self.assertTrue(res["isError"])
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(ctx.stats["errorClass"], "thread_expired")
+
+    def test_unknown_thread_is_passed_through(self) -> None:
+        res = tools_mod.call_tool(self.config, "perplexity_ask", {"query": "q", "backend_uuid": "elsewhere"})
+        self.assertFalse(res.get("isError"))
+        self.assertEqual(self.calls[0]["account"], None)
+
+    def test_threads_tool_validates_limit(self) -> None:
+        self.assertTrue(tools_mod.call_tool(self.config, "perplexity_threads", {"limit": 0})["isError"])
+        empty = tools_mod.call_tool(self.config, "perplexity_threads", {})
+        self.assertEqual(empty["structuredContent"], {"threads": []})
+
+    def test_config(self) -> None:
+        cfg = load_config(env={"PERPLEXITY_THREAD_TTL_S": "0", "PERPLEXITY_THREAD_STORE": "/tmp/t.json"})
+        self.assertEqual(cfg.thread_ttl_s, 0)
+        self.assertEqual(cfg.thread_store_path, "/tmp/t.json")
+
+
+if __name__ == "__main__":
+    unittest.main()